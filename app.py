@@ -1,5 +1,6 @@
 import streamlit as st
 import os
+import time
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -7,14 +8,18 @@ load_dotenv()
 
 # Import all necessary functions from your generator script
 from video_generator import (
-    initialize_clients,
-    generate_story_with_prompts,
-    generate_image_with_gemini,
-    generate_narration_elevenlabs,
-    images_to_video_ffmpeg,
-    cleanup_images,
+    run_render_job,
+    run_rerender_job,
+    JobWorkspace,
     VIDEO_DIR
 )
+from concurrent.futures.process import BrokenProcessPool
+from render_pool import RenderPool, RenderPoolFull
+from workspace import JOB_LOST_SECONDS, cleanup_stale_jobs
+from video_server import VideoServer
+
+# How often the page re-checks a running job
+POLL_INTERVAL_SECONDS = 2
 
 # --- Page Configuration ---
 st.set_page_config(
@@ -247,12 +252,136 @@ if not GOOGLE_API_KEY:
 
 
 
+# --- Background Render Pool ---
+@st.cache_resource
+def get_render_pool():
+    """One worker pool per server process, shared by every browser session."""
+    return RenderPool()
+
+render_pool = get_render_pool()
+
+def submit_render(workspace, func, *args):
+    """Queues func(*args) for the workspace's job; False (with a message) if the pool cannot take it."""
+    try:
+        render_pool.submit(workspace.job_id, func, *args)
+        return True
+    except RenderPoolFull:
+        st.warning("⏳ All render workers are busy right now. Please try again in a minute.")
+    except BrokenProcessPool as e:
+        # Even a fresh executor failed; the next script run builds a new pool
+        get_render_pool.clear()
+        st.error(f"⚠️ The render workers could not be started: {e}. Please try again.")
+    return False
+
+# --- Video Delivery ---
+# Finished videos are streamed by a small HTTP server next to Streamlit. Deployment settings:
+#   VIDEO_SERVER_HOST  interface it listens on (default 127.0.0.1; 0.0.0.0 for remote browsers)
+#   VIDEO_SERVER_PORT  port it listens on (default 0 = any free port; pin it to open it in a firewall)
+#   VIDEO_PUBLIC_URL   base URL browsers use, e.g. an https reverse-proxy path (default: the
+#                      host the browser used for this page, plus the server's port)
+# When a browser cannot reach the server, videos go through Streamlit as before.
+@st.cache_resource
+def get_video_server():
+    """
+    Streams videos from disk with range requests, so sessions never hold video
+    bytes in memory and players can seek without downloading everything.
+    Returns None if the server cannot listen at all.
+    """
+    try:
+        return VideoServer(VIDEO_DIR)
+    except OSError as e:
+        print(f"⚠️ Video server unavailable, serving videos through Streamlit: {e}")
+        return None
+
+video_server = get_video_server()
+
+def video_base_url():
+    """Video server URL for this browser, or None to send videos through Streamlit."""
+    if video_server is None:
+        return None
+    return video_server.base_url(st.context.headers.get("Host"))
+
+def show_video(path):
+    base_url = video_base_url()
+    st.video(video_server.url(path, base_url=base_url) if base_url else path)
+
+def show_download(path):
+    base_url = video_base_url()
+    if base_url:
+        st.link_button(
+            label="⬇️ Download Your Creation",
+            url=video_server.url(path, download=True, base_url=base_url),
+            use_container_width=True
+        )
+        return
+    with open(path, 'rb') as video_file:
+        st.download_button(
+            label="⬇️ Download Your Creation",
+            data=video_file,
+            file_name=os.path.basename(path),
+            mime="video/mp4",
+            use_container_width=True
+        )
+
 # --- Initialize Session State ---
 if 'generation_complete' not in st.session_state:
     st.session_state.generation_complete = False
     st.session_state.story_data = None
     st.session_state.image_paths = []
     st.session_state.video_path = None
+    # A refreshed tab picks its running job back up from the URL
+    job_id = st.query_params.get("job")
+    st.session_state.workspace = JobWorkspace.open(job_id) if job_id else None
+    if job_id and st.session_state.workspace is None:
+        st.query_params.clear()
+
+# --- Story Rendering ---
+def show_scenes(story_data, image_paths, in_progress=False):
+    """Title and scenes; while rendering, scenes whose image is not ready yet get a placeholder."""
+    st.markdown(f"### {story_data['title']}")
+    for i, scene in enumerate(story_data['scenes']):
+        col1, col2 = st.columns([1, 2])
+        with col1:
+            if i < len(image_paths) and image_paths[i] and os.path.exists(image_paths[i]):
+                st.image(image_paths[i], use_container_width=True)
+            elif in_progress:
+                st.caption("🎨 Painting this scene...")
+        with col2:
+            st.markdown(f"*{scene['text']}*")
+        if i < len(story_data['scenes']) - 1:
+            st.markdown("---")
+
+def show_progress(job_status):
+    """Everything a running job has published so far: story, finished scenes and the preview."""
+    story_data = job_status.get("story_data")
+    if not story_data:
+        st.info("🧠 Crafting your story with AI brilliance...")
+        return
+    long_form = job_status.get("long_form")
+    if long_form:
+        # Long-form jobs publish one window of scenes at a time; its images are already gone
+        st.info(f"🧩 {long_form['scenes']}/{long_form['scene_count']} scenes rendered in {long_form['windows']} windows")
+        st.markdown('<div class="content-card">', unsafe_allow_html=True)
+        st.markdown("## 📖 Latest Scenes")
+        show_scenes(story_data, [])
+        st.markdown('</div>', unsafe_allow_html=True)
+        return
+    scene_images = job_status.get("scene_images", {})
+    image_paths = [scene_images.get(str(i)) for i in range(len(story_data['scenes']))]
+    narration = "ready" if job_status.get("narration_results") else "recording"
+    st.info(f"🎨 {len(scene_images)}/{len(image_paths)} scenes painted · 🎧 Narration {narration}")
+
+    preview_path = job_status.get("preview_path")
+    if preview_path and os.path.exists(preview_path):
+        _, col2, _ = st.columns([1, 1, 1])
+        with col2:
+            show_video(preview_path)
+            st.caption("👀 Low-res preview, the final video is still encoding...")
+
+    st.markdown('<div class="content-card">', unsafe_allow_html=True)
+    st.markdown("## 📖 Your Story Unveiled")
+    show_scenes(story_data, image_paths, in_progress=True)
+    st.markdown('</div>', unsafe_allow_html=True)
 
 # --- User Input Form ---
 with st.form("video_form"):
@@ -273,84 +402,122 @@ if submitted:
     st.session_state.story_data = None
     st.session_state.image_paths = []
     st.session_state.video_path = None
-    cleanup_images()
+    # Only this session's previous job is cleared; other sessions keep their files
+    if st.session_state.workspace is not None:
+        st.session_state.workspace.cleanup(keep_outputs=False)
+    # Expired jobs of sessions that never came back (see JOB_TTL_HOURS)
+    cleanup_stale_jobs()
+    workspace = JobWorkspace()
 
-    try:
-        # Initialize clients (only returns gemini_client now since elevenlabs uses global API key)
-        gemini_client = initialize_clients(GOOGLE_API_KEY)
-
-        with st.spinner("🧠 Crafting your story with AI brilliance..."):
-            st.session_state.story_data = generate_story_with_prompts(user_prompt, gemini_client)
-        st.success("✨ Story crafted to perfection!")
-
-        with st.spinner("🎨 Painting your imagination with AI artistry..."):
-            for i, scene in enumerate(st.session_state.story_data['scenes']):
-                img_path = generate_image_with_gemini(scene['image_prompt'], i, gemini_client)
-                if img_path:
-                    st.session_state.image_paths.append(img_path)
-        st.success("🖼️ Visual masterpieces created!")
-
-        if not st.session_state.image_paths:
-            st.error("⚠️ Image generation failed for all scenes. Cannot create video.")
-            st.stop()
-
-        with st.spinner("🎙️ Breathing life into words with cinematic narration..."):
-            full_narration_text = st.session_state.story_data.get('title', '') + ". " + " ".join([scene['text'] for scene in st.session_state.story_data['scenes']])
-            # Updated to remove elevenlabs_client parameter since it's no longer needed
-            narration_path = generate_narration_elevenlabs(full_narration_text, "narration.mp3")
-        st.success("🎧 Narration perfected!")
-            
-        # Display Story Content
-        st.markdown('<div class="content-card">', unsafe_allow_html=True)
-        st.markdown("## 📖 Your Story Unveiled")
-        story_data = st.session_state.story_data
-        if story_data:
-            st.markdown(f"### {story_data['title']}")
-            for i, scene in enumerate(story_data['scenes']):
-                col1, col2 = st.columns([1, 2])
-                with col1:
-                    if i < len(st.session_state.image_paths):
-                        st.image(st.session_state.image_paths[i], use_container_width=True)
-                with col2:
-                    st.markdown(f"*{scene['text']}*")
-                if i < len(story_data['scenes']) - 1:
-                    st.markdown("---")
-        st.markdown('</div>', unsafe_allow_html=True)
+    workspace.write_status("queued")
+    if submit_render(workspace, run_render_job, workspace.job_id, user_prompt, GOOGLE_API_KEY):
+        st.session_state.workspace = workspace
+        st.query_params["job"] = workspace.job_id
+    else:
+        workspace.cleanup(keep_outputs=False)
+        st.session_state.workspace = None
 
-        with st.spinner("🎬 Weaving everything into cinematic gold..."):
-            st.session_state.video_path = images_to_video_ffmpeg(narration_path, st.session_state.story_data['title'])
-        st.success("🎉 Cinematic masterpiece completed!")
+# --- Job Status Polling ---
+if st.session_state.workspace is not None and not st.session_state.generation_complete:
+    workspace = st.session_state.workspace
+    job_status = workspace.read_status() or {"status": "missing"}
+    handle = render_pool.get(workspace.job_id)
+    if job_status["status"] in ("queued", "running"):
+        if handle is not None and handle.status == "failed":
+            # Worker died before it could record the failure itself
+            job_status = {"status": "failed", "error": str(handle.future.exception())}
+        elif handle is None and (workspace.status_age() or 0) > JOB_LOST_SECONDS:
+            # No worker of this server owns the job and it stopped reporting: lost in a restart
+            job_status = {"status": "failed", "error": "The render was lost when the server restarted. Please generate it again."}
+        if job_status["status"] == "failed":
+            workspace.write_status("failed", error=job_status["error"])
+    if job_status["status"] in ("done", "failed"):
+        render_pool.forget(workspace.job_id)
+
+    if job_status["status"] in ("queued", "running"):
+        if job_status["status"] == "queued":
+            st.info("⏳ Your vision is queued for rendering...")
+        else:
+            show_progress(job_status)
+        time.sleep(POLL_INTERVAL_SECONDS)
+        st.rerun()
+    elif job_status["status"] == "failed":
+        st.error(f"⚠️ Creative process interrupted: {job_status.get('error')}")
+    elif job_status["status"] == "missing":
+        st.session_state.workspace = None
+        st.query_params.clear()
+        st.warning("🔍 That render job could not be found. Please generate a new one.")
+    else:
+        st.session_state.story_data = job_status["story_data"]
+        st.session_state.image_paths = job_status["image_paths"]
+        st.session_state.video_path = job_status["video_path"]
+        st.session_state.image_failures = job_status["image_failures"]
+        st.session_state.report = job_status["report"]
         st.session_state.generation_complete = True
         st.balloons()
 
-    except Exception as e:
-        st.error(f"⚠️ Creative process interrupted: {e}")
+# --- Display Story Content ---
+if st.session_state.generation_complete:
+    st.success("🎉 Cinematic masterpiece completed!")
+    if st.session_state.image_failures:
+        st.warning(f"⚠️ {len(st.session_state.image_failures)} scene image(s) could not be generated and were skipped.")
+    report = st.session_state.report
+    st.caption("⏱️ Critical path: " + " → ".join(
+        f"{name} {report['stages'][name]['duration']:.1f}s" for name in report['critical_path']
+    ))
+
+    st.markdown('<div class="content-card">', unsafe_allow_html=True)
+    st.markdown("## 📖 Your Story Unveiled")
+    if st.session_state.story_data:
+        show_scenes(st.session_state.story_data, st.session_state.image_paths)
+    st.markdown('</div>', unsafe_allow_html=True)
 
 # --- Display Results ---
 if st.session_state.generation_complete:
     st.markdown('<div class="content-card pulse">', unsafe_allow_html=True)
     st.markdown("## 🏆 Behold Your Masterpiece")
     if st.session_state.video_path and os.path.exists(st.session_state.video_path):
-        with open(st.session_state.video_path, 'rb') as video_file:
-            video_bytes = video_file.read()
-        
+        # The browser fetches the file from the video server; nothing is read here
         _, col2, _ = st.columns([0.5, 2, 0.5])
         with col2:
-            st.video(video_bytes)
+            show_video(st.session_state.video_path)
         
         _, col2, _ = st.columns([1, 1, 1])
         with col2:
-            st.download_button(
-                label="⬇️ Download Your Creation",
-                data=video_bytes,
-                file_name=os.path.basename(st.session_state.video_path),
-                mime="video/mp4",
-                use_container_width=True
-            )
+            show_download(st.session_state.video_path)
     else:
         st.error("🎬 Video file not found. The magic seems to have gone missing!")
     st.markdown('</div>', unsafe_allow_html=True)
 
+# --- Scene Editing ---
+# Re-renders the finished job in place; only edited scenes are regenerated and re-encoded
+rerender = False
+if st.session_state.generation_complete and st.session_state.story_data:
+    story = st.session_state.story_data
+    with st.expander("✏️ Edit scenes and re-render"):
+        with st.form("edit_form"):
+            edited_title = st.text_input("Title", story['title'])
+            edited_scenes = []
+            for i, scene in enumerate(story['scenes']):
+                st.markdown(f"**Scene {i+1}**")
+                edited_scenes.append({
+                    "text": st.text_area("Narration", scene['text'], key=f"edit_text_{i}"),
+                    "image_prompt": st.text_area("Image prompt", scene['image_prompt'], key=f"edit_prompt_{i}"),
+                })
+            rerender = st.form_submit_button("Re-render", use_container_width=True)
+
+if rerender:
+    workspace = st.session_state.workspace
+    previous = workspace.read_status() or {}
+    # Written before submitting so a fast worker's "running" is never overwritten
+    workspace.write_status("queued")
+    if submit_render(workspace, run_rerender_job, workspace.job_id,
+                     {"title": edited_title, "scenes": edited_scenes}, GOOGLE_API_KEY):
+        st.session_state.generation_complete = False
+        st.rerun()
+    # Rejected: the finished render stays as it was
+    workspace.write_status("done", **{k: v for k, v in previous.items() if k not in ("job_id", "status", "updated_at")})
+
 # --- Footer ---
 st.markdown("""
 <div style="text-align: center; padding: 40px 0 20px 0; color: rgba(255,255,255,0.6);">
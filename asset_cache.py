@@ -0,0 +1,129 @@
+import os
+import glob
+import hashlib
+import json
+import shutil
+import tempfile
+import threading
+
+# Cache location and disk budget, overridable from the environment
+CACHE_DIR = os.getenv("ASSET_CACHE_DIR", ".asset_cache")
+CACHE_MAX_BYTES = int(float(os.getenv("ASSET_CACHE_MAX_MB", "1024")) * 1024 * 1024)
+
+def asset_key(provider, model, content, voice=None):
+    """Content address for a generated asset: hash of provider, model, prompt/text and voice."""
+    payload = json.dumps([provider, model, content, voice], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class AssetCache:
+    """
+    Content-addressed on-disk cache for provider outputs (images, narration).
+    Entries are written atomically and evicted least-recently-used first once
+    the cache grows past max_bytes. Safe to share between threads.
+    """
+    def __init__(self, root=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._size = None
+
+    def _path(self, key, ext):
+        return os.path.join(self.root, key[:2], key + ext)
+
+    def get(self, key, ext):
+        """Returns the cached file path for key, or None on a miss."""
+        path = self._path(key, ext)
+        with self._lock:
+            if not os.path.exists(path):
+                self.misses += 1
+                return None
+            self.hits += 1
+        try:
+            # Touch the entry so eviction sees it as recently used
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    def copy_to(self, key, ext, dest_path):
+        """Copies a cached entry to dest_path. Returns True on a hit."""
+        path = self.get(key, ext)
+        if path is None:
+            return False
+        try:
+            shutil.copyfile(path, dest_path)
+        except OSError:
+            # Evicted between lookup and copy
+            return False
+        return True
+
+    def put(self, key, data, ext):
+        """Stores bytes under key with an atomic rename and returns the entry path."""
+        path = self._path(key, ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._account(len(data))
+        return path
+
+    def put_file(self, key, src_path, ext):
+        """Stores a copy of an existing file under key."""
+        with open(src_path, "rb") as f:
+            return self.put(key, f.read(), ext)
+
+    def _entries(self):
+        entries = []
+        for path in glob.glob(os.path.join(self.root, "*", "*")):
+            if path.endswith(".tmp"):
+                continue
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def _account(self, added_bytes):
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._entries())
+            else:
+                self._size += added_bytes
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Drops least-recently-used entries until the cache fits its budget. Caller holds the lock."""
+        entries = sorted(self._entries())
+        self._size = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self._size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                self._size -= size
+            except OSError:
+                pass
+
+    def stats(self):
+        """Hit/miss counters and current size of the cache."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "size_bytes": self._size if self._size is not None else sum(size for _, size, _ in self._entries()),
+            }
+
+# Process-wide cache shared by all generators
+asset_cache = AssetCache()
@@ -0,0 +1,162 @@
+import os
+import wave
+import subprocess
+import numpy as np
+
+from music_library import MIX_SAMPLE_RATE
+
+# Narration-driven ducking: music drops to DUCK_GAIN while someone is speaking
+DUCK_GAIN = float(os.getenv("DUCK_GAIN", "0.5"))
+DUCK_THRESHOLD_DB = float(os.getenv("DUCK_THRESHOLD_DB", "-40"))
+DUCK_WINDOW_SECONDS = 0.02
+# Attack/release smoothing of the ducking envelope
+DUCK_SMOOTHING_SECONDS = 0.25
+# Soft limiter: samples below the knee pass unchanged, louder ones are squeezed into (knee, 1)
+LIMITER_KNEE = float(os.getenv("LIMITER_KNEE", "0.9"))
+
+def read_wav(path):
+    """Reads a 16-bit PCM WAV as mono float32 in [-1, 1]. Returns (samples, rate)."""
+    with wave.open(path, "rb") as wav:
+        if wav.getsampwidth() != 2:
+            raise ValueError(f"{path}: only 16-bit PCM is supported")
+        channels, rate = wav.getnchannels(), wav.getframerate()
+        samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype="<i2")
+    samples = samples.astype(np.float32) / 32768.0
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    return samples, rate
+
+def read_wav_looped(path, offset, length):
+    """
+    length mono float32 samples of a 16-bit PCM WAV starting at sample offset,
+    wrapping around to the start as often as needed. Only those samples are
+    read, so a long video can take its music window by window.
+    """
+    parts = []
+    with wave.open(path, "rb") as wav:
+        if wav.getsampwidth() != 2:
+            raise ValueError(f"{path}: only 16-bit PCM is supported")
+        channels, total = wav.getnchannels(), wav.getnframes()
+        if total == 0:
+            return np.zeros(length, dtype=np.float32)
+        position = offset % total
+        wav.setpos(position)
+        remaining = length
+        while remaining > 0:
+            take = min(remaining, total - position)
+            parts.append(wav.readframes(take))
+            remaining -= take
+            position = 0
+            wav.rewind()
+    samples = np.frombuffer(b"".join(parts), dtype="<i2").astype(np.float32) / 32768.0
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    return samples
+
+def decode_audio(path, rate=MIX_SAMPLE_RATE):
+    """
+    Loads any audio file as mono float32 at rate. WAVs are read directly;
+    anything else (e.g. ElevenLabs MP3) is decoded by ffmpeg straight into memory.
+    """
+    if path.lower().endswith(".wav"):
+        samples, source_rate = read_wav(path)
+        return resample(samples, source_rate, rate)
+    raw = subprocess.run(
+        ["ffmpeg", "-v", "error", "-i", path, "-f", "s16le", "-ac", "1", "-ar", str(rate), "pipe:1"],
+        check=True, capture_output=True
+    ).stdout
+    return np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+
+def resample(samples, source_rate, target_rate):
+    """Linear-interpolation resampling; plenty for speech and background music."""
+    if source_rate == target_rate or len(samples) == 0:
+        return samples
+    length = int(round(len(samples) * target_rate / source_rate))
+    positions = np.arange(length, dtype=np.float64) * (source_rate / target_rate)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+def fit_length(samples, length):
+    """Loops (tiles) or trims samples to exactly length."""
+    if len(samples) == 0:
+        return np.zeros(length, dtype=np.float32)
+    if len(samples) >= length:
+        return samples[:length]
+    return np.resize(samples, length)
+
+def ducking_envelope(narration, rate, duck_gain=DUCK_GAIN, threshold_db=DUCK_THRESHOLD_DB):
+    """
+    Per-sample music gain: 1.0 in pauses, duck_gain while the narration's
+    short-term RMS is above threshold_db, with smoothed transitions.
+    """
+    window = max(1, int(rate * DUCK_WINDOW_SECONDS))
+    frames = len(narration) // window
+    if frames == 0:
+        return np.ones(len(narration), dtype=np.float32)
+    blocks = narration[:frames * window].reshape(frames, window)
+    rms = np.sqrt(np.mean(blocks * blocks, axis=1))
+    speaking = (rms > 10 ** (threshold_db / 20)).astype(np.float32)
+
+    # Never wider than the signal: mode="same" would return the kernel's length instead
+    smoothing = max(1, min(frames, int(DUCK_SMOOTHING_SECONDS / DUCK_WINDOW_SECONDS)))
+    kernel = np.ones(smoothing, dtype=np.float32) / smoothing
+    speaking = np.convolve(speaking, kernel, mode="same")
+    gain = 1.0 - (1.0 - duck_gain) * speaking
+
+    # Window centres to per-sample gain
+    centres = np.arange(frames) * window + window / 2
+    return np.interp(np.arange(len(narration)), centres, gain).astype(np.float32)
+
+def limit(samples, knee=LIMITER_KNEE):
+    """
+    Soft-clips samples in place: magnitudes above knee follow a tanh curve that
+    meets the straight line smoothly at the knee and never reaches full scale.
+    Only the peaks change, so one loud moment does not turn the whole track down.
+    """
+    over = np.abs(samples) > knee
+    if np.any(over):
+        headroom = 1.0 - knee
+        peaks = samples[over]
+        samples[over] = np.sign(peaks) * (knee + headroom * np.tanh((np.abs(peaks) - knee) / headroom))
+    return samples
+
+def mix(narration, music, music_volume, duck=True, rate=MIX_SAMPLE_RATE):
+    """Narration plus looped, attenuated and optionally ducked music; peaks are soft-limited below full scale."""
+    music = fit_length(music, len(narration)) * np.float32(music_volume)
+    if duck:
+        music *= ducking_envelope(narration, rate)
+    return limit(narration + music)
+
+def to_pcm(samples):
+    """float32 samples as raw little-endian 16-bit PCM bytes (ffmpeg's s16le)."""
+    return (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
+def write_wav(path, samples, rate=MIX_SAMPLE_RATE):
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(to_pcm(samples))
+    return path
+
+def mix_files(narration_path, music_path, music_volume, duck=True, rate=MIX_SAMPLE_RATE):
+    """Decodes and mixes narration and background music; returns the mixed samples at rate."""
+    narration = decode_audio(narration_path, rate)
+    music = decode_audio(music_path, rate)
+    return mix(narration, music, music_volume, duck=duck, rate=rate)
+
+def mix_to_pcm(narration_path, music_path, music_volume, duck=True, rate=MIX_SAMPLE_RATE):
+    """
+    Like mix_to_wav but keeps the result in memory as s16le bytes, to be piped
+    straight into ffmpeg. Returns (pcm, duration_seconds).
+    """
+    mixed = mix_files(narration_path, music_path, music_volume, duck=duck, rate=rate)
+    return to_pcm(mixed), len(mixed) / rate
+
+def mix_to_wav(narration_path, music_path, output_path, music_volume, duck=True, rate=MIX_SAMPLE_RATE):
+    """
+    Mixes narration and background music in-process and writes the result as
+    mono PCM WAV at rate, ready to be muxed. Returns (output_path, duration_seconds).
+    """
+    mixed = mix_files(narration_path, music_path, music_volume, duck=duck, rate=rate)
+    write_wav(output_path, mixed, rate)
+    return output_path, len(mixed) / rate
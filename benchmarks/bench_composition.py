@@ -0,0 +1,42 @@
+"""
+Compares main.images_to_video_ffmpeg in single-pass mode against the original
+multi-pass composition. Every output is checked to last as long as the
+narration and to show every scene, so a truncated file fails the run instead
+of looking fast. Run from the repository root:
+
+    python -m benchmarks.bench_composition --scenes 5 --seconds 60
+"""
+import argparse
+import os
+import shutil
+import tempfile
+
+from benchmarks.common import check_slideshow, make_fixture_audio, make_fixture_images, measure, print_table
+import main
+
+def run(scenes, seconds, repeats):
+    work_dir = tempfile.mkdtemp(prefix="bench_composition_")
+    try:
+        image_paths = make_fixture_images(os.path.join(work_dir, "images"), scenes)
+        narration = make_fixture_audio(os.path.join(work_dir, "narration.mp3"), seconds)
+
+        rows = []
+        for mode, single_pass in (("multi-pass", False), ("single-pass", True)):
+            for i in range(repeats):
+                output_dir = os.path.join(work_dir, f"{mode}_{i}")
+                final_output, stats = measure(main.images_to_video_ffmpeg, image_paths, narration, output_dir, single_pass=single_pass)
+                video_s = check_slideshow(final_output, [seconds / scenes] * scenes)
+                rows.append({"mode": mode, "run": i + 1, **stats, "video_s": video_s,
+                             "output_mb": os.path.getsize(final_output) / (1024 * 1024)})
+        print_table(f"Composition, {scenes} scenes, {seconds}s narration", rows,
+                    ["mode", "run", "wall_s", "child_cpu_s", "child_write_mb", "video_s", "output_mb"])
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scenes", type=int, default=5)
+    parser.add_argument("--seconds", type=float, default=60)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    run(args.scenes, args.seconds, args.repeats)
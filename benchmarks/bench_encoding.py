@@ -0,0 +1,42 @@
+"""
+Compares video_generator's encode modes (single graph, parallel segments and
+the still-image fast path) for growing scene counts. Run from the repository root:
+
+    python -m benchmarks.bench_encoding --scenes 5 20 100 --seconds-per-scene 3
+"""
+import argparse
+import os
+import shutil
+import tempfile
+
+from benchmarks.common import make_fixture_audio, make_fixture_images, measure, print_table
+import video_generator
+
+def run(scene_counts, seconds_per_scene, modes):
+    rows = []
+    for scenes in scene_counts:
+        work_dir = tempfile.mkdtemp(prefix="bench_encoding_")
+        try:
+            image_paths = make_fixture_images(os.path.join(work_dir, "images"), scenes)
+            narration = make_fixture_audio(os.path.join(work_dir, "narration.wav"), scenes * seconds_per_scene)
+            durations = [seconds_per_scene] * scenes
+            for mode in modes:
+                workspace = video_generator.JobWorkspace(root=work_dir, output_root=work_dir)
+                final_output, stats = measure(
+                    video_generator.images_to_video_ffmpeg, narration, f"bench_{mode}",
+                    image_paths=image_paths, workspace=workspace, durations=durations, encode_mode=mode
+                )
+                rows.append({"scenes": scenes, "mode": mode, **stats,
+                             "output_mb": os.path.getsize(final_output) / (1024 * 1024)})
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    print_table(f"Encoding, {seconds_per_scene}s per scene, {video_generator.ENCODE_WORKERS} workers", rows,
+                ["scenes", "mode", "wall_s", "child_cpu_s", "output_mb"])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scenes", type=int, nargs="+", default=[5, 20, 100])
+    parser.add_argument("--seconds-per-scene", type=float, default=3)
+    parser.add_argument("--modes", nargs="+", default=["graph", "segments", "still"])
+    args = parser.parse_args()
+    run(args.scenes, args.seconds_per_scene, args.modes)
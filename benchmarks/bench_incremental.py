@@ -0,0 +1,87 @@
+"""
+Cost of re-rendering a finished video after a one-scene edit, against the
+offline fake Gemini client: the first render (the app's pipeline, which leaves
+the job's manifest), an unchanged re-render, and re-renders after editing one
+scene's image prompt or narration. Each re-render is checked to regenerate and
+re-encode only the edited scene. Run from the repository root:
+
+    python -m benchmarks.bench_incremental --scenes 5 10
+"""
+import argparse
+import copy
+import os
+import shutil
+import tempfile
+
+from benchmarks.common import measure, print_table
+from benchmarks.fake_providers import FakeGeminiClient
+from asset_cache import asset_cache
+import video_generator
+
+# What each re-render may regenerate: (images, narrations, most segments encoded)
+EXPECTED = {
+    "unchanged": (0, 0, 0),
+    "edit_image": (1, 0, 1),
+    "edit_text": (0, 1, 1),
+}
+
+def edits(story_data):
+    """(name, story_data) for every re-render the benchmark times, in order."""
+    middle = len(story_data["scenes"]) // 2
+    new_image = copy.deepcopy(story_data)
+    new_image["scenes"][middle]["image_prompt"] += ", now at night"
+    new_text = copy.deepcopy(new_image)
+    new_text["scenes"][middle]["text"] += " Then the lights went out."
+    return [("unchanged", story_data), ("edit_image", new_image), ("edit_text", new_text)]
+
+def first_render(prompt, client, workspace):
+    """The app's first render of a job, which generates every scene; returns story_data."""
+    values, _ = video_generator.run_pipeline(
+        video_generator.build_video_pipeline(incremental=True),
+        {"user_prompt": prompt, "gemini_client": client, "workspace": workspace}
+    )
+    if not os.path.exists(workspace.output_path("manifest.json")):
+        raise ValueError("The first render left no manifest for later edits")
+    return values["story_data"]
+
+def run(scene_counts, latency):
+    work_dir = tempfile.mkdtemp(prefix="bench_incremental_")
+    # Keep the shared asset cache out of the measurement
+    asset_cache.root = os.path.join(work_dir, "cache")
+    rows = []
+    try:
+        for scene_count in scene_counts:
+            client = FakeGeminiClient(scenes=scene_count, image_size=640, latency=latency)
+            workspace = video_generator.JobWorkspace(root=work_dir, output_root=work_dir)
+            story_data, timing = measure(first_render, f"incremental benchmark {scene_count}", client, workspace)
+            rows.append({"scenes": scene_count, "render": "first_render", "wall_s": timing["wall_s"],
+                         "child_cpu_s": timing["child_cpu_s"], "images": scene_count, "narrations": scene_count,
+                         "encoded": scene_count, "reused": 0})
+            for name, edited in edits(story_data):
+                (_, stats), timing = measure(video_generator.render_incremental, edited, workspace, client)
+                images, narrations, max_encoded = EXPECTED[name]
+                if (stats["images_generated"], stats["narrations_generated"]) != (images, narrations) \
+                        or stats["segments_encoded"] > max_encoded:
+                    raise ValueError(f"{name} with {scene_count} scenes regenerated more than the edited scene: {stats}")
+                rows.append({
+                    "scenes": scene_count,
+                    "render": name,
+                    "wall_s": timing["wall_s"],
+                    "child_cpu_s": timing["child_cpu_s"],
+                    "images": stats["images_generated"],
+                    "narrations": stats["narrations_generated"],
+                    "encoded": stats["segments_encoded"],
+                    "reused": stats["segments_reused"],
+                })
+            workspace.cleanup(keep_outputs=False)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    print_table("Incremental re-render after a one-scene edit", rows,
+                ["scenes", "render", "wall_s", "child_cpu_s", "images", "narrations", "encoded", "reused"])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scenes", type=int, nargs="+", default=[5, 10])
+    parser.add_argument("--latency", type=float, default=0.2, help="mean fake provider latency in seconds")
+    args = parser.parse_args()
+    run(args.scenes, args.latency)
@@ -0,0 +1,78 @@
+"""
+Per-image CPU cost of storing provider images: the old PIL decode + default
+PNG re-encode against image_ingest, plus the ffmpeg CPU of encoding one scene
+from each result. Run from the repository root:
+
+    python -m benchmarks.bench_ingest --images 10 --size 1024
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from io import BytesIO
+
+from PIL import Image
+
+from benchmarks.common import make_fixture_images, measure, print_table
+from image_ingest import INGEST_SIZE, ingest_image
+import video_generator
+
+def legacy_ingest(data, path):
+    """What the generators did before: full decode and a default-level PNG save."""
+    Image.open(BytesIO(data)).save(path)
+    return path
+
+def provider_payloads(work_dir, count, size):
+    """Detailed test-pattern images as PNG and JPEG bytes, like a provider would return."""
+    payloads = {"png": [], "jpeg": []}
+    for path in make_fixture_images(os.path.join(work_dir, "fixtures"), count, size):
+        with open(path, "rb") as f:
+            payloads["png"].append(f.read())
+        buffer = BytesIO()
+        Image.open(path).convert("RGB").save(buffer, format="JPEG", quality=92)
+        payloads["jpeg"].append(buffer.getvalue())
+    return payloads
+
+def run(count, size, seconds):
+    work_dir = tempfile.mkdtemp(prefix="bench_ingest_")
+    rows = []
+    try:
+        payloads = provider_payloads(work_dir, count, size)
+        methods = {
+            "legacy": legacy_ingest,
+            f"ingest_{INGEST_SIZE}": ingest_image,
+            "ingest_passthru": lambda data, path: ingest_image(data, path, size=0),
+        }
+        for fmt, datas in payloads.items():
+            for name, func in methods.items():
+                out_dir = os.path.join(work_dir, f"{fmt}_{name}")
+                os.makedirs(out_dir)
+                cpu = []
+                paths = []
+                for i, data in enumerate(datas):
+                    started = time.process_time()
+                    paths.append(func(data, os.path.join(out_dir, f"scene_{i+1}.png")))
+                    cpu.append(time.process_time() - started)
+                # ffmpeg cost of turning the stored image into a scene segment
+                _, stats = measure(video_generator.encode_scene_segment, paths[0], seconds,
+                                   os.path.join(out_dir, "segment.mp4"))
+                rows.append({
+                    "input": f"{fmt} {size}px",
+                    "method": name,
+                    "cpu_ms_per_image": sum(cpu) / len(cpu) * 1000,
+                    "stored_kb": sum(os.path.getsize(p) for p in paths) / len(paths) / 1024,
+                    "segment_cpu_s": stats["child_cpu_s"],
+                })
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    print_table(f"Image ingest, {count} images, {seconds}s scene encode", rows,
+                ["input", "method", "cpu_ms_per_image", "stored_kb", "segment_cpu_s"])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--images", type=int, default=10)
+    parser.add_argument("--size", type=int, default=1024, help="side length of the fake provider images")
+    parser.add_argument("--seconds", type=float, default=5, help="scene length for the ffmpeg encode comparison")
+    args = parser.parse_args()
+    run(args.images, args.size, args.seconds)
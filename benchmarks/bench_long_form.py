@@ -0,0 +1,71 @@
+"""
+Long-form mode against the offline fake Gemini client: wall time plus the
+largest resident memory and open file count seen between windows, for growing
+scene counts. Both should stay flat. Run from the repository root:
+
+    python -m benchmarks.bench_long_form --scenes 20 60 120
+"""
+import argparse
+import os
+import resource
+import shutil
+import tempfile
+import time
+
+from benchmarks.common import print_table
+from benchmarks.fake_providers import FakeGeminiClient
+from asset_cache import asset_cache
+from long_form import LONG_FORM_CHUNK_SCENES, render_long_form
+import video_generator
+
+def current_rss_mb():
+    """Resident set size right now (not the peak), in MiB."""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * resource.getpagesize() / (1024 * 1024)
+
+def open_files():
+    return len(os.listdir("/proc/self/fd"))
+
+class WindowSampler:
+    """Stands in for JobProgress and samples memory and open files after every window."""
+    def __init__(self):
+        self.rss_mb = []
+        self.files = []
+
+    def update(self, **fields):
+        self.rss_mb.append(current_rss_mb())
+        self.files.append(open_files())
+
+def run(scene_counts, chunk_scenes, latency):
+    work_dir = tempfile.mkdtemp(prefix="bench_long_form_")
+    # Keep the shared asset cache out of the measurement
+    asset_cache.root = os.path.join(work_dir, "cache")
+    rows = []
+    try:
+        for scene_count in scene_counts:
+            workspace = video_generator.JobWorkspace(root=work_dir, output_root=work_dir)
+            sampler = WindowSampler()
+            started = time.perf_counter()
+            _, stats = render_long_form(f"long-form benchmark {scene_count}", FakeGeminiClient(image_size=640, latency=latency),
+                                        workspace, scene_count, chunk_scenes=chunk_scenes, progress=sampler)
+            rows.append({
+                "scenes": scene_count,
+                "windows": stats["windows"],
+                "video_min": stats["duration_s"] / 60,
+                "wall_s": time.perf_counter() - started,
+                "max_rss_mb": max(sampler.rss_mb),
+                "max_open_files": max(sampler.files),
+            })
+            workspace.cleanup(keep_outputs=False)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    print_table(f"Long-form rendering, windows of {chunk_scenes} scenes", rows,
+                ["scenes", "windows", "video_min", "wall_s", "max_rss_mb", "max_open_files"])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scenes", type=int, nargs="+", default=[20, 60, 120])
+    parser.add_argument("--chunk-scenes", type=int, default=LONG_FORM_CHUNK_SCENES)
+    parser.add_argument("--latency", type=float, default=0.05, help="mean fake provider latency in seconds")
+    args = parser.parse_args()
+    run(args.scenes, args.chunk_scenes, args.latency)
@@ -0,0 +1,72 @@
+"""
+Cost of mixing narration with background music: the ffmpeg loop/volume/amix
+passes against audio_mixer's in-process NumPy mix. Run from the repository root:
+
+    python -m benchmarks.bench_mixer --seconds 60 --repeats 3
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import ffmpeg
+
+from benchmarks.common import make_fixture_audio, measure, print_table
+from audio_mixer import mix_to_wav
+from music_library import MIX_SAMPLE_RATE
+from video_generator import run_ffmpeg
+
+MUSIC_VOLUME = 0.15
+
+def ffmpeg_mix(narration_path, music_path, output_path, music_volume):
+    """The amix graph video_generator used before audio_mixer."""
+    narration = ffmpeg.input(narration_path)
+    quiet_music = ffmpeg.input(music_path, stream_loop=-1).filter('volume', music_volume)
+    mixed = ffmpeg.filter_([narration, quiet_music], 'amix', inputs=2, duration='first', dropout_transition=0)
+    run_ffmpeg(ffmpeg.output(mixed, output_path, acodec='pcm_s16le', ar=MIX_SAMPLE_RATE, ac=1))
+    return output_path
+
+def run(seconds, repeats):
+    work_dir = tempfile.mkdtemp(prefix="bench_mixer_")
+    rows = []
+    try:
+        fixtures = {
+            "wav": make_fixture_audio(os.path.join(work_dir, "narration.wav"), seconds),
+            "mp3": make_fixture_audio(os.path.join(work_dir, "narration.mp3"), seconds),
+        }
+        # Music as the library stores it: shorter than the narration so it has to loop
+        music_path = make_fixture_audio(os.path.join(work_dir, "music.wav"), max(1, seconds / 3), rate=MIX_SAMPLE_RATE)
+        methods = {
+            "ffmpeg_amix": ffmpeg_mix,
+            "numpy": lambda n, m, o, v: mix_to_wav(n, m, o, v),
+            "numpy_noduck": lambda n, m, o, v: mix_to_wav(n, m, o, v, duck=False),
+        }
+        for fmt, narration_path in fixtures.items():
+            for name, func in methods.items():
+                output_path = os.path.join(work_dir, f"{fmt}_{name}.wav")
+                walls, child_cpu, self_cpu = [], [], []
+                for _ in range(repeats):
+                    started = time.process_time()
+                    _, stats = measure(func, narration_path, music_path, output_path, MUSIC_VOLUME)
+                    self_cpu.append(time.process_time() - started)
+                    walls.append(stats["wall_s"])
+                    child_cpu.append(stats["child_cpu_s"])
+                rows.append({
+                    "narration": f"{fmt} {seconds:.0f}s",
+                    "mixer": name,
+                    "wall_s": min(walls),
+                    "self_cpu_s": min(self_cpu),
+                    "child_cpu_s": min(child_cpu),
+                })
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    print_table(f"Audio mix, best of {repeats}", rows,
+                ["narration", "mixer", "wall_s", "self_cpu_s", "child_cpu_s"])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--seconds", type=float, default=60, help="narration length")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    run(args.seconds, args.repeats)
@@ -0,0 +1,117 @@
+"""
+End-to-end pipeline benchmark against the offline fake providers, so it runs
+on a plain CI box with no network or API keys. Run from the repository root:
+
+    python -m benchmarks.bench_pipeline --target both --jobs 8 --concurrency 2
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import peak_rss_mb, percentile, print_table
+from benchmarks.fake_providers import FakeElevenLabsClient, FakeGeminiClient, FakeOpenAIClient
+from asset_cache import asset_cache
+import main
+import video_generator
+
+def _run_video_generator_job(job_index, args, work_dir):
+    workspace = video_generator.JobWorkspace(root=work_dir, output_root=work_dir)
+    gemini_client = FakeGeminiClient(
+        scenes=args.scenes, latency=args.latency, error_rate=args.error_rate, seed=job_index
+    )
+    values, report = video_generator.run_pipeline(
+        video_generator.build_video_pipeline(per_scene_narration=args.per_scene_narration, encode_mode=args.encode_mode,
+                                             stream_story=not args.no_stream_story),
+        {"user_prompt": f"benchmark job {job_index}", "gemini_client": gemini_client, "workspace": workspace}
+    )
+    return report, values.get("first_image_request_s")
+
+def _run_main_job(job_index, args, work_dir):
+    workspace = video_generator.JobWorkspace(root=work_dir, output_root=work_dir)
+    values, report = video_generator.run_pipeline(
+        main.build_pipeline(per_scene_narration=args.per_scene_narration, stream_story=not args.no_stream_story),
+        {"user_prompt": f"benchmark job {job_index}", "workspace": workspace}
+    )
+    return report, values.get("first_image_request_s")
+
+def _install_main_fakes(args):
+    backend = dict(latency=args.latency, error_rate=args.error_rate)
+    main.openai_client = FakeOpenAIClient(scenes=args.scenes, **backend)
+    main.elevenlabs = FakeElevenLabsClient(**backend)
+    main.gemini_client = FakeGeminiClient(scenes=args.scenes, **backend)
+
+def run_target(target, args):
+    work_dir = tempfile.mkdtemp(prefix=f"bench_pipeline_{target}_")
+    # Keep the shared asset cache out of the measurement
+    asset_cache.root = os.path.join(work_dir, "cache")
+    run_job = _run_video_generator_job if target == "video_generator" else _run_main_job
+    if target == "main":
+        _install_main_fakes(args)
+
+    reports, first_requests, errors = [], [], []
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            futures = [pool.submit(run_job, i, args, work_dir) for i in range(args.jobs)]
+            for future in futures:
+                try:
+                    report, first_request = future.result()
+                    reports.append(report)
+                    if first_request is not None:
+                        first_requests.append(first_request)
+                except Exception as e:
+                    errors.append(str(e))
+        elapsed = time.perf_counter() - started
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    stage_names = sorted({name for report in reports for name in report["stages"]})
+    rows = []
+    for name in stage_names + ["first_image_request", "total"]:
+        if name == "total":
+            values = [report["total_duration"] for report in reports]
+        elif name == "first_image_request":
+            values = first_requests
+        else:
+            values = [report["stages"][name]["duration"] for report in reports if name in report["stages"]]
+        rows.append({"stage": name, "p50_s": percentile(values, 50), "p95_s": percentile(values, 95),
+                     "p99_s": percentile(values, 99), "max_s": max(values) if values else float("nan")})
+    print_table(f"{target}: {args.jobs} jobs, {args.concurrency} concurrent, {args.scenes} scenes", rows,
+                ["stage", "p50_s", "p95_s", "p99_s", "max_s"])
+
+    summary = {
+        "target": target,
+        "jobs_ok": len(reports),
+        "jobs_failed": len(errors),
+        "elapsed_s": elapsed,
+        "jobs_per_minute": len(reports) / elapsed * 60 if elapsed else 0.0,
+        **peak_rss_mb(),
+        "stages": {row["stage"]: {k: v for k, v in row.items() if k != "stage"} for row in rows},
+    }
+    print(f"🚀 {summary['jobs_per_minute']:.1f} jobs/min, {len(errors)} failed, "
+          f"peak RSS {summary['self_peak_rss_mb']:.0f} MiB (largest child {summary['child_peak_rss_mb']:.0f} MiB)")
+    return summary
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--target", choices=["video_generator", "main", "both"], default="both")
+    parser.add_argument("--jobs", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=2)
+    parser.add_argument("--scenes", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.2, help="mean fake provider latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--encode-mode", choices=video_generator.ENCODE_MODES, default=video_generator.ENCODE_MODE)
+    parser.add_argument("--per-scene-narration", action="store_true")
+    parser.add_argument("--no-stream-story", action="store_true", help="wait for the whole story before requesting images")
+    parser.add_argument("--json", help="also write the summary to this file for regression tracking")
+    args = parser.parse_args()
+
+    targets = ["video_generator", "main"] if args.target == "both" else [args.target]
+    summaries = [run_target(target, args) for target in targets]
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summaries, f, indent=2)
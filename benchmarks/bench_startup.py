@@ -0,0 +1,85 @@
+"""
+Measures cold-start cost and connection reuse. Each import is timed in a fresh
+interpreter, and the provider SDKs it pulled in are listed. With --url, it
+also compares a new HTTP client per request (a fresh TLS handshake every time)
+against one pooled keep-alive client. Run from the repository root:
+
+    python -m benchmarks.bench_startup --runs 5 --url https://generativelanguage.googleapis.com
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+from benchmarks.common import percentile, print_table
+
+PROVIDER_MODULES = ("openai", "elevenlabs", "google.genai", "httpx", "mutagen")
+
+_IMPORT_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"import_s": elapsed, "loaded": [m for m in {providers!r} if m in sys.modules]}}))
+"""
+
+def time_import(module, runs):
+    """Imports module in runs fresh interpreters; returns timings and the provider SDKs it loaded."""
+    timings, loaded = [], []
+    for _ in range(runs):
+        started = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, "-c", _IMPORT_PROBE.format(module=module, providers=PROVIDER_MODULES)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        process_s = time.perf_counter() - started
+        probe = json.loads(output.strip().splitlines()[-1])
+        timings.append((probe["import_s"], process_s))
+        loaded = probe["loaded"]
+    return {
+        "module": module,
+        "import_p50_s": percentile([t[0] for t in timings], 50),
+        "process_p50_s": percentile([t[1] for t in timings], 50),
+        "providers_loaded": ",".join(loaded) or "-",
+    }
+
+def time_requests(url, requests_count):
+    """Per-request latency with a fresh client each time versus one pooled keep-alive client."""
+    import httpx
+    from provider_clients import _http_client
+
+    fresh = []
+    for _ in range(requests_count):
+        started = time.perf_counter()
+        with httpx.Client() as client:
+            client.get(url)
+        fresh.append(time.perf_counter() - started)
+
+    pooled = []
+    with _http_client() as client:
+        for _ in range(requests_count):
+            started = time.perf_counter()
+            client.get(url)
+            pooled.append(time.perf_counter() - started)
+
+    return [
+        {"client": name, "p50_s": percentile(values, 50), "p95_s": percentile(values, 95), "total_s": sum(values)}
+        for name, values in (("new per request", fresh), ("pooled keep-alive", pooled))
+    ]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per import measurement")
+    parser.add_argument("--modules", nargs="+", default=["video_generator", "main", "provider_clients"])
+    parser.add_argument("--url", help="HTTPS endpoint for the connection reuse comparison")
+    parser.add_argument("--requests", type=int, default=10)
+    args = parser.parse_args()
+
+    rows = [time_import(module, args.runs) for module in args.modules]
+    print_table(f"Cold import, median of {args.runs} runs", rows,
+                ["module", "import_p50_s", "process_p50_s", "providers_loaded"])
+
+    if args.url:
+        print_table(f"{args.requests} requests to {args.url}", time_requests(args.url, args.requests),
+                    ["client", "p50_s", "p95_s", "total_s"])
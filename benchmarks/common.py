@@ -0,0 +1,109 @@
+import os
+import re
+import resource
+import subprocess
+import time
+
+# ========================
+# Shared helpers for the benchmark scripts
+# ========================
+
+def make_fixture_images(image_dir, count, size=1024):
+    """Renders count distinct test-pattern PNGs named like the pipeline's scene_N.png."""
+    os.makedirs(image_dir, exist_ok=True)
+    paths = []
+    for i in range(count):
+        path = os.path.join(image_dir, f"scene_{i+1}.png")
+        subprocess.run(
+            ["ffmpeg", "-v", "error", "-y", "-f", "lavfi",
+             "-i", f"testsrc2=size={size}x{size}:rate=1:duration=1,hue=h={i * 37 % 360}",
+             "-frames:v", "1", path],
+            check=True
+        )
+        paths.append(path)
+    return paths
+
+def make_fixture_audio(path, seconds, rate=24000):
+    """Synthesizes a speech-length tone; the container follows the file extension."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    subprocess.run(
+        ["ffmpeg", "-v", "error", "-y", "-f", "lavfi",
+         "-i", f"sine=frequency=220:sample_rate={rate}:duration={seconds}",
+         "-ac", "1", path],
+        check=True
+    )
+    return path
+
+def measure(func, *args, **kwargs):
+    """
+    Runs func once and returns (result, stats). Stats hold wall time plus CPU
+    time and disk writes of the ffmpeg children it spawned (from getrusage).
+    """
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    wall = time.perf_counter() - started
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    stats = {
+        "wall_s": wall,
+        "child_cpu_s": (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime),
+        "child_write_mb": (after.ru_oublock - before.ru_oublock) * 512 / (1024 * 1024),
+    }
+    return result, stats
+
+def print_table(title, rows, columns):
+    """Prints rows (list of dicts) as a fixed-width table."""
+    print(f"\n📊 {title}")
+    print("  ".join(f"{c:>16}" for c in columns))
+    for row in rows:
+        print("  ".join(
+            f"{row[c]:>16.3f}" if isinstance(row[c], float) else f"{str(row[c]):>16}"
+            for c in columns
+        ))
+
+def percentile(values, pct):
+    """Linear-interpolated percentile of a list of numbers (pct in 0..100)."""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+def peak_rss_mb():
+    """Peak resident set size of this process and of its largest child, in MiB (Linux units)."""
+    return {
+        "self_peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "child_peak_rss_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+    }
+
+def video_timeline(path):
+    """
+    (duration_s, frame_times) of a video file: the container duration and the
+    presentation time of every frame of its first video stream, read with
+    ffmpeg's showinfo filter.
+    """
+    result = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-i", path, "-map", "0:v:0", "-vf", "showinfo", "-f", "null", "-"],
+        capture_output=True, text=True, check=True
+    )
+    hours, minutes, seconds = re.search(r"Duration: (\d+):(\d+):([\d.]+)", result.stderr).groups()
+    duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    return duration, [float(t) for t in re.findall(r"pts_time:([\d.]+)", result.stderr)]
+
+def check_slideshow(path, durations, tolerance=0.25):
+    """
+    Raises ValueError unless the video lasts sum(durations) (within tolerance
+    seconds) and every scene has at least one frame inside its time slot.
+    """
+    duration, frame_times = video_timeline(path)
+    expected = sum(durations)
+    if abs(duration - expected) > tolerance:
+        raise ValueError(f"{path}: lasts {duration:.2f}s, expected {expected:.2f}s")
+    start = 0.0
+    for i, scene_duration in enumerate(durations):
+        if not any(start - tolerance <= t < start + scene_duration for t in frame_times):
+            raise ValueError(f"{path}: scene {i+1} ({start:.2f}s-{start + scene_duration:.2f}s) has no frames")
+        start += scene_duration
+    return duration
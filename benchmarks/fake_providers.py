@@ -0,0 +1,173 @@
+"""
+Offline stand-ins for the Gemini, OpenAI and ElevenLabs clients. They expose
+the same call shapes the pipeline uses and return deterministic story JSON
+(whole or streamed), PNG images, 24 kHz PCM and MP3 audio after a
+configurable latency, failing with a configurable probability.
+"""
+import hashlib
+import json
+import math
+import random
+import re
+import struct
+import threading
+import time
+import zlib
+from types import SimpleNamespace
+
+# One silent MPEG-1 Layer III frame: 128 kbps, 44.1 kHz, mono, 1152 samples (~26 ms)
+MP3_SILENT_FRAME = b"\xff\xfb\x90\xc4" + b"\x00" * 413
+MP3_FRAME_SECONDS = 1152 / 44100
+
+# Speaking rate used to size fake narration
+SECONDS_PER_WORD = 0.4
+
+class FakeProviderError(RuntimeError):
+    """Injected provider failure."""
+
+class FakeBackend:
+    """Shared latency and error injection for the fake clients."""
+    def __init__(self, latency=0.0, jitter=0.5, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def call(self, name):
+        with self._lock:
+            self.calls += 1
+            delay = self.latency * (1 + self._random.uniform(-self.jitter, self.jitter))
+            fail = self._random.random() < self.error_rate
+        time.sleep(max(0.0, delay))
+        if fail:
+            raise FakeProviderError(f"Injected {name} failure")
+
+def _response(data=None, text=None):
+    part = SimpleNamespace(inline_data=SimpleNamespace(data=data) if data is not None else None, text=text)
+    return SimpleNamespace(
+        text=text,
+        candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))]
+    )
+
+def fake_story(user_prompt, scenes=5):
+    """Deterministic story JSON in the shape the generators ask for."""
+    return {
+        "title": f"Benchmark Story {hashlib.sha1(user_prompt.encode()).hexdigest()[:6]}",
+        "scenes": [
+            {
+                "text": f"Scene {i+1} of the tale about {user_prompt}. " + "The journey continues onward. " * 5,
+                "image_prompt": f"Cinematic digital art of {user_prompt}, scene {i+1}, dramatic lighting",
+            }
+            for i in range(scenes)
+        ],
+    }
+
+def fake_outline(user_prompt, sections):
+    """Deterministic long-form outline with the requested number of sections."""
+    return {
+        "title": f"Benchmark Article {hashlib.sha1(user_prompt.encode()).hexdigest()[:6]}",
+        "sections": [
+            {"heading": f"Part {i+1}", "summary": f"Part {i+1} of the article about {user_prompt}."}
+            for i in range(sections)
+        ],
+    }
+
+def fake_text_stream(text, backend, chunk_chars=24):
+    """Yields text in small chunks, spending about one backend latency on the whole stream like token generation."""
+    for start in range(0, len(text), chunk_chars):
+        time.sleep(backend.latency * chunk_chars / max(1, len(text)))
+        yield text[start:start + chunk_chars]
+
+def fake_png(prompt, size=1024):
+    """Solid-colour RGB PNG whose colour is derived from the prompt."""
+    r, g, b = hashlib.sha1(prompt.encode()).digest()[:3]
+    row = b"\x00" + bytes((r, g, b)) * size
+    raw = zlib.compress(row * size, 1)
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff)
+
+    header = struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", raw) + chunk(b"IEND", b"")
+
+def fake_pcm(text, rate=24000):
+    """16-bit mono tone lasting as long as the text would take to read."""
+    seconds = max(1.0, len(text.split()) * SECONDS_PER_WORD)
+    samples = int(seconds * rate)
+    period = [int(3000 * math.sin(2 * math.pi * 220 * n / rate)) for n in range(rate // 220)]
+    tone = struct.pack(f"<{len(period)}h", *period)
+    return (tone * (samples // len(period) + 1))[:samples * 2]
+
+def fake_mp3_chunks(text, chunk_frames=16):
+    """Silent MP3 stream of the text's reading length, split into chunks."""
+    frames = int(max(1.0, len(text.split()) * SECONDS_PER_WORD) / MP3_FRAME_SECONDS)
+    for start in range(0, frames, chunk_frames):
+        yield MP3_SILENT_FRAME * min(chunk_frames, frames - start)
+
+class _FakeGeminiModels:
+    def __init__(self, backend, scenes, image_size):
+        self._backend = backend
+        self._scenes = scenes
+        self._image_size = image_size
+
+    def generate_content(self, model, contents, config=None):
+        prompt = contents[0] if isinstance(contents, list) else contents
+        if "tts" in model:
+            self._backend.call("gemini-tts")
+            return _response(data=fake_pcm(prompt))
+        if "image" in model:
+            self._backend.call("gemini-image")
+            return _response(data=fake_png(prompt, self._image_size))
+        self._backend.call("gemini-story")
+        user_prompt = prompt.rsplit("User prompt:", 1)[-1].strip()
+        # Long-form outline and section requests say how many items they want
+        sections = re.search(r"exactly (\d+) sections", prompt)
+        if sections:
+            return _response(text=json.dumps(fake_outline(user_prompt, int(sections.group(1)))))
+        scenes = re.search(r"exactly (\d+) 'scenes' for this section", prompt)
+        if scenes:
+            return _response(text=json.dumps(fake_story(user_prompt, int(scenes.group(1)))))
+        return _response(text=json.dumps(fake_story(user_prompt, self._scenes)))
+
+    def generate_content_stream(self, model, contents, config=None):
+        prompt = contents[0] if isinstance(contents, list) else contents
+        self._backend.call("gemini-story")
+        user_prompt = prompt.rsplit("User prompt:", 1)[-1].strip()
+        for text in fake_text_stream(json.dumps(fake_story(user_prompt, self._scenes)), self._backend):
+            yield _response(text=text)
+
+class FakeGeminiClient:
+    """Stands in for google.genai.Client: story JSON, images and TTS."""
+    def __init__(self, scenes=5, image_size=1024, **backend_options):
+        self.backend = FakeBackend(**backend_options)
+        self.models = _FakeGeminiModels(self.backend, scenes, image_size)
+
+class FakeOpenAIClient:
+    """Stands in for openai.OpenAI: chat completions returning story JSON."""
+    def __init__(self, scenes=5, **backend_options):
+        self.backend = FakeBackend(**backend_options)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+        self._scenes = scenes
+
+    def _create(self, model, messages, stream=False, **kwargs):
+        self.backend.call("openai-story")
+        user_prompt = messages[-1]["content"]
+        content = json.dumps(fake_story(user_prompt, self._scenes))
+        if stream:
+            return (
+                SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+                for text in fake_text_stream(content, self.backend)
+            )
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+class FakeElevenLabsClient:
+    """Stands in for elevenlabs.client.ElevenLabs: streamed MP3 narration."""
+    def __init__(self, **backend_options):
+        self.backend = FakeBackend(**backend_options)
+        self.text_to_speech = SimpleNamespace(stream=self._stream)
+
+    def _stream(self, text, voice_id, model_id, **kwargs):
+        self.backend.call("elevenlabs-tts")
+        return fake_mp3_chunks(text)
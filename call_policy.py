@@ -0,0 +1,190 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from tracing import tracer
+import rate_limiter
+
+# Retries with jittered exponential backoff
+CALL_MAX_RETRIES = int(os.getenv("CALL_MAX_RETRIES", "2"))
+BACKOFF_BASE_SECONDS = float(os.getenv("BACKOFF_BASE_SECONDS", "1"))
+BACKOFF_MAX_SECONDS = float(os.getenv("BACKOFF_MAX_SECONDS", "20"))
+
+# Adaptive timeouts: a multiple of the observed p99, clamped, after enough samples
+TIMEOUT_MULTIPLIER = float(os.getenv("TIMEOUT_MULTIPLIER", "2"))
+TIMEOUT_MIN_SECONDS = float(os.getenv("TIMEOUT_MIN_SECONDS", "10"))
+TIMEOUT_MAX_SECONDS = float(os.getenv("TIMEOUT_MAX_SECONDS", "180"))
+TIMEOUT_DEFAULT_SECONDS = float(os.getenv("TIMEOUT_DEFAULT_SECONDS", "120"))
+LATENCY_MIN_SAMPLES = int(os.getenv("LATENCY_MIN_SAMPLES", "20"))
+LATENCY_WINDOW = 200
+
+# Hedging: duplicate a call still running after the observed p95, for at most
+# HEDGE_MAX_RATIO of all calls to a provider
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "1") == "1"
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_MAX_RATIO = float(os.getenv("HEDGE_MAX_RATIO", "0.1"))
+
+# Client errors that a retry cannot fix (429 and 5xx are retried)
+NON_RETRYABLE_STATUS = {400, 401, 403, 404}
+
+# Calls run here so the caller can stop waiting on them; an abandoned call
+# keeps its worker until the provider answers or its HTTP timeout fires
+CALL_POLICY_WORKERS = int(os.getenv("CALL_POLICY_WORKERS", "64"))
+_executor = ThreadPoolExecutor(max_workers=CALL_POLICY_WORKERS, thread_name_prefix="provider-call")
+
+# Once this many abandoned calls are still holding workers, no more hedges or
+# retries after a timeout are started, so a hanging provider cannot starve the rest
+ABANDONED_MAX = int(os.getenv("CALL_ABANDONED_MAX", str(CALL_POLICY_WORKERS // 4)))
+
+_abandoned = 0
+_abandoned_lock = threading.Lock()
+
+def _abandon(futures):
+    """Counts calls nobody waits for any more until they finish."""
+    global _abandoned
+    for future in futures:
+        with _abandoned_lock:
+            _abandoned += 1
+        future.add_done_callback(_abandoned_done)
+
+def _abandoned_done(future):
+    global _abandoned
+    with _abandoned_lock:
+        _abandoned -= 1
+
+def abandoned_calls():
+    """Abandoned provider calls still running in the shared executor."""
+    with _abandoned_lock:
+        return _abandoned
+
+def _percentile(ordered, pct):
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+class LatencyTracker:
+    """Recent successful latencies and hedge usage for one provider/model."""
+    def __init__(self, window=LATENCY_WINDOW):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.hedges = 0
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct):
+        """Observed latency percentile, or None until there are enough samples."""
+        with self._lock:
+            if len(self._samples) < LATENCY_MIN_SAMPLES:
+                return None
+            return _percentile(sorted(self._samples), pct)
+
+    def timeout(self):
+        p99 = self.percentile(99)
+        if p99 is None:
+            return TIMEOUT_DEFAULT_SECONDS
+        return min(TIMEOUT_MAX_SECONDS, max(TIMEOUT_MIN_SECONDS, p99 * TIMEOUT_MULTIPLIER))
+
+    def hedge_delay(self):
+        return self.percentile(HEDGE_PERCENTILE)
+
+    def start_call(self):
+        with self._lock:
+            self.calls += 1
+
+    def try_hedge(self):
+        """Claims a hedge if the provider is still under its hedging budget."""
+        with self._lock:
+            if self.hedges + 1 > self.calls * HEDGE_MAX_RATIO:
+                return False
+            self.hedges += 1
+            return True
+
+_trackers = {}
+_trackers_lock = threading.Lock()
+
+def latency_tracker(key):
+    """Tracker for a (provider, model) key, shared by every job in the process."""
+    with _trackers_lock:
+        if key not in _trackers:
+            _trackers[key] = LatencyTracker()
+        return _trackers[key]
+
+def is_retryable(error):
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    return not (isinstance(status, int) and status in NON_RETRYABLE_STATUS)
+
+def backoff_delay(attempt):
+    """Full-jitter exponential backoff for the given retry number (1-based)."""
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (attempt - 1)))
+
+def _attempt(key, tracker, func, hedge, tokens):
+    """
+    One attempt: waits for rate-limit quota, runs func, fires a duplicate once
+    the hedge delay passes (if allowed and quota is free right now) and returns
+    the first successful answer within the timeout.
+    """
+    rate_limiter.acquire(*key, tokens=tokens)
+    timeout = tracker.timeout()
+    started = time.perf_counter()
+    pending = {_executor.submit(tracer.wrap(func))}
+    tracker.start_call()
+
+    delay = tracker.hedge_delay() if hedge and HEDGE_ENABLED else None
+    if delay is not None and delay < timeout:
+        done, _ = wait(pending, timeout=delay)
+        limiter = rate_limiter.limiter_for(*key)
+        if not done and abandoned_calls() < ABANDONED_MAX and tracker.try_hedge() \
+                and (limiter is None or limiter.try_acquire(tokens)):
+            tracer.add(hedges=1)
+            pending.add(_executor.submit(tracer.wrap(func)))
+
+    error = None
+    try:
+        while pending:
+            remaining = timeout - (time.perf_counter() - started)
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    tracker.record(time.perf_counter() - started)
+                    return future.result()
+                error = future.exception()
+        if error is not None and not pending:
+            raise error
+        raise TimeoutError(f"No response within {timeout:.1f}s")
+    finally:
+        # The losing hedge or the timed-out call keeps running in the background
+        _abandon(pending)
+
+def call_with_policy(key, func, retries=CALL_MAX_RETRIES, hedge=True, tokens=0):
+    """
+    Calls func() for the provider/model key within its rate limit, with an
+    adaptive timeout, optional hedging and jittered retries. func must be safe
+    to run more than once. tokens is the request's estimated token count for
+    the quota. Retries and hedges are recorded on the current trace span.
+    """
+    tracker = latency_tracker(key)
+    throttle_delay = None
+    for attempt in range(retries + 1):
+        if attempt:
+            tracer.add(retries=1)
+            time.sleep(max(backoff_delay(attempt), throttle_delay or 0))
+        try:
+            result = _attempt(key, tracker, func, hedge, tokens)
+            rate_limiter.report(*key)
+            return result
+        except Exception as e:
+            throttle_delay = rate_limiter.report(*key, error=e)
+            if attempt == retries or not is_retryable(e):
+                raise
+            if isinstance(e, TimeoutError) and abandoned_calls() >= ABANDONED_MAX:
+                # Another attempt would only park one more worker on a hanging provider
+                raise
+            print(f"🔁 {key[0]} call failed ({e}); retry {attempt + 1}/{retries}")
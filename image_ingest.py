@@ -0,0 +1,65 @@
+import os
+import struct
+from io import BytesIO
+
+# Side length scene images are stored at; 0 keeps the provider's resolution
+INGEST_SIZE = int(os.getenv("INGEST_SIZE", "640"))
+# zlib level for PNGs we have to write ourselves: 1 is several times faster than PIL's default 6
+INGEST_PNG_LEVEL = int(os.getenv("INGEST_PNG_LEVEL", "1"))
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+def image_info(data):
+    """
+    Reads format and (width, height) from the image header without decoding it.
+    Returns (format, (width, height)) or (None, None) for anything unrecognised.
+    """
+    if data[:8] == PNG_SIGNATURE and data[12:16] == b"IHDR":
+        width, height = struct.unpack(">II", data[16:24])
+        return "png", (width, height)
+    if data[:2] == b"\xff\xd8":
+        # Walk JPEG segments to the first start-of-frame marker
+        offset = 2
+        while offset + 9 < len(data):
+            if data[offset] != 0xFF:
+                break
+            marker = data[offset + 1]
+            length = struct.unpack(">H", data[offset + 2:offset + 4])[0]
+            if marker in (0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF):
+                height, width = struct.unpack(">HH", data[offset + 5:offset + 9])
+                return "jpeg", (width, height)
+            offset += 2 + length
+        return "jpeg", None
+    return None, None
+
+def ingest_image(data, path, size=INGEST_SIZE):
+    """
+    Writes provider image bytes to path at size x size, matching the video's
+    frame size so ffmpeg never rescales per frame. A PNG or JPEG that already
+    has the target size (or any PNG or JPEG when size is 0) is written as-is,
+    without a decode or another lossy generation; ffmpeg and PIL detect the
+    format from the content, not the extension. Anything else is decoded once,
+    shrunk with JPEG draft mode / integer reduce before the final resize, and
+    saved as a PNG with a fast level. Returns path.
+    """
+    fmt, dimensions = image_info(data)
+    if fmt in ("png", "jpeg") and (not size or dimensions == (size, size)):
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    from PIL import Image
+    image = Image.open(BytesIO(data))
+    if size:
+        if image.format == "JPEG":
+            # Let libjpeg decode at 1/2, 1/4 or 1/8 scale directly
+            image.draft("RGB", (size, size))
+        factor = min(image.width // size, image.height // size)
+        if factor >= 2:
+            image = image.reduce(factor)
+        if image.size != (size, size):
+            image = image.resize((size, size), Image.BILINEAR)
+    if image.mode not in ("RGB", "RGBA", "L"):
+        image = image.convert("RGB")
+    image.save(path, format="PNG", compress_level=INGEST_PNG_LEVEL)
+    return path
@@ -0,0 +1,277 @@
+import os
+import json
+import time
+import wave
+import ffmpeg
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+from tracing import tracer
+from provider_clients import genai_types
+from rate_limiter import estimate_tokens, limited
+from audio_mixer import mix, read_wav, read_wav_looped, resample, to_pcm
+from music_library import MIX_SAMPLE_RATE, music_library, track_volume
+from video_generator import (
+    AUDIO_ENCODE_ARGS,
+    IMAGE_MAX_WORKERS,
+    MUSIC_VOLUME,
+    STORY_MODEL,
+    TTS_MAX_WORKERS,
+    VIDEO_ENCODE_ARGS,
+    align_scene_durations,
+    concat_segments,
+    generate_image_with_gemini,
+    generate_narration_elevenlabs,
+    run_ffmpeg,
+    run_scenes_concurrently,
+    still_slideshow
+)
+
+# Scenes written per story request; each such chunk is also one window of images, TTS and encode
+LONG_FORM_CHUNK_SCENES = int(os.getenv("LONG_FORM_CHUNK_SCENES", "10"))
+# Outline sections requested per call
+LONG_FORM_OUTLINE_SECTIONS = int(os.getenv("LONG_FORM_OUTLINE_SECTIONS", "20"))
+LONG_FORM_MAX_SCENES = int(os.getenv("LONG_FORM_MAX_SCENES", "300"))
+# Rough narration length per scene, used to pick a music track before the real length is known
+SCENE_SECONDS_ESTIMATE = 15
+
+OUTLINE_PROMPT = """
+    You are planning a long-form narrated video based on the user's prompt.
+    Return a JSON object with a 'title' and a list of 'sections'. Each section object must contain two keys:
+    1. 'heading': A short heading for the section.
+    2. 'summary': Two or three sentences on what the section covers.
+    Return exactly {count} sections that continue on from the sections already planned.
+
+    Return only valid JSON format.
+    """
+
+SCENES_PROMPT = """
+    You are writing one section of a long-form narrated video titled "{title}".
+    Section "{heading}": {summary}
+    Return a JSON object with a list of exactly {count} 'scenes' for this section. Each scene object must contain two keys:
+    1. 'text': A paragraph of narration (about 30-50 words) that follows on from the previous scene.
+    2. 'image_prompt': A descriptive, visually rich prompt for image generation. Focus on art style (e.g., cinematic, digital art, photorealistic), lighting, and mood.
+
+    Return only valid JSON format.
+    """
+
+def _generate_json(gemini_client, contents, part):
+    types = genai_types()
+    with tracer.span("provider.story", provider="gemini", model=STORY_MODEL, part=part) as span, \
+            limited("gemini", STORY_MODEL, estimate_tokens(contents)):
+        response = gemini_client.models.generate_content(
+            model=STORY_MODEL,
+            contents=[contents],
+            config=types.GenerateContentConfig(
+                response_mime_type="application/json"
+            )
+        )
+        span.add(bytes_in=len(contents.encode()), bytes_out=len((response.text or "").encode()))
+    return json.loads(response.text)
+
+def plan_sections(scene_count, chunk_scenes=LONG_FORM_CHUNK_SCENES):
+    """Scene count of every section: full chunks of chunk_scenes plus a shorter last one."""
+    return [min(chunk_scenes, scene_count - start) for start in range(0, scene_count, chunk_scenes)]
+
+def generate_outline(user_prompt, gemini_client, section_count, sections_per_call=LONG_FORM_OUTLINE_SECTIONS):
+    """
+    Title and section_count outline sections, requested sections_per_call at a
+    time with the headings planned so far as context. Returns (title, sections).
+    """
+    print(f"🗺️  Outlining {section_count} sections...")
+    title = None
+    sections = []
+    while len(sections) < section_count:
+        count = min(sections_per_call, section_count - len(sections))
+        planned = "\n".join(f"{i+1}. {section['heading']}" for i, section in enumerate(sections)) or "None yet."
+        contents = (f"{OUTLINE_PROMPT.format(count=count)}\n\nSections planned so far:\n{planned}"
+                    f"\n\nUser prompt: {user_prompt}")
+        part = _generate_json(gemini_client, contents, "outline")
+        new_sections = part.get('sections') or []
+        if not new_sections:
+            raise ValueError("Outline generation returned no sections.")
+        title = title or part.get('title')
+        sections.extend(new_sections[:count])
+    return title or user_prompt, sections
+
+def generate_section_scenes(user_prompt, gemini_client, title, section, count, previous_text=None):
+    """The scenes of one outline section, continuing from previous_text."""
+    contents = (f"{SCENES_PROMPT.format(title=title, heading=section['heading'], summary=section['summary'], count=count)}"
+                f"\n\nPrevious scene: {previous_text or 'None, this section opens the video.'}"
+                f"\n\nUser prompt: {user_prompt}")
+    scenes = [scene for scene in _generate_json(gemini_client, contents, "scenes").get('scenes') or []
+              if scene.get('text') and scene.get('image_prompt')]
+    if not scenes:
+        raise ValueError(f"No scenes returned for section '{section['heading']}'.")
+    return scenes[:count]
+
+def _window_media(scenes, first_index, gemini_client, workspace, voice_id):
+    """Images and narration clips for one window of scenes, both fetched at the same time."""
+    items = [(first_index + i, scene) for i, scene in enumerate(scenes)]
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        images = pool.submit(tracer.wrap(run_scenes_concurrently), lambda item, _: generate_image_with_gemini(
+            item[1]['image_prompt'], item[0], gemini_client, raise_errors=True, workspace=workspace), items, IMAGE_MAX_WORKERS)
+        narrations = pool.submit(tracer.wrap(run_scenes_concurrently), lambda item, _: generate_narration_elevenlabs(
+            item[1]['text'], f"narration_scene_{item[0]+1}.wav", voice_id=voice_id, workspace=workspace,
+            gemini_client=gemini_client), items, TTS_MAX_WORKERS)
+        return images.result(), narrations.result()
+
+def _window_audio(clip_paths, music_track, music_offset, mixed_wav):
+    """
+    Appends one window's narration, mixed with the matching stretch of the music
+    track, to the open mixed_wav. Returns (scene durations, samples written).
+    """
+    durations = []
+    samples = []
+    for clip_path in clip_paths:
+        if clip_path is None:
+            durations.append(None)
+            continue
+        clip, rate = read_wav(clip_path)
+        durations.append(len(clip) / rate)
+        samples.append(resample(clip, rate, MIX_SAMPLE_RATE))
+    if not samples:
+        return durations, 0
+    narration = np.concatenate(samples)
+    if music_track:
+        music = read_wav_looped(music_track["path"], music_offset, len(narration))
+        narration = mix(narration, music, track_volume(music_track, MUSIC_VOLUME))
+    mixed_wav.writeframes(to_pcm(narration))
+    return durations, len(narration)
+
+def _encode_window(image_paths, durations, segment_path, list_path):
+    """Video-only segment for one window; audio is muxed once at the end."""
+    with tracer.span("ffmpeg.window") as span:
+        run_ffmpeg(
+            ffmpeg
+            .output(still_slideshow(image_paths, durations, list_path), segment_path,
+                    **VIDEO_ENCODE_ARGS, tune='stillimage', vsync='vfr')
+        )
+        span.add(bytes_out=os.path.getsize(segment_path))
+    os.remove(list_path)
+    return segment_path
+
+def render_long_form(user_prompt, gemini_client, workspace, scene_count, chunk_scenes=LONG_FORM_CHUNK_SCENES,
+                     voice_id="Kore", progress=None):
+    """
+    Article-length video of scene_count scenes (up to LONG_FORM_MAX_SCENES).
+    The outline is planned in chunks. Scenes are then written one section at a
+    time (the next section is written while the current one gets its media),
+    and each section goes through images, TTS and a video-only segment encode
+    as one window. While one window encodes, the next one is generated. The
+    mixed audio is appended to a single WAV as each window finishes, and the
+    segments are joined by stream copy at the end. Only one window's scenes,
+    images and clips exist at a time, so memory and open files stay flat as
+    scene_count grows. Scenes are appended to story.jsonl in the job's output
+    directory. Returns (video_path, stats).
+    """
+    if not 1 <= scene_count <= LONG_FORM_MAX_SCENES:
+        raise ValueError(f"❌ Long-form videos have 1 to {LONG_FORM_MAX_SCENES} scenes, got {scene_count}.")
+    started = time.perf_counter()
+    section_sizes = plan_sections(scene_count, chunk_scenes)
+    title, sections = generate_outline(user_prompt, gemini_client, len(section_sizes))
+    print(f"📚 Long-form video '{title}': {scene_count} scenes in {len(section_sizes)} windows of up to {chunk_scenes}")
+
+    music_track = music_library.select(scene_count * SCENE_SECONDS_ESTIMATE)
+    if music_track is None:
+        print("⚠️ No background music found in music/ directory. Using narration only.")
+
+    segment_dir = os.path.join(workspace.tmp_dir, "segments")
+    os.makedirs(segment_dir, exist_ok=True)
+    mixed_path = workspace.tmp_path("long_form_audio.wav")
+    story_path = workspace.output_path("story.jsonl")
+    segment_paths, segment_durations = [], []
+    stats = {"scenes": 0, "windows": 0, "image_failures": 0, "narration_failures": 0}
+    fallback_image = None
+    pending_encode = None
+    pending_files = []
+
+    with ThreadPoolExecutor(max_workers=1) as writer, ThreadPoolExecutor(max_workers=1) as encoder, \
+            wave.open(mixed_path, "wb") as mixed_wav, open(story_path, "w") as story_file:
+        mixed_wav.setnchannels(1)
+        mixed_wav.setsampwidth(2)
+        mixed_wav.setframerate(MIX_SAMPLE_RATE)
+        music_offset = 0
+        first_index = 0
+        next_scenes = writer.submit(tracer.wrap(generate_section_scenes), user_prompt, gemini_client, title,
+                                    sections[0], section_sizes[0])
+        for window, size in enumerate(section_sizes):
+            scenes = next_scenes.result()
+            # Write the next section while this one gets its images and narration
+            if window + 1 < len(section_sizes):
+                next_scenes = writer.submit(tracer.wrap(generate_section_scenes), user_prompt, gemini_client, title,
+                                            sections[window + 1], section_sizes[window + 1], scenes[-1]['text'])
+            for scene in scenes:
+                story_file.write(json.dumps(scene) + "\n")
+            window_scenes = scenes
+            if window == 0:
+                scenes = [dict(scenes[0], text=f"{title}. {scenes[0]['text']}")] + scenes[1:]
+
+            (image_paths, image_failures), (clip_paths, narration_failures) = _window_media(
+                scenes, first_index, gemini_client, workspace, voice_id)
+            stats["image_failures"] += len(image_failures)
+            stats["narration_failures"] += len(narration_failures)
+            durations, written = _window_audio(clip_paths, music_track, music_offset, mixed_wav)
+            music_offset += written
+
+            # A window whose first images failed opens on the previous window's last image
+            if image_paths[0] is None and fallback_image is not None:
+                image_paths[0] = fallback_image
+            window_images, window_durations = align_scene_durations(image_paths, durations)
+            if written and not window_images:
+                raise ValueError(f"❌ Every image in window {window + 1} failed; the narration would have no picture.")
+
+            if pending_encode is not None:
+                pending_encode.result()
+                for path in pending_files:
+                    if path != fallback_image and os.path.exists(path):
+                        os.remove(path)
+            if window_images:
+                segment_path = os.path.join(segment_dir, f"window_{window + 1:04d}.mp4")
+                segment_paths.append(segment_path)
+                segment_durations.append(written / MIX_SAMPLE_RATE)
+                pending_encode = encoder.submit(tracer.wrap(_encode_window), window_images, window_durations, segment_path,
+                                                workspace.tmp_path(f"window_{window + 1:04d}.txt"))
+            else:
+                pending_encode = None
+            # This window's files go once its segment is encoded; its last image stays as the next fallback
+            pending_files = {p for p in image_paths + clip_paths if p}
+            if window_images and window_images[-1] != fallback_image:
+                if fallback_image is not None:
+                    pending_files.add(fallback_image)
+                fallback_image = window_images[-1]
+
+            first_index += len(scenes)
+            stats["scenes"] += len(scenes)
+            stats["windows"] += 1
+            print(f"🧩 Window {window + 1}/{len(section_sizes)}: {stats['scenes']}/{scene_count} scenes")
+            if progress is not None:
+                # Same story_data shape as the short pipeline, holding only this window's scenes
+                progress.update(story_data={"title": title, "scenes": window_scenes},
+                                long_form={**stats, "scene_count": scene_count})
+        if pending_encode is not None:
+            pending_encode.result()
+        for path in pending_files | {fallback_image}:
+            if path and os.path.exists(path):
+                os.remove(path)
+
+    if not segment_paths:
+        raise ValueError("❌ No scene of the long-form video could be rendered.")
+    video_name = f"{title.replace(' ', '_').lower()}.mp4"
+    final_output_path = workspace.output_path(video_name)
+    list_path = workspace.tmp_path("segments.txt")
+    with tracer.span("ffmpeg.long_form_mux", windows=len(segment_paths)):
+        run_ffmpeg(
+            ffmpeg
+            .output(concat_segments(segment_paths, list_path, segment_durations),
+                    ffmpeg.input(mixed_path), final_output_path, vcodec='copy', **AUDIO_ENCODE_ARGS)
+        )
+    for path in segment_paths + [mixed_path, list_path]:
+        os.remove(path)
+    os.rmdir(segment_dir)
+
+    stats["duration_s"] = sum(segment_durations)
+    stats["render_s"] = time.perf_counter() - started
+    tracer.add(bytes_out=os.path.getsize(final_output_path))
+    print(f"✅ Long-form video saved: {final_output_path} ({stats['duration_s'] / 60:.1f} min, {stats['render_s']:.0f}s to render)")
+    return final_output_path, stats
@@ -1,15 +1,13 @@
 import os
-import requests
-import glob
-import random
+import time
+import argparse
 import json
 import ffmpeg
 from ffmpeg._run import Error as FFmpegError
-import openai
-import elevenlabs
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
-from mutagen.mp3 import MP3
-from elevenlabs.client import ElevenLabs
+from provider_clients import genai_types, get_elevenlabs_client, get_gemini_client, get_openai_client
+from rate_limiter import estimate_tokens, limited
 # ========================
 # 1. SETUP & CONFIGURATION
 # ========================
@@ -19,18 +17,22 @@ load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY")
 
-# Check if API keys are set
-if not OPENAI_API_KEY or not ELEVENLABS_API_KEY:
-    raise ValueError("❌ API keys for OpenAI and ElevenLabs must be set in the .env file.")
+def require_api_keys():
+    """Check if API keys are set; called before a real run instead of at import time."""
+    if not OPENAI_API_KEY or not ELEVENLABS_API_KEY:
+        raise ValueError("❌ API keys for OpenAI and ElevenLabs must be set in the .env file.")
+
+# API clients come from the shared pool in provider_clients on first use, so
+# importing this module loads no provider SDK. Assigning a client here (the
+# benchmarks install offline stand-ins) overrides the pooled one.
+openai_client = None
+elevenlabs = None
 
-# Initialize API clients
-openai_client = openai.OpenAI(api_key=OPENAI_API_KEY)
-elevenlabs.api_key = ELEVENLABS_API_KEY
-# Initialize ElevenLabs client
-elevenlabs = ElevenLabs(
-    api_key=os.getenv("ELEVENLABS_API_KEY")  # Or replace with your API key directly
-)
 
+ELEVENLABS_MODEL = "eleven_multilingual_v2"
+DEFAULT_VOICE_ID = "G17SuINrv2H9FC6nvetn"
+# Narration bytes needed before the duration/bitrate can be read from the stream
+NARRATION_READY_BYTES = 16 * 1024
 
 # Define directories
 IMAGE_DIR = "output_images"
@@ -41,14 +43,10 @@ MUSIC_DIR = "music"
 # 2. CORE GENERATION FUNCTIONS
 # ========================
 
-def generate_story_with_prompts(user_prompt):
-    """
-    Generates a content with scenes and image prompts using OpenAI's GPT model.
-    """
-    print("✍️  Generating story and image prompts...")
+def _story_system_prompt(scene_count):
     system_prompt = """
     You are a general content generator. Based on the user's prompt, generate texts.
-    The content should be strictly structured as a JSON object with a 'title' and a list of 5 'scenes'.
+    The content should be strictly structured as a JSON object with a 'title' and a list of 'scenes'.
     Each scene in the list should be an object containing two keys:
     1. 'text': A paragraph of the story (about 30-50 words).
     2. 'image_prompt': A descriptive, visually rich prompt for an image generation AI (like DALL-E).
@@ -64,16 +62,30 @@ def generate_story_with_prompts(user_prompt):
       ]
     }
     """
+    system_prompt += f"Generate exactly {scene_count} scenes.\n"
+    return system_prompt
+
+def generate_story_with_prompts(user_prompt, scene_count=5):
+    """
+    Generates a content with scene_count scenes and image prompts using OpenAI's GPT model.
+    """
+    print("✍️  Generating story and image prompts...")
+    system_prompt = _story_system_prompt(scene_count)
     try:
-        response = openai_client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            response_format={"type": "json_object"}
-        )
-        story_data = json.loads(response.choices[0].message.content)
+        client = openai_client or get_openai_client(OPENAI_API_KEY)
+        with tracer.span("provider.story", provider="openai", model="gpt-4o") as span, \
+                limited("openai", "gpt-4o", estimate_tokens(system_prompt + user_prompt)):
+            response = client.chat.completions.create(
+                model="gpt-4o",
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt}
+                ],
+                response_format={"type": "json_object"}
+            )
+            content = response.choices[0].message.content
+            span.add(bytes_in=len((system_prompt + user_prompt).encode()), bytes_out=len(content.encode()))
+        story_data = json.loads(content)
         print("✅ Story generated successfully.")
         print(story_data)
         return story_data
@@ -81,143 +93,324 @@ def generate_story_with_prompts(user_prompt):
         print(f"❌ Error generating story: {e}")
         raise
 
-from google import genai
-from google.genai import types
-from PIL import Image
-from io import BytesIO
-import os
+def stream_story_with_prompts(user_prompt, scene_count=5):
+    """Like generate_story_with_prompts, but yields the story JSON text chunk by chunk as GPT writes it."""
+    print("✍️  Streaming story and image prompts...")
+    system_prompt = _story_system_prompt(scene_count)
+    client = openai_client or get_openai_client(OPENAI_API_KEY)
+    with tracer.span("provider.story", provider="openai", model="gpt-4o", stream=True) as span, \
+            limited("openai", "gpt-4o", estimate_tokens(system_prompt + user_prompt)):
+        span.add(bytes_in=len((system_prompt + user_prompt).encode()))
+        for chunk in client.chat.completions.create(
+            model="gpt-4o",
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            response_format={"type": "json_object"},
+            stream=True
+        ):
+            text = (chunk.choices[0].delta.content or "") if chunk.choices else ""
+            span.add(bytes_out=len(text.encode()))
+            yield text
+
+from image_ingest import ingest_image
+from music_library import MIX_SAMPLE_RATE, music_library, track_volume
+
+from asset_cache import asset_cache, asset_key
+from workspace import JobWorkspace
+from tracing import tracer
+from call_policy import call_with_policy
+from story_stream import SceneDispatcher
+from video_generator import (
+    IMAGE_MAX_WORKERS,
+    IMAGE_MODEL,
+    PER_SCENE_NARRATION,
+    STREAM_STORY,
+    TTS_MAX_WORKERS,
+    PipelineStage,
+    align_scene_durations,
+    build_narration_text,
+    run_ffmpeg,
+    run_pipeline,
+    AUDIO_HANDOFF,
+    AUDIO_MIXER,
+    pcm_input,
+    run_scenes_concurrently
+)
 
-# Gemini client
-gemini_client = genai.Client()
+# Gemini client, pooled on first use like the clients above
+gemini_client = None
 
-def generate_image(prompt, index):
+def generate_image(prompt, index, raise_errors=False, workspace=None):
     """
-    Generates an image using Gemini and saves it.
+    Generates an image using Gemini and saves it (into the job's workspace if given).
+    Returns None on failure unless raise_errors is set.
     """
     print(f"🎨 Generating image for scene {index+1}...")
     try:
+        if workspace is not None:
+            image_path = workspace.image_path(index)
+        else:
+            # Make sure output directory exists
+            os.makedirs(IMAGE_DIR, exist_ok=True)
+            image_path = os.path.join(IMAGE_DIR, f"scene_{index+1}.png")
+
+        # Keyed apart from video_generator's frame-size ingests of the same prompt
+        cache_key = asset_key("gemini", IMAGE_MODEL, prompt, "ingest0")
+        if asset_cache.copy_to(cache_key, ".png", image_path):
+            print(f"♻️ Image for scene {index+1} served from cache: {image_path}")
+            return image_path
+
         # Generate content (image + optional text)
-        response = gemini_client.models.generate_content(
-            model="gemini-2.0-flash-preview-image-generation",
-            contents=prompt,
-            config=types.GenerateContentConfig(
-                response_modalities=['TEXT', 'IMAGE']
+        client = gemini_client or get_gemini_client()
+        types = genai_types()
+
+        def request_image():
+            response = client.models.generate_content(
+                model=IMAGE_MODEL,
+                contents=prompt,
+                config=types.GenerateContentConfig(
+                    response_modalities=['TEXT', 'IMAGE']
+                )
             )
-        )
-
-        # Make sure output directory exists
-        os.makedirs(IMAGE_DIR, exist_ok=True)
-        image_path = os.path.join(IMAGE_DIR, f"scene_{index+1}.png")
-
-        # Loop through candidates and save images
-        for part in response.candidates[0].content.parts:
-            if part.inline_data is not None:
-                image = Image.open(BytesIO(part.inline_data.data))
-                image.save(image_path)
-                print(f"✅ Image saved at: {image_path}")
-                return image_path
-        
-        print(f"⚠️ No image data returned for scene {index+1}")
-        return None
+            # Loop through candidates for the image; an empty answer is retried
+            for part in response.candidates[0].content.parts:
+                if part.inline_data is not None:
+                    return part.inline_data.data
+            raise ValueError(f"No image data returned for scene {index+1}")
+
+        with tracer.span("provider.image", provider="gemini", model=IMAGE_MODEL, scene=index+1) as span:
+            image_data = call_with_policy(("gemini", IMAGE_MODEL), request_image)
+            span.add(bytes_in=len(prompt.encode()), bytes_out=len(image_data))
+
+        # Composition keeps the provider's resolution, so the bytes are stored as-is
+        ingest_image(image_data, image_path, size=0)
+        asset_cache.put_file(cache_key, image_path, ".png")
+        print(f"✅ Image saved at: {image_path}")
+        return image_path
 
     except Exception as e:
         print(f"❌ Error generating image for scene {index+1}: {e}")
+        if raise_errors:
+            raise
         return None
 
+def generate_images(scenes, max_workers=IMAGE_MAX_WORKERS, workspace=None):
+    """
+    Generates all scene images in parallel with at most max_workers requests in flight.
+    Returns (image_paths, failures) with image_paths in scene order (None for failed scenes).
+    """
+    image_paths, failures = run_scenes_concurrently(
+        lambda scene, i: generate_image(scene['image_prompt'], i, raise_errors=True, workspace=workspace),
+        scenes,
+        max_workers
+    )
+    for i, error in sorted(failures.items()):
+        print(f"⚠️ Scene {i+1} has no image: {error}")
+    return image_paths, failures
+
 def clean_story(story_text):
     # Stub: implement your cleaning logic here if needed
     return story_text
 
-def generate_narration(story_text, filename, voice_id="G17SuINrv2H9FC6nvetn"):
+def write_audio_stream(chunks, audio_path, on_ready=None, ready_bytes=NARRATION_READY_BYTES):
+    """
+    Appends streamed audio chunks to audio_path as they arrive, so memory stays
+    constant and the cost is linear in the audio length. on_ready(audio_path)
+    fires once ready_bytes are flushed to disk: enough MP3 frames for mutagen
+    to read the stream header and bitrate. Returns byte and timing stats.
+    """
+    started = time.perf_counter()
+    first_chunk_s = None
+    total_bytes = 0
+    notified = False
+    with open(audio_path, "wb") as f:
+        for chunk in chunks:
+            if not isinstance(chunk, bytes) or not chunk:
+                continue
+            if first_chunk_s is None:
+                first_chunk_s = time.perf_counter() - started
+            f.write(chunk)
+            total_bytes += len(chunk)
+            if on_ready and not notified and total_bytes >= ready_bytes:
+                f.flush()
+                notified = True
+                on_ready(audio_path)
+    if on_ready and not notified and total_bytes:
+        on_ready(audio_path)
+    return {
+        "bytes": total_bytes,
+        "first_chunk_s": first_chunk_s,
+        "total_s": time.perf_counter() - started,
+    }
+
+def generate_narration(story_text, filename, voice_id=DEFAULT_VOICE_ID, workspace=None, on_ready=None):
+    """
+    Narrates story_text with ElevenLabs (or the asset cache) and returns the
+    audio path. on_ready(audio_path) is called once the duration can be read,
+    for cached audio too. Raises on failure.
+    """
     story_text=clean_story(story_text)
     # voice_id="yFJbqk0f3hzpxkA3vSqT"
     try:
-        # Stream audio
-        audio_stream = elevenlabs.text_to_speech.stream(
-            text=story_text,
-            voice_id=voice_id,
-            model_id="eleven_multilingual_v2"
-        )
-
-        # Collect chunks
-        audio_bytes = b""
-        for chunk in audio_stream:
-            if isinstance(chunk, bytes):
-                audio_bytes += chunk
-
-        # Save to file
-        os.makedirs("output_videos", exist_ok=True)
-        audio_path = os.path.join("output_videos", filename)
-        with open(audio_path, "wb") as f:
-            f.write(audio_bytes)
-
-        print("🎧 Narration saved:", audio_path)
+        # Reuse audio for text/voice pairs we have already narrated
+        cache_key = asset_key("elevenlabs", ELEVENLABS_MODEL, story_text, voice_id)
+        if workspace is not None:
+            audio_path = workspace.tmp_path(filename)
+        else:
+            os.makedirs("output_videos", exist_ok=True)
+            audio_path = os.path.join("output_videos", filename)
+        if asset_cache.copy_to(cache_key, ".mp3", audio_path):
+            print("♻️ Narration served from cache:", audio_path)
+            if on_ready:
+                on_ready(audio_path)
+            return audio_path
+
+        # Stream audio and write chunks to disk as they arrive
+        with tracer.span("provider.tts", provider="elevenlabs", model=ELEVENLABS_MODEL, voice=voice_id) as span, \
+                limited("elevenlabs", ELEVENLABS_MODEL, estimate_tokens(story_text)):
+            client = elevenlabs or get_elevenlabs_client(ELEVENLABS_API_KEY)
+            audio_stream = client.text_to_speech.stream(
+                text=story_text,
+                voice_id=voice_id,
+                model_id=ELEVENLABS_MODEL
+            )
+            stats = write_audio_stream(audio_stream, audio_path, on_ready=on_ready)
+            span.add(bytes_in=len(story_text.encode()), bytes_out=stats["bytes"], first_chunk_s=stats["first_chunk_s"])
+        if not stats["bytes"]:
+            raise ValueError("No audio data received")
+        asset_cache.put_file(cache_key, audio_path, ".mp3")
+
+        print(f"🎧 Narration saved: {audio_path} ({stats['bytes'] / 1024:.0f} KiB, "
+              f"first chunk after {stats['first_chunk_s']:.2f}s, done in {stats['total_s']:.2f}s)")
         return audio_path
 
     except Exception as e:
         print("❌ ElevenLabs TTS Error:", str(e))
-        return None
+        raise
+
+def generate_scene_narrations(story_data, voice_id=DEFAULT_VOICE_ID, workspace=None, max_workers=TTS_MAX_WORKERS):
+    """
+    Narrates every scene with its own ElevenLabs call, in parallel, and joins the
+    clips without re-encoding. The title is read as part of the first scene.
+    Returns (narration_path, durations) with one exact duration per scene, or
+    None for a scene whose narration failed.
+    """
+    texts = [scene['text'] for scene in story_data['scenes']]
+    if texts and story_data.get('title'):
+        texts[0] = f"{story_data['title']}. {texts[0]}"
+
+    clip_paths, _ = run_scenes_concurrently(
+        lambda text, i: generate_narration(text, f"narration_scene_{i+1}.mp3", voice_id=voice_id, workspace=workspace),
+        texts,
+        max_workers
+    )
+    return join_scene_narrations(clip_paths, workspace)
+
+def join_scene_narrations(clip_paths, workspace=None):
+    """Joins per-scene narration MP3s without re-encoding. Returns (narration_path, durations)."""
+    if not any(clip_paths):
+        raise ValueError("Narration failed for every scene.")
+    from mutagen.mp3 import MP3
+    durations = [MP3(path).info.length if path else None for path in clip_paths]
+
+    tmp_dir = workspace.tmp_dir if workspace is not None else "output_videos"
+    list_file = os.path.join(tmp_dir, "narration_list.txt")
+    narration_path = os.path.join(tmp_dir, "narration.mp3")
+    with open(list_file, 'w') as f:
+        for path in clip_paths:
+            if path:
+                f.write(f"file '{os.path.abspath(path)}'\n")
+    run_ffmpeg(ffmpeg.input(list_file, format='concat', safe=0).output(narration_path, c='copy'))
+    os.remove(list_file)
+
+    print(f"🎧 Scene narration joined: {narration_path} ({sum(d for d in durations if d):.1f}s)")
+    return narration_path, durations
 
 # ========================
 # 3. VIDEO COMPOSITION FUNCTION
 # ========================
 
-import os
-import glob
-import random
-import ffmpeg
-from mutagen.mp3 import MP3
-
-def images_to_video_ffmpeg(image_dir, narration_audio_path, output_dir):
-    try:
-        music_dir = "music"
-        image_paths = sorted(glob.glob(os.path.join(image_dir, "*.png")))
-        if not image_paths:
-            raise ValueError("❌ No images found in the provided directory.")
-
-        narration_audio = MP3(narration_audio_path)
-        total_duration = narration_audio.info.length
-        duration_per_image = total_duration / len(image_paths)
-
-        music_files = glob.glob(os.path.join(music_dir, "*.mp3"))
-        if not music_files:
-            raise ValueError("❌ No background music found in music/ directory.")
-        bg_music_path = random.choice(music_files)
+# Background music level under the narration
+MUSIC_VOLUME = 0.5
 
-        os.makedirs(output_dir, exist_ok=True)
-        list_file = "image_list.txt"
-        slideshow_path = os.path.join(output_dir, "temp_video.mp4")
-        looped_music_path = os.path.join(output_dir, "looped_bg_music.mp3")
-        quiet_bg_music = os.path.join(output_dir, "quiet_bg_music.mp3")
-        mixed_audio_path = os.path.join(output_dir, "mixed_audio.m4a")
-        final_output = os.path.join(output_dir, "final_video1.mp4")
-
-        # Step 1: Create image list file
-        with open(list_file, 'w') as f:
-            for path in image_paths:
-                f.write(f"file '{os.path.abspath(path)}'\n")
-                f.write(f"duration {duration_per_image:.2f}\n")
-            f.write(f"file '{os.path.abspath(image_paths[-1])}'\n")
-
-        # Step 2: Create slideshow video
-        ffmpeg.input(list_file, format='concat', safe=0).output(
-            slideshow_path,
-            vcodec='libx264',
-            pix_fmt='yuv420p',
-            r=1/duration_per_image
-        ).run(overwrite_output=True)
-
-        # Step 3: Loop background music and lower its volume
-        ffmpeg.input(bg_music_path, stream_loop=-1).output(
-            looped_music_path,
-            t=total_duration,
-            acodec='libmp3lame'
-        ).run(overwrite_output=True)
+def _compose_single_pass(image_paths, durations, narration_audio_path, bg_music_path, final_output, list_file,
+                         music_volume=MUSIC_VOLUME, audio_pipe=None):
+    """
+    Builds slideshow, music loop, volume, mix and mux as one ffmpeg graph:
+    one process, one H.264 encode, one AAC encode and no intermediate media files.
+    The slideshow is the same concat-demuxer image list the multi-pass path
+    encodes, so every scene is shown for its full duration.
+    bg_music_path None means the narration already carries the music; audio_pipe
+    is that finished mix as raw PCM, streamed over stdin instead of read from a file.
+    """
+    with open(list_file, 'w') as f:
+        for path, duration in zip(image_paths, durations):
+            f.write(f"file '{os.path.abspath(path)}'\n")
+            f.write(f"duration {duration:.3f}\n")
+        # The concat demuxer drops the last duration unless the final file is repeated
+        f.write(f"file '{os.path.abspath(image_paths[-1])}'\n")
+    slideshow = ffmpeg.input(list_file, format='concat', safe=0)
+
+    narration = pcm_input(MIX_SAMPLE_RATE) if audio_pipe is not None else ffmpeg.input(narration_audio_path)
+    if bg_music_path is None:
+        mixed_audio = narration
+    else:
+        quiet_music = ffmpeg.input(bg_music_path, stream_loop=-1).filter('volume', music_volume)
+        mixed_audio = ffmpeg.filter_(
+            [narration, quiet_music],
+            'amix',
+            inputs=2,
+            duration='first',
+            dropout_transition=0
+        )
 
-        ffmpeg.input(looped_music_path).filter('volume', 0.5).output(
+    run_ffmpeg(ffmpeg.output(
+        slideshow,
+        mixed_audio,
+        final_output,
+        vcodec='libx264',
+        acodec='aac',
+        pix_fmt='yuv420p',
+        vsync='vfr'
+    ), input=audio_pipe)
+    os.remove(list_file)
+
+def _compose_multi_pass(image_paths, durations, total_duration, narration_audio_path, bg_music_path, tmp_dir, final_output, music_volume=MUSIC_VOLUME):
+    """
+    Original five-step composition through intermediate files in tmp_dir.
+    bg_music_path None skips the music steps: the narration is already mixed.
+    """
+    list_file = os.path.join(tmp_dir, "image_list.txt")
+    slideshow_path = os.path.join(tmp_dir, "temp_video.mp4")
+    quiet_bg_music = os.path.join(tmp_dir, "quiet_bg_music.wav")
+    mixed_audio_path = os.path.join(tmp_dir, "mixed_audio.m4a")
+
+    # Step 1: Create image list file
+    with open(list_file, 'w') as f:
+        for path, duration in zip(image_paths, durations):
+            f.write(f"file '{os.path.abspath(path)}'\n")
+            f.write(f"duration {duration:.3f}\n")
+        f.write(f"file '{os.path.abspath(image_paths[-1])}'\n")
+
+    # Step 2: Create slideshow video
+    run_ffmpeg(ffmpeg.input(list_file, format='concat', safe=0).output(
+        slideshow_path,
+        vcodec='libx264',
+        pix_fmt='yuv420p',
+        vsync='vfr'
+    ))
+
+    if bg_music_path is None:
+        mixed_audio_path = narration_audio_path
+    else:
+        # Step 3: Loop the pre-decoded background music and lower its volume in one PCM pass
+        run_ffmpeg(ffmpeg.input(bg_music_path, stream_loop=-1).filter('volume', music_volume).output(
             quiet_bg_music,
-            acodec='libmp3lame'
-        ).run(overwrite_output=True)
+            t=total_duration,
+            acodec='pcm_s16le'
+        ))
 
         # Step 4: Mix narration and quiet background music
         narration = ffmpeg.input(narration_audio_path)
@@ -231,29 +424,85 @@ def images_to_video_ffmpeg(image_dir, narration_audio_path, output_dir):
             dropout_transition=0
         )
 
-        ffmpeg.output(mixed_audio, mixed_audio_path, acodec='aac').run(overwrite_output=True)
+        run_ffmpeg(ffmpeg.output(mixed_audio, mixed_audio_path, acodec='aac'))
 
-        # Step 5: Combine slideshow + mixed audio
-        video_input = ffmpeg.input(slideshow_path)
-        audio_input = ffmpeg.input(mixed_audio_path)
+    # Step 5: Combine slideshow + mixed audio
+    video_input = ffmpeg.input(slideshow_path)
+    audio_input = ffmpeg.input(mixed_audio_path)
 
-        ffmpeg.output(
-            video_input,
-            audio_input,
-            final_output,
-            vcodec='libx264',
-            acodec='aac',
-            shortest=None
-        ).run(overwrite_output=True)
+    run_ffmpeg(ffmpeg.output(
+        video_input,
+        audio_input,
+        final_output,
+        vcodec='libx264',
+        acodec='aac',
+        shortest=None
+    ))
 
 
-        # Cleanup
-        os.remove(list_file)
-        os.remove(slideshow_path)
-        os.remove(looped_music_path)
+    # Cleanup
+    os.remove(list_file)
+    os.remove(slideshow_path)
+    if bg_music_path is not None:
         os.remove(quiet_bg_music)
         os.remove(mixed_audio_path)
 
+def images_to_video_ffmpeg(image_paths, narration_audio_path, output_dir, single_pass=True, tmp_dir=None, durations=None):
+    """
+    Composes the final video from the ordered scene images, narration and a track from the music library.
+    single_pass runs everything as one ffmpeg graph; set it to False for the
+    original multi-pass composition through intermediate files in tmp_dir.
+    durations gives each image its own screen time; otherwise the narration is split evenly.
+    """
+    try:
+        if not image_paths:
+            raise ValueError("❌ No images provided to create a video.")
+
+        if durations is None:
+            from mutagen.mp3 import MP3
+            narration_audio = MP3(narration_audio_path)
+            total_duration = narration_audio.info.length
+            durations = [total_duration / len(image_paths)] * len(image_paths)
+        elif len(durations) != len(image_paths):
+            raise ValueError("❌ Need exactly one duration per image.")
+        total_duration = sum(durations)
+
+        # Pre-decoded track, long enough to play through without looping when possible
+        music_track = music_library.select(total_duration)
+        if music_track is None:
+            raise ValueError("❌ No background music found in music/ directory.")
+        bg_music_path = music_track["path"]
+        music_volume = track_volume(music_track, MUSIC_VOLUME)
+
+        os.makedirs(output_dir, exist_ok=True)
+        tmp_dir = tmp_dir or output_dir
+        final_output = os.path.join(output_dir, "final_video1.mp4")
+
+        mix_path = None
+        audio_pipe = None
+        if AUDIO_MIXER == "numpy" and single_pass and AUDIO_HANDOFF == "pipe":
+            # Mix (with ducking) in-process and stream the PCM into the single ffmpeg pass
+            from audio_mixer import mix_to_pcm
+            with tracer.span("audio.mix", mixer="numpy", handoff="pipe"):
+                audio_pipe, _ = mix_to_pcm(narration_audio_path, bg_music_path, music_volume)
+            bg_music_path = None
+        elif AUDIO_MIXER == "numpy":
+            # Mix (with ducking) in-process; ffmpeg then only has to encode the result
+            from audio_mixer import mix_to_wav
+            mix_path = os.path.join(tmp_dir, "mixed_audio.wav")
+            with tracer.span("audio.mix", mixer="numpy", handoff="files"):
+                mix_to_wav(narration_audio_path, bg_music_path, mix_path, music_volume)
+            narration_audio_path, bg_music_path = mix_path, None
+
+        if single_pass:
+            _compose_single_pass(image_paths, durations, narration_audio_path, bg_music_path, final_output,
+                                 os.path.join(tmp_dir, "image_list.txt"), music_volume, audio_pipe)
+        else:
+            _compose_multi_pass(image_paths, durations, total_duration, narration_audio_path,
+                                bg_music_path, tmp_dir, final_output, music_volume)
+        if mix_path:
+            os.remove(mix_path)
+
         print("✅ Final video saved at:", final_output)
         return final_output
 
@@ -269,49 +518,251 @@ def images_to_video_ffmpeg(image_dir, narration_audio_path, output_dir):
 # 4. MAIN WORKFLOW
 # ========================
 
+def _story_stage(user_prompt, scene_count=5):
+    story_data = generate_story_with_prompts(user_prompt, scene_count)
+    if not story_data or 'scenes' not in story_data:
+        raise ValueError("Failed to generate valid story data.")
+    return story_data
+
+def _compose_video_stage(image_results, narration_results, workspace, single_pass=True):
+    narration_path, scene_durations = narration_results
+    if scene_durations is not None:
+        image_paths, durations = align_scene_durations(image_results[0], scene_durations)
+    else:
+        image_paths, durations = [path for path in image_results[0] if path], None
+    if not narration_path or not image_paths:
+        raise ValueError("Failed to generate required media (audio/images).")
+    return images_to_video_ffmpeg(image_paths, narration_path, workspace.output_dir,
+                                  single_pass=single_pass, tmp_dir=workspace.tmp_dir, durations=durations)
+
+def _narration_stage(story_data, workspace, per_scene, voice_id=DEFAULT_VOICE_ID):
+    if per_scene:
+        return generate_scene_narrations(story_data, voice_id=voice_id, workspace=workspace)
+    return generate_narration(build_narration_text(story_data), "narration.mp3", voice_id=voice_id, workspace=workspace), None
+
+def _streaming_story_stage(user_prompt, workspace, scene_count, per_scene, voice_id=DEFAULT_VOICE_ID):
+    """
+    Story, images and narration as one stage: each scene's image (and with
+    per_scene its narration) is requested as soon as that part of the streamed
+    story is complete. Returns (story_data, image_results, narration_results, first_image_request_s).
+    """
+    narration_job = None
+    if per_scene:
+        narration_job = lambda text, i: generate_narration(text, f"narration_scene_{i+1}.mp3", voice_id=voice_id, workspace=workspace)
+    with SceneDispatcher(
+        lambda prompt, i: generate_image(prompt, i, raise_errors=True, workspace=workspace),
+        narration_job,
+        image_workers=IMAGE_MAX_WORKERS,
+        narration_workers=TTS_MAX_WORKERS
+    ) as dispatcher:
+        story_data = dispatcher.consume(stream_story_with_prompts(user_prompt, scene_count))
+        print(f"✅ Story streamed in {dispatcher.story_s:.1f}s.")
+        scene_count = len(story_data['scenes'])
+        if per_scene:
+            narration_results = join_scene_narrations(dispatcher.narration_results(scene_count)[0], workspace)
+        else:
+            # Whole-story narration overlaps the images still in flight
+            narration_results = _narration_stage(story_data, workspace, False, voice_id)
+        image_results = dispatcher.image_results(scene_count)
+    return story_data, image_results, narration_results, dispatcher.first_image_request_s
+
+def build_pipeline(per_scene_narration=PER_SCENE_NARRATION, voice_id=DEFAULT_VOICE_ID, scene_count=5, single_pass=True,
+                   stream_story=STREAM_STORY):
+    """
+    Stages for the OpenAI/ElevenLabs pipeline. Narration and images both only
+    need the story, so they run concurrently before composition.
+    With per_scene_narration every image is timed to its own scene's narration.
+    With stream_story images (and per-scene narration) start while the story is
+    still streaming, in one stage that also outputs 'first_image_request_s'.
+    Expects 'user_prompt' and 'workspace' as initial values.
+    """
+    if stream_story:
+        stages = [
+            PipelineStage("story_stream", lambda user_prompt, workspace: _streaming_story_stage(user_prompt, workspace, scene_count, per_scene_narration, voice_id),
+                          inputs=("user_prompt", "workspace"),
+                          outputs=("story_data", "image_results", "narration_results", "first_image_request_s")),
+        ]
+    else:
+        stages = [
+            PipelineStage("story", lambda user_prompt: _story_stage(user_prompt, scene_count),
+                          inputs=("user_prompt",), outputs=("story_data",)),
+            PipelineStage("images", lambda story_data, workspace: generate_images(story_data['scenes'], workspace=workspace),
+                          inputs=("story_data", "workspace"), outputs=("image_results",)),
+            PipelineStage("narration", lambda story_data, workspace: _narration_stage(story_data, workspace, per_scene_narration, voice_id),
+                          inputs=("story_data", "workspace"), outputs=("narration_results",)),
+        ]
+    return stages + [
+        PipelineStage("video", lambda image_results, narration_results, workspace: _compose_video_stage(image_results, narration_results, workspace, single_pass),
+                      inputs=("image_results", "narration_results", "workspace"), outputs=("video_path",)),
+    ]
+
 def main():
     """
     Main function to run the entire video generation pipeline.
     """
+    require_api_keys()
+    workspace = JobWorkspace()
     try:
         # --- Get User Input ---
         user_prompt = input("👉 Enter a prompt for your requirement: ")
-        
-        # --- Generate Content ---
-        story_data = generate_story_with_prompts(user_prompt)
-        
-        if not story_data or 'scenes' not in story_data:
-            print("❌ Failed to generate valid story data. Exiting.")
-            return
-
-        # Combine text for narration
-        full_narration_text = story_data.get('title', '') + ". " + " ".join([scene['text'] for scene in story_data['scenes']])
-
-        # --- Generate Media ---
-        narration_path = generate_narration(full_narration_text, "narration.mp3")
-        
-        image_paths = []
-        for i, scene in enumerate(story_data['scenes']):
-            img_path = generate_image(scene['image_prompt'], i)
-            if img_path:
-                image_paths.append(img_path)
-        
-        if not narration_path or not image_paths:
-            print("❌ Failed to generate required media (audio/images). Exiting.")
-            return
-            
-        # --- Create Video ---
-        images_to_video_ffmpeg(IMAGE_DIR, narration_path, VIDEO_DIR)
+
+        # --- Generate Content, Media and Video ---
+        run_pipeline(build_pipeline(), {"user_prompt": user_prompt, "workspace": workspace})
+        stats = asset_cache.stats()
+        print(f"♻️ Asset cache: {stats['hits']} hits, {stats['misses']} misses")
 
     except Exception as e:
         print(f"An unexpected error occurred in the main workflow: {e}")
     finally:
-        # Clean up the image directory after the run
-        if os.path.exists(IMAGE_DIR):
-            for file in glob.glob(os.path.join(IMAGE_DIR, "*.png")):
-                os.remove(file)
-            print("🧹 Cleaned up generated images.")
+        # Clean up this job's images and temp files after the run
+        workspace.cleanup()
+
+def run_long_form(scene_count):
+    """Asks for a prompt and renders it as a long-form video of scene_count scenes (see long_form.py)."""
+    from long_form import render_long_form
+    workspace = JobWorkspace()
+    try:
+        user_prompt = input("👉 Enter a prompt for your long-form video: ")
+        render_long_form(user_prompt, gemini_client or get_gemini_client(), workspace, scene_count)
+    except Exception as e:
+        print(f"An unexpected error occurred in the long-form workflow: {e}")
+    finally:
+        workspace.cleanup()
+
+# ========================
+# 5. BATCH MODE
+# ========================
+
+# Maximum number of videos rendered at once in batch mode
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "2"))
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+def read_batch(path):
+    """
+    Reads one job per JSONL line: {"prompt": ..., "voice_id": ..., "scenes": 5,
+    "per_scene_narration": false, "single_pass": true, "id": ...}. Only prompt
+    is required; id is a free-form label copied into the result. Malformed
+    lines come back as {"error": ...} so they are reported, not skipped.
+    """
+    jobs = []
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                job = json.loads(line)
+                if not isinstance(job, dict) or not job.get("prompt"):
+                    raise ValueError("missing 'prompt'")
+            except ValueError as e:
+                job = {"error": f"line {line_number}: {e}"}
+            job["line"] = line_number
+            jobs.append(job)
+    return jobs
+
+def run_batch_job(job):
+    """
+    Renders one batch entry and returns its result record; never raises.
+    The entry's own id is only echoed back: every job renders in a fresh
+    workspace, so duplicate or odd ids never share files.
+    """
+    user_id = job.get("id")
+    result = {"line": job["line"], "id": None if user_id is None else str(user_id),
+              "job_id": None, "prompt": job.get("prompt"), "status": "failed"}
+    if "error" in job:
+        result["error"] = job["error"]
+        return result
+
+    workspace = None
+    started = time.perf_counter()
+    try:
+        workspace = JobWorkspace()
+        result["job_id"] = workspace.job_id
+        pipeline = build_pipeline(
+            per_scene_narration=job.get("per_scene_narration", PER_SCENE_NARRATION),
+            voice_id=job.get("voice_id", DEFAULT_VOICE_ID),
+            scene_count=int(job.get("scenes", 5)),
+            single_pass=job.get("single_pass", True),
+        )
+        values, report = run_pipeline(pipeline, {"user_prompt": job["prompt"], "workspace": workspace})
+        result.update(
+            status="done" if values.get("video_path") else "failed",
+            video_path=values.get("video_path"),
+            image_failures=values["image_results"][1],
+            stages={name: timing["duration"] for name, timing in report["stages"].items()},
+            critical_path=report["critical_path"],
+            first_image_request_s=values.get("first_image_request_s"),
+        )
+        if not values.get("video_path"):
+            result["error"] = "Video composition produced no output."
+    except Exception as e:
+        result["error"] = str(e)
+    finally:
+        result["duration_s"] = time.perf_counter() - started
+        if workspace is not None:
+            workspace.cleanup()
+    return result
+
+def run_batch(input_path, results_path, concurrency=BATCH_CONCURRENCY):
+    """
+    Renders every job in the JSONL input with at most concurrency videos in
+    flight, appending one result line per job to results_path as each one
+    finishes. Prints a throughput summary and returns the results.
+    """
+    require_api_keys()
+    jobs = read_batch(input_path)
+    print(f"📦 Batch of {len(jobs)} jobs from {input_path}, {concurrency} at a time")
+
+    results = []
+    started = time.perf_counter()
+    with open(results_path, "a") as out, ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        futures = [pool.submit(tracer.wrap(run_batch_job), job) for job in jobs]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+            mark = "✅" if result["status"] == "done" else "❌"
+            print(f"{mark} [{len(results)}/{len(jobs)}] line {result['line']}: "
+                  f"{result.get('video_path') or result.get('error')}")
+    elapsed = time.perf_counter() - started
+
+    done = [r for r in results if r["status"] == "done"]
+    print(f"\n📊 {len(done)}/{len(results)} videos in {elapsed:.1f}s "
+          f"({len(done) / elapsed * 3600 if elapsed else 0:.1f} videos/hour)")
+    stage_names = sorted({name for r in done for name in r["stages"]})
+    for name in stage_names + ["total"]:
+        if name == "total":
+            durations = [r["duration_s"] for r in done]
+        else:
+            durations = [r["stages"][name] for r in done if name in r["stages"]]
+        if durations:
+            print(f"   {name:>10}: p50 {_percentile(durations, 50):6.1f}s  p95 {_percentile(durations, 95):6.1f}s")
+    first_requests = [r["first_image_request_s"] for r in done if r.get("first_image_request_s") is not None]
+    if first_requests:
+        print(f"   first image request: p50 {_percentile(first_requests, 50):6.1f}s  p95 {_percentile(first_requests, 95):6.1f}s")
+    stats = asset_cache.stats()
+    print(f"♻️ Asset cache: {stats['hits']} hits, {stats['misses']} misses")
+    return results
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Generate narrated videos from prompts.")
+    parser.add_argument("--batch", metavar="PROMPTS_JSONL", help="render every prompt in this JSONL file instead of asking for one")
+    parser.add_argument("--results", default="batch_results.jsonl", help="where batch mode appends one result per job")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="videos rendered at once in batch mode")
+    parser.add_argument("--long-form", type=int, metavar="SCENES", help="render one article-length video of this many scenes in windows")
+    args = parser.parse_args()
+
+    if args.batch:
+        run_batch(args.batch, args.results, args.concurrency)
+    elif args.long_form:
+        run_long_form(args.long_form)
+    else:
+        main()
@@ -0,0 +1,144 @@
+import os
+import re
+import json
+import glob
+import random
+import tempfile
+import threading
+import time
+import hashlib
+import wave
+import ffmpeg
+
+# Source tracks and where their pre-decoded copies and index live
+MUSIC_DIR = "music"
+MUSIC_CACHE_DIR = os.getenv("MUSIC_CACHE_DIR", ".music_cache")
+MUSIC_EXTENSIONS = (".mp3", ".wav", ".m4a", ".ogg", ".flac")
+# Pre-decoded format: the mix format video_generator encodes to (ar=22050, ac=1)
+MIX_SAMPLE_RATE = 22050
+MIX_CHANNELS = 1
+# Minimum seconds between directory checks; 0 checks on every selection
+MUSIC_RESCAN_SECONDS = float(os.getenv("MUSIC_RESCAN_SECONDS", "30"))
+# Mean loudness tracks are levelled to before the mix volume is applied
+MUSIC_REFERENCE_DB = float(os.getenv("MUSIC_REFERENCE_DB", "-20"))
+MUSIC_MAX_GAIN_DB = 12.0
+
+class MusicLibrary:
+    """
+    Background music decoded once to MIX_SAMPLE_RATE mono PCM WAV, with an index
+    of duration, mean loudness and source mtime. Rescans only re-decode tracks
+    whose file changed, so renders never decode an MP3 from scratch.
+    """
+    def __init__(self, music_dir=MUSIC_DIR, cache_dir=MUSIC_CACHE_DIR):
+        self.music_dir = music_dir
+        self.cache_dir = cache_dir
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.tracks = {}
+        self._lock = threading.Lock()
+        self._scanned_at = None
+
+    def _load_index(self):
+        try:
+            with open(self.index_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(self.tracks, f, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    def _decode(self, source, mtime):
+        """Decodes one track to PCM WAV and measures its mean loudness in the same pass."""
+        name = hashlib.sha1(f"{os.path.abspath(source)}:{mtime}".encode()).hexdigest()[:16]
+        pcm_path = os.path.join(self.cache_dir, f"{name}.wav")
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".wav")
+        os.close(fd)
+        try:
+            _, stderr = (
+                ffmpeg.input(source)
+                .filter('volumedetect')
+                .output(tmp_path, acodec='pcm_s16le', ac=MIX_CHANNELS, ar=MIX_SAMPLE_RATE)
+                .overwrite_output()
+                .run(capture_stdout=True, capture_stderr=True)
+            )
+            os.replace(tmp_path, pcm_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        stderr = stderr.decode(errors="replace")
+        match = re.search(r"mean_volume:\s*(-?[\d.]+) dB", stderr)
+        with wave.open(pcm_path, "rb") as wav:
+            duration = wav.getnframes() / wav.getframerate()
+        return {
+            "source": source,
+            "path": pcm_path,
+            "mtime": mtime,
+            "duration": duration,
+            "loudness_db": float(match.group(1)) if match else None,
+        }
+
+    def scan(self, force=False):
+        """Indexes music_dir, decoding only new or modified tracks. Returns the track list."""
+        with self._lock:
+            if not force and self._scanned_at is not None and time.monotonic() - self._scanned_at < MUSIC_RESCAN_SECONDS:
+                return list(self.tracks.values())
+            if not self.tracks:
+                self.tracks = self._load_index()
+
+            os.makedirs(self.cache_dir, exist_ok=True)
+            sources = [path for path in sorted(glob.glob(os.path.join(self.music_dir, "*")))
+                       if path.lower().endswith(MUSIC_EXTENSIONS)]
+            changed = False
+            for source in sources:
+                mtime = os.path.getmtime(source)
+                entry = self.tracks.get(source)
+                if entry and entry["mtime"] == mtime and os.path.exists(entry["path"]):
+                    continue
+                try:
+                    track = self._decode(source, mtime)
+                except Exception as e:
+                    print(f"⚠️ Could not decode {source}: {e}")
+                    continue
+                if entry and entry["path"] != track["path"] and os.path.exists(entry["path"]):
+                    os.remove(entry["path"])
+                self.tracks[source] = track
+                changed = True
+                print(f"🎼 Indexed {source} ({track['duration']:.0f}s)")
+
+            for source in [s for s in self.tracks if s not in sources]:
+                entry = self.tracks.pop(source)
+                if os.path.exists(entry["path"]):
+                    os.remove(entry["path"])
+                changed = True
+
+            if changed:
+                self._save_index()
+            self._scanned_at = time.monotonic()
+            return list(self.tracks.values())
+
+    def select(self, min_duration=0.0, rng=random):
+        """
+        Picks a random track at least min_duration long so it never has to loop;
+        if none is long enough, the longest track. Returns an index entry or None.
+        """
+        tracks = self.scan()
+        if not tracks:
+            return None
+        long_enough = [t for t in tracks if t["duration"] >= min_duration]
+        if long_enough:
+            return rng.choice(long_enough)
+        return max(tracks, key=lambda t: t["duration"])
+
+def track_volume(track, base_volume):
+    """Mix volume for track: base_volume after levelling it to MUSIC_REFERENCE_DB."""
+    if track.get("loudness_db") is None:
+        return base_volume
+    gain_db = max(-MUSIC_MAX_GAIN_DB, min(MUSIC_MAX_GAIN_DB, MUSIC_REFERENCE_DB - track["loudness_db"]))
+    return base_volume * 10 ** (gain_db / 20)
+
+# Process-wide library shared by every render
+music_library = MusicLibrary()
@@ -0,0 +1,91 @@
+import os
+import threading
+
+# Connection pool sizing for the shared provider HTTP clients
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "32"))
+HTTP_KEEPALIVE_SECONDS = float(os.getenv("HTTP_KEEPALIVE_SECONDS", "90"))
+# Matches call_policy's longest attempt, so a call it abandons cannot hold its worker longer
+HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", os.getenv("TIMEOUT_MAX_SECONDS", "180")))
+
+_clients = {}
+_lock = threading.Lock()
+
+def genai_types():
+    """The google.genai types module, imported on first use instead of at startup."""
+    from google.genai import types
+    return types
+
+def _http_client():
+    """httpx client that keeps TLS connections open between requests."""
+    import httpx
+    return httpx.Client(
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_SECONDS,
+        ),
+        timeout=HTTP_TIMEOUT_SECONDS,
+    )
+
+def _new_gemini(api_key):
+    from google import genai
+    # genai.Client reuses one pooled HTTP session for all of its calls
+    http_options = genai_types().HttpOptions(timeout=int(HTTP_TIMEOUT_SECONDS * 1000))
+    if api_key:
+        return genai.Client(api_key=api_key, http_options=http_options)
+    return genai.Client(http_options=http_options)
+
+def _new_openai(api_key):
+    import openai
+    return openai.OpenAI(api_key=api_key, http_client=_http_client())
+
+def _new_elevenlabs(api_key):
+    from elevenlabs.client import ElevenLabs
+    return ElevenLabs(api_key=api_key, httpx_client=_http_client())
+
+_FACTORIES = {
+    "gemini": _new_gemini,
+    "openai": _new_openai,
+    "elevenlabs": _new_elevenlabs,
+}
+
+def get_client(provider, api_key=None):
+    """
+    Returns the process-wide client for provider and api_key, creating it on
+    first use. Provider SDKs are only imported here, so processes that never
+    call a provider never pay for loading it, and every job in a process shares
+    the same warm connections.
+    """
+    if provider not in _FACTORIES:
+        raise ValueError(f"Unknown provider: {provider}")
+    key = (provider, api_key)
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _FACTORIES[provider](api_key)
+            _clients[key] = client
+            print(f"🔌 Created {provider} client.")
+        return client
+
+def get_gemini_client(api_key=None):
+    """Shared Gemini client; without api_key the SDK reads GOOGLE_API_KEY/GEMINI_API_KEY."""
+    return get_client("gemini", api_key)
+
+def get_openai_client(api_key):
+    return get_client("openai", api_key)
+
+def get_elevenlabs_client(api_key):
+    return get_client("elevenlabs", api_key)
+
+def close_clients():
+    """Closes pooled connections, e.g. before a worker process exits."""
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        close = getattr(client, "close", None)
+        if callable(close):
+            try:
+                close()
+            except Exception:
+                pass
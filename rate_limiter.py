@@ -0,0 +1,208 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from tracing import tracer
+
+# Provider quotas per (provider, model): requests and tokens per minute, None for unlimited.
+# Override or extend with RATE_LIMITS, e.g.
+#   RATE_LIMITS='{"gemini/gemini-2.0-flash-preview-image-generation": {"rpm": 10}}'
+DEFAULT_RATE_LIMITS = {
+    ("gemini", "gemini-2.0-flash-exp"): {"rpm": 60, "tpm": 1_000_000},
+    ("gemini", "gemini-2.0-flash-preview-image-generation"): {"rpm": 60, "tpm": None},
+    ("gemini", "gemini-2.5-flash-preview-tts"): {"rpm": 60, "tpm": 100_000},
+    ("openai", "gpt-4o"): {"rpm": 500, "tpm": 30_000},
+    ("elevenlabs", "eleven_multilingual_v2"): {"rpm": 120, "tpm": None},
+}
+# Seconds of quota a bucket may bank for bursts
+RATE_LIMIT_BURST_SECONDS = float(os.getenv("RATE_LIMIT_BURST_SECONDS", "5"))
+# Lowest fraction of the quota that throttling feedback can push a limiter down to
+RATE_LIMIT_MIN_SCALE = float(os.getenv("RATE_LIMIT_MIN_SCALE", "0.1"))
+# Recovery towards the full quota after each successful call
+RATE_LIMIT_RECOVERY = float(os.getenv("RATE_LIMIT_RECOVERY", "0.05"))
+
+def _configured_limits():
+    limits = dict(DEFAULT_RATE_LIMITS)
+    for name, values in json.loads(os.getenv("RATE_LIMITS", "{}")).items():
+        provider, model = name.split("/", 1)
+        limits[(provider, model)] = {**limits.get((provider, model), {}), **values}
+    return limits
+
+def estimate_tokens(text):
+    """Rough token count for quota accounting (about four characters per token)."""
+    return max(1, len(text) // 4)
+
+class TokenBucket:
+    """Refills at rate units per second up to capacity. Not thread-safe; RateLimiter locks it."""
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, scale):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate * scale)
+        self._updated = now
+
+    def wait_time(self, amount, scale=1.0):
+        """Seconds until amount units are available (0 if they are now)."""
+        self._refill(scale)
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / (self.rate * scale)
+
+    def take(self, amount):
+        self.level -= min(amount, self.capacity)
+
+class RateLimiter:
+    """
+    Request and token buckets for one provider/model. Callers are served in
+    arrival order, so one job's burst cannot starve another job's requests.
+    Throttling responses shrink the effective rate; successes restore it.
+    """
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None, share=1.0):
+        self.requests = self._bucket(requests_per_minute, share)
+        self.tokens = self._bucket(tokens_per_minute, share)
+        self.scale = 1.0
+        self.blocked_until = 0.0
+        self._queue = deque()
+        self._cond = threading.Condition()
+
+    def _bucket(self, per_minute, share):
+        if not per_minute:
+            return None
+        rate = per_minute * share / 60
+        return TokenBucket(rate, rate * RATE_LIMIT_BURST_SECONDS)
+
+    def _wait_time(self, tokens):
+        """Caller holds the condition lock."""
+        wait = self.blocked_until - time.monotonic()
+        if self.requests is not None:
+            wait = max(wait, self.requests.wait_time(1, self.scale))
+        if self.tokens is not None and tokens:
+            wait = max(wait, self.tokens.wait_time(tokens, self.scale))
+        return wait
+
+    def _take(self, tokens):
+        if self.requests is not None:
+            self.requests.take(1)
+        if self.tokens is not None and tokens:
+            self.tokens.take(tokens)
+
+    def acquire(self, tokens=0):
+        """Blocks in FIFO order until one request (and tokens) fit the quota. Returns seconds waited."""
+        started = time.monotonic()
+        ticket = object()
+        with self._cond:
+            self._queue.append(ticket)
+            try:
+                while True:
+                    timeout = None
+                    if self._queue[0] is ticket:
+                        timeout = self._wait_time(tokens)
+                        if timeout <= 0:
+                            self._take(tokens)
+                            break
+                    self._cond.wait(timeout)
+            finally:
+                self._queue.remove(ticket)
+                self._cond.notify_all()
+        return time.monotonic() - started
+
+    def try_acquire(self, tokens=0):
+        """Takes quota only if nobody is queued and it is available right now."""
+        with self._cond:
+            if self._queue or self._wait_time(tokens) > 0:
+                return False
+            self._take(tokens)
+            return True
+
+    def throttled(self, retry_after=None):
+        """Feeds a 429 back: halve the rate and hold every caller until Retry-After passes."""
+        with self._cond:
+            self.scale = max(RATE_LIMIT_MIN_SCALE, self.scale / 2)
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+            self._cond.notify_all()
+
+    def succeeded(self):
+        with self._cond:
+            if self.scale < 1.0:
+                self.scale = min(1.0, self.scale + RATE_LIMIT_RECOVERY)
+
+# Fraction of each quota this process may use; render workers each get 1/N
+_process_share = float(os.getenv("RATE_LIMIT_SHARE", "1"))
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def set_process_share(share):
+    """Splits quotas between processes; the render pool calls this in every worker."""
+    global _process_share
+    with _limiters_lock:
+        _process_share = share
+        _limiters.clear()
+
+def limiter_for(provider, model):
+    """Process-wide limiter for provider/model, or None when it has no configured quota."""
+    key = (provider, model)
+    with _limiters_lock:
+        if key not in _limiters:
+            limits = _configured_limits().get(key)
+            _limiters[key] = RateLimiter(limits.get("rpm"), limits.get("tpm"), _process_share) if limits else None
+        return _limiters[key]
+
+def acquire(provider, model, tokens=0):
+    """Waits for quota on provider/model and records the wait on the current trace span."""
+    limiter = limiter_for(provider, model)
+    if limiter is None:
+        return 0.0
+    waited = limiter.acquire(tokens)
+    if waited > 0.01:
+        tracer.add(rate_limit_wait_s=waited)
+    return waited
+
+def retry_after(error):
+    """Seconds from a throttling error's Retry-After header, if it carried one."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+def is_throttled(error):
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    return status == 429 or "RESOURCE_EXHAUSTED" in str(error)
+
+def report(provider, model, error=None):
+    """
+    Feeds a call's outcome back into the provider/model limiter. Returns the
+    Retry-After delay for a throttled call (0 when none was given), else None.
+    """
+    limiter = limiter_for(provider, model)
+    if error is None:
+        if limiter is not None:
+            limiter.succeeded()
+        return None
+    if not is_throttled(error):
+        return None
+    delay = retry_after(error)
+    if limiter is not None:
+        limiter.throttled(delay)
+    print(f"🚦 {provider}/{model} throttled; slowing down" + (f" for {delay:.0f}s" if delay else ""))
+    return delay or 0.0
+
+@contextmanager
+def limited(provider, model, tokens=0):
+    """Waits for quota before the with block and reports its outcome afterwards."""
+    acquire(provider, model, tokens)
+    try:
+        yield
+    except Exception as e:
+        report(provider, model, error=e)
+        raise
+    report(provider, model)
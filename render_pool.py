@@ -0,0 +1,117 @@
+import os
+import threading
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from rate_limiter import set_process_share
+
+# Pool sizing, overridable from the environment
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "2"))
+RENDER_QUEUE_SIZE = int(os.getenv("RENDER_QUEUE_SIZE", "4"))
+# Finished handles nobody collected with forget() are dropped this long after they finished
+RENDER_HANDLE_TTL_SECONDS = 600
+
+class RenderPoolFull(RuntimeError):
+    """Raised when every worker is busy and the wait queue is full."""
+
+class JobHandle:
+    """Reference to a submitted render job that callers can poll."""
+    def __init__(self, job_id, future):
+        self.job_id = job_id
+        self.future = future
+        self.submitted_at = time.time()
+        self.finished_at = None
+
+    @property
+    def status(self):
+        if self.future.done():
+            return "failed" if self.future.exception() is not None else "done"
+        return "running" if self.future.running() else "queued"
+
+    def result(self, timeout=None):
+        return self.future.result(timeout=timeout)
+
+class RenderPool:
+    """
+    Process pool that runs render jobs off the Streamlit script thread.
+    At most max_workers jobs run and max_queue more may wait; beyond that
+    submit() applies backpressure by blocking or raising RenderPoolFull.
+    A worker that dies breaks the whole executor; the next submit() replaces it.
+    """
+    def __init__(self, max_workers=RENDER_WORKERS, max_queue=RENDER_QUEUE_SIZE):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = self._new_executor()
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _new_executor(self):
+        # spawn avoids forking the multi-threaded web server process; each
+        # worker gets an equal share of the provider rate limits
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=set_process_share,
+            initargs=(1 / self.max_workers,)
+        )
+
+    def _submit_to_executor(self, func, args, kwargs):
+        executor = self._executor
+        try:
+            return executor.submit(func, *args, **kwargs)
+        except BrokenProcessPool:
+            with self._lock:
+                if self._executor is executor:
+                    print("⚠️ A render worker died and broke the pool; starting fresh workers.")
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    self._executor = self._new_executor()
+            return self._executor.submit(func, *args, **kwargs)
+
+    def submit(self, job_id, func, *args, block=False, timeout=None, **kwargs):
+        """Queues func(*args, **kwargs) under job_id and returns its JobHandle."""
+        if not self._slots.acquire(blocking=block, timeout=timeout if block else None):
+            raise RenderPoolFull(f"Render queue is full ({self.max_workers} running, {self.max_queue} waiting).")
+        try:
+            future = self._submit_to_executor(func, args, kwargs)
+        except Exception:
+            self._slots.release()
+            raise
+        handle = JobHandle(job_id, future)
+        future.add_done_callback(lambda _: self._finished(handle))
+        with self._lock:
+            self._prune()
+            self._jobs[job_id] = handle
+        return handle
+
+    def _finished(self, handle):
+        handle.finished_at = time.time()
+        self._slots.release()
+
+    def _prune(self):
+        """Drops handles that finished long ago and were never collected (caller holds the lock)."""
+        cutoff = time.time() - RENDER_HANDLE_TTL_SECONDS
+        for job_id in [job_id for job_id, handle in self._jobs.items()
+                       if handle.finished_at is not None and handle.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def forget(self, job_id):
+        """Drops a finished job's handle once the caller has collected its outcome."""
+        with self._lock:
+            handle = self._jobs.get(job_id)
+            if handle is not None and handle.future.done():
+                del self._jobs[job_id]
+
+    def get(self, job_id):
+        """Returns the handle for job_id, or None if this pool never saw it."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self):
+        with self._lock:
+            statuses = [handle.status for handle in self._jobs.values()]
+        return {status: statuses.count(status) for status in ("queued", "running", "done", "failed")}
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
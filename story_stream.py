@@ -0,0 +1,201 @@
+import json
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from tracing import tracer
+
+class StoryStreamParser:
+    """
+    Incremental parser for the story JSON while the model is still writing it.
+    Only the structure (nesting, keys and string boundaries) is tracked
+    character by character; every completed value is decoded with json.loads.
+    feed() returns the events the new text completed, in order:
+      ("title", title), ("text", index, text), ("image_prompt", index, prompt),
+      ("scene", index, scene).
+    """
+    def __init__(self):
+        self.text = ""
+        self._pos = 0
+        self._stack = []          # open containers: {"kind", "path", "start", "key", "expect_key", "count"}
+        self._in_string = False
+        self._escaped = False
+        self._string_start = None
+        self._string_path = None
+
+    def _child_path(self):
+        if not self._stack:
+            return ()
+        top = self._stack[-1]
+        if top["kind"] == "{":
+            return top["path"] + (top["key"],)
+        top["count"] += 1
+        return top["path"] + (top["count"] - 1,)
+
+    def _completed(self, path, raw, events):
+        if path == ("title",):
+            events.append(("title", json.loads(raw)))
+        elif len(path) == 2 and path[0] == "scenes":
+            events.append(("scene", path[1], json.loads(raw)))
+        elif len(path) == 3 and path[0] == "scenes" and path[2] in ("text", "image_prompt"):
+            events.append((path[2], path[1], json.loads(raw)))
+
+    def feed(self, chunk):
+        events = []
+        self.text += chunk
+        text = self.text
+        while self._pos < len(text):
+            char = text[self._pos]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    raw = text[self._string_start:self._pos + 1]
+                    top = self._stack[-1] if self._stack else None
+                    if top is not None and top["kind"] == "{" and top["expect_key"]:
+                        top["key"] = json.loads(raw)
+                    elif top is not None:
+                        self._completed(self._string_path, raw, events)
+            elif char == '"':
+                self._in_string = True
+                self._string_start = self._pos
+                top = self._stack[-1] if self._stack else None
+                if top is not None and not (top["kind"] == "{" and top["expect_key"]):
+                    self._string_path = self._child_path()
+            elif char in "{[":
+                path = self._child_path()
+                self._stack.append({"kind": char, "path": path, "start": self._pos,
+                                    "key": None, "expect_key": char == "{", "count": 0})
+            elif char in "}]":
+                if self._stack:
+                    frame = self._stack.pop()
+                    self._completed(frame["path"], text[frame["start"]:self._pos + 1], events)
+            elif char == ":" and self._stack:
+                self._stack[-1]["expect_key"] = False
+            elif char == "," and self._stack and self._stack[-1]["kind"] == "{":
+                self._stack[-1]["expect_key"] = True
+            self._pos += 1
+        return events
+
+    def result(self):
+        """The complete story; raises ValueError if the stream ended mid-document."""
+        return json.loads(self.text)
+
+class SceneDispatcher:
+    """
+    Consumes a streamed story and starts each scene's work the moment its
+    inputs exist: image_job(prompt, index) once the scene's image_prompt is
+    complete and, if given, narration_job(text, index) once its text is (the
+    title is read as part of the first scene, as in generate_scene_narrations).
+    Jobs run on bounded thread pools while the rest of the story is still
+    streaming. Use as a context manager so the pools are always shut down.
+    Job spans nest under the span that was current when the dispatcher was
+    created, not under the story request that happens to be streaming.
+    """
+    def __init__(self, image_job, narration_job=None, image_workers=4, narration_workers=4, on_image=None):
+        self.image_job = image_job
+        self.narration_job = narration_job
+        self.on_image = on_image
+        self._image_pool = ThreadPoolExecutor(max_workers=max(1, image_workers))
+        self._narration_pool = ThreadPoolExecutor(max_workers=max(1, narration_workers)) if narration_job else None
+        self._images = {}
+        self._narrations = {}
+        self._title = None
+        self._texts = {}
+        self._started = None
+        self._context = contextvars.copy_context()
+        self.first_image_request_s = None
+        self.story_s = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        cancel = exc_type is not None
+        self._image_pool.shutdown(wait=True, cancel_futures=cancel)
+        if self._narration_pool is not None:
+            self._narration_pool.shutdown(wait=True, cancel_futures=cancel)
+
+    def _image(self, prompt, index):
+        result = self.image_job(prompt, index)
+        if self.on_image is not None and result:
+            self.on_image(index, result)
+        return result
+
+    def _submit_image(self, index, prompt):
+        if index in self._images:
+            return
+        if self.first_image_request_s is None:
+            self.first_image_request_s = time.perf_counter() - self._started
+            self._context.copy().run(tracer.add, first_image_request_s=self.first_image_request_s)
+            print(f"⚡ First image requested {self.first_image_request_s:.2f}s into the story stream")
+        self._images[index] = self._image_pool.submit(self._context.copy().run, self._image, prompt, index)
+
+    def _submit_narration(self, index, text):
+        if self._narration_pool is None or index in self._narrations:
+            return
+        if index == 0:
+            if self._title is None:
+                # The title may still arrive; scene 1 is narrated once the story is complete
+                return
+            text = f"{self._title}. {text}" if self._title else text
+        self._narrations[index] = self._narration_pool.submit(self._context.copy().run, self.narration_job, text, index)
+
+    def consume(self, chunks):
+        """Feeds the streamed chunks through the parser and returns the complete story."""
+        self._started = time.perf_counter()
+        parser = StoryStreamParser()
+        try:
+            for chunk in chunks:
+                for event in parser.feed(chunk or ""):
+                    if event[0] == "title":
+                        self._title = event[1]
+                        if 0 in self._texts:
+                            self._submit_narration(0, self._texts[0])
+                    elif event[0] == "image_prompt":
+                        self._submit_image(event[1], event[2])
+                    elif event[0] == "text":
+                        self._texts[event[1]] = event[2]
+                        self._submit_narration(event[1], event[2])
+        finally:
+            # Ends the provider request (and its span) even if dispatching failed
+            if hasattr(chunks, "close"):
+                chunks.close()
+        story_data = parser.result()
+        self.story_s = time.perf_counter() - self._started
+        if not story_data or 'scenes' not in story_data:
+            raise ValueError("Failed to generate valid story data.")
+
+        # Anything the incremental pass could not dispatch (e.g. a story without a title)
+        self._title = self._title if self._title is not None else story_data.get('title', '')
+        for i, scene in enumerate(story_data['scenes']):
+            if scene.get('image_prompt'):
+                self._submit_image(i, scene['image_prompt'])
+            if scene.get('text'):
+                self._submit_narration(i, scene['text'])
+        return story_data
+
+    @staticmethod
+    def _collect(futures, count):
+        results = [None] * count
+        failures = {}
+        for i in range(count):
+            if i not in futures:
+                failures[i] = "Scene was incomplete in the story"
+                continue
+            try:
+                results[i] = futures[i].result()
+            except Exception as e:
+                failures[i] = str(e)
+        return results, failures
+
+    def image_results(self, count):
+        """Waits for every image; (paths, failures) like run_scenes_concurrently."""
+        return self._collect(self._images, count)
+
+    def narration_results(self, count):
+        """Waits for every scene narration; (clip_paths, failures) like run_scenes_concurrently."""
+        return self._collect(self._narrations, count)
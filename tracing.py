@@ -0,0 +1,209 @@
+import os
+import re
+import glob
+import json
+import atexit
+import time
+import uuid
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Where traces (JSON lines) and the Prometheus text metrics file are written
+TRACE_DIR = os.getenv("TRACE_DIR", "traces")
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "1") == "1"
+
+# Histogram buckets for span durations, in seconds
+DURATION_BUCKETS = (0.1, 0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300, 600)
+
+# Attributes that accumulate when recorded more than once on a span, and their counters
+_ADDITIVE = {
+    "bytes_in": "pipeline_bytes_in_total",
+    "bytes_out": "pipeline_bytes_out_total",
+    "retries": "pipeline_retries_total",
+    "hedges": "pipeline_hedges_total",
+    "rate_limit_wait_s": "pipeline_rate_limit_wait_seconds_total",
+    "ffmpeg_cpu_s": "pipeline_ffmpeg_cpu_seconds_total",
+}
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+class Span:
+    """One timed unit of work: a job, a pipeline stage, a provider call or an ffmpeg run."""
+    def __init__(self, name, parent=None, job_id=None, **attrs):
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.job_id = job_id or (parent.job_id if parent else None)
+        self.attrs = attrs
+        self.status = "ok"
+        self.error = None
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self.duration = None
+
+    def add(self, **attrs):
+        """Records attributes; byte counts, retries, hedges and ffmpeg CPU time accumulate."""
+        for key, value in attrs.items():
+            if key in _ADDITIVE and value is not None:
+                self.attrs[key] = self.attrs.get(key, 0) + value
+            else:
+                self.attrs[key] = value
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "job_id": self.job_id,
+            "start": self.start,
+            "duration_s": self.duration,
+            "status": self.status,
+            "error": self.error,
+            **self.attrs,
+        }
+
+class Tracer:
+    """
+    Collects spans per job and per stage, appends each finished span to a
+    JSON-lines trace file and keeps aggregates for a Prometheus text export.
+    """
+    def __init__(self, trace_dir=TRACE_DIR, enabled=TRACING_ENABLED):
+        self.trace_dir = trace_dir
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._metrics_started = False
+
+    @property
+    def trace_path(self):
+        return os.path.join(self.trace_dir, "traces.jsonl")
+
+    @property
+    def metrics_path(self):
+        # One file per process: render workers each export their own metrics,
+        # told apart by the pid label on every series
+        return os.path.join(self.trace_dir, f"metrics-{os.getpid()}.prom")
+
+    def _remove_metrics(self):
+        try:
+            os.remove(self.metrics_path)
+        except OSError:
+            pass
+
+    def _sweep_metrics(self):
+        """Deletes metrics files left by processes that are gone (e.g. killed workers)."""
+        if os.name != "posix":
+            # os.kill(pid, 0) would terminate the process elsewhere
+            return
+        for path in glob.glob(os.path.join(self.trace_dir, "metrics-*.prom")):
+            match = re.search(r"metrics-(\d+)\.prom$", path)
+            if not match:
+                continue
+            try:
+                os.kill(int(match.group(1)), 0)
+            except ProcessLookupError:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            except OSError:
+                # Alive, but owned by someone else
+                pass
+
+    @contextmanager
+    def span(self, name, job_id=None, **attrs):
+        """Opens a child of the current span; the span is current inside the with block."""
+        current = Span(name, parent=_current_span.get(), job_id=job_id, **attrs)
+        token = _current_span.set(current)
+        try:
+            yield current
+        except Exception as e:
+            current.status = "error"
+            current.error = str(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            current.duration = time.perf_counter() - current._started
+            self._finish(current)
+
+    def current(self):
+        return _current_span.get()
+
+    def add(self, **attrs):
+        """Records attributes on the current span, if there is one."""
+        current = _current_span.get()
+        if current is not None:
+            current.add(**attrs)
+
+    def _count(self, name, labels, value=1):
+        key = (name, tuple(sorted(labels.items())))
+        self._counters[key] = self._counters.get(key, 0) + value
+
+    def _finish(self, span):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.setdefault(span.name, {"buckets": [0] * len(DURATION_BUCKETS), "sum": 0.0, "count": 0})
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if span.duration <= bound:
+                    histogram["buckets"][i] += 1
+            histogram["sum"] += span.duration
+            histogram["count"] += 1
+            labels = {"span": span.name}
+            if span.attrs.get("provider"):
+                labels["provider"] = span.attrs["provider"]
+            for attr, metric in _ADDITIVE.items():
+                if span.attrs.get(attr):
+                    self._count(metric, labels, span.attrs[attr])
+            if span.status == "error":
+                self._count("pipeline_span_errors_total", labels)
+
+            os.makedirs(self.trace_dir, exist_ok=True)
+            with open(self.trace_path, "a") as f:
+                f.write(json.dumps(span.to_dict(), default=str) + "\n")
+            if span.parent_id is None:
+                self._write_metrics()
+
+    def _write_metrics(self):
+        """Rewrites the Prometheus text file atomically. Caller holds the lock."""
+        if not self._metrics_started:
+            # The textfile collector would keep exporting a dead worker's file forever
+            self._sweep_metrics()
+            atexit.register(self._remove_metrics)
+            self._metrics_started = True
+        pid = f'pid="{os.getpid()}"'
+        lines = [
+            "# HELP pipeline_span_duration_seconds Wall time of pipeline spans.",
+            "# TYPE pipeline_span_duration_seconds histogram",
+        ]
+        for name, histogram in sorted(self._histograms.items()):
+            for bound, count in zip(DURATION_BUCKETS, histogram["buckets"]):
+                lines.append(f'pipeline_span_duration_seconds_bucket{{span="{name}",{pid},le="{bound}"}} {count}')
+            lines.append(f'pipeline_span_duration_seconds_bucket{{span="{name}",{pid},le="+Inf"}} {histogram["count"]}')
+            lines.append(f'pipeline_span_duration_seconds_sum{{span="{name}",{pid}}} {histogram["sum"]:.6f}')
+            lines.append(f'pipeline_span_duration_seconds_count{{span="{name}",{pid}}} {histogram["count"]}')
+        declared = set()
+        for (metric, labels), value in sorted(self._counters.items()):
+            if metric not in declared:
+                lines.append(f"# TYPE {metric} counter")
+                declared.add(metric)
+            label_text = ",".join([f'{key}="{val}"' for key, val in labels] + [pid])
+            lines.append(f"{metric}{{{label_text}}} {value}")
+
+        tmp_path = self.metrics_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.metrics_path)
+
+    def wrap(self, func):
+        """
+        Binds func to a copy of the caller's trace context so spans opened in a
+        worker thread nest under the submitting span. Wrap once per submission.
+        """
+        context = contextvars.copy_context()
+        return lambda *args, **kwargs: context.run(func, *args, **kwargs)
+
+# Process-wide tracer
+tracer = Tracer()
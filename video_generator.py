@@ -1,22 +1,45 @@
 import os
-import requests
 import glob
-import random
 import json
 import ffmpeg
 from ffmpeg._run import Error as FFmpegError
 import wave
-from google import genai
-from google.genai import types
-from io import BytesIO
-from PIL import Image
 import re
+import time
+import hashlib
+import shutil
+import tempfile
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from asset_cache import asset_cache, asset_key
+from workspace import JobProgress, JobWorkspace
+from tracing import tracer
+from provider_clients import genai_types, get_gemini_client
+from call_policy import call_with_policy
+from rate_limiter import estimate_tokens, limited
+from image_ingest import INGEST_SIZE, ingest_image
+from music_library import music_library, track_volume
+from story_stream import SceneDispatcher
 
 # Define directories
 IMAGE_DIR = "output_images"
 VIDEO_DIR = "output_videos"
 MUSIC_DIR = "music"
 
+# Provider models
+IMAGE_MODEL = "gemini-2.0-flash-preview-image-generation"
+TTS_MODEL = "gemini-2.5-flash-preview-tts"
+
+# Maximum number of image requests in flight at once
+IMAGE_MAX_WORKERS = int(os.getenv("IMAGE_MAX_WORKERS", "4"))
+# Maximum number of per-scene TTS requests in flight at once
+TTS_MAX_WORKERS = int(os.getenv("TTS_MAX_WORKERS", "4"))
+# Narrate every scene separately and time images to their own narration
+PER_SCENE_NARRATION = os.getenv("PER_SCENE_NARRATION", "0") == "1"
+# Stream the story and start each scene's image (and narration) as soon as its part of the JSON arrives
+STREAM_STORY = os.getenv("STREAM_STORY", "1") == "1"
+
 # ========================
 # 1. SETUP & CONFIGURATION
 # ========================
@@ -24,8 +47,9 @@ MUSIC_DIR = "music"
 def initialize_clients(google_api_key, elevenlabs_api_key=None):
     """Initializes all API clients and creates necessary directories."""
     try:
-        # Create Gemini client for story generation, image generation, and TTS
-        gemini_client = genai.Client(api_key=google_api_key)
+        # Shared Gemini client for story generation, image generation, and TTS;
+        # reused by every job in this process so connections stay warm
+        gemini_client = get_gemini_client(google_api_key)
         
         # Ensure output directories exist
         os.makedirs(IMAGE_DIR, exist_ok=True)
@@ -40,25 +64,32 @@ def initialize_clients(google_api_key, elevenlabs_api_key=None):
 # 2. CORE GENERATION FUNCTIONS
 # ========================
 
-def generate_story_with_prompts(user_prompt, gemini_client):
-    """Generates a story with scenes and image prompts using Gemini."""
-    print("✍️  Generating story and image prompts...")
-    system_prompt = """
-    You are a creative content generator. Based on the user's prompt, generate a JSON object with a 'title' and a list of 5 'scenes'.
+STORY_MODEL = "gemini-2.0-flash-exp"
+STORY_SYSTEM_PROMPT = """
+    You are a creative content generator. Based on the user's prompt, generate a JSON object with a 'title' and a list of {scene_count} 'scenes'.
     Each scene object must contain two keys:
     1. 'text': A paragraph of the story (about 30-50 words).
     2. 'image_prompt': A descriptive, visually rich prompt for image generation. Focus on art style (e.g., cinematic, digital art, photorealistic), lighting, and mood.
     
     Return only valid JSON format.
     """
+
+def generate_story_with_prompts(user_prompt, gemini_client, scene_count=5):
+    """Generates a story with scene_count scenes and image prompts using Gemini."""
+    print("✍️  Generating story and image prompts...")
     try:
-        response = gemini_client.models.generate_content(
-            model="gemini-2.0-flash-exp",
-            contents=[f"{system_prompt}\n\nUser prompt: {user_prompt}"],
-            config=types.GenerateContentConfig(
-                response_mime_type="application/json"
+        contents = f"{STORY_SYSTEM_PROMPT.format(scene_count=scene_count)}\n\nUser prompt: {user_prompt}"
+        types = genai_types()
+        with tracer.span("provider.story", provider="gemini", model=STORY_MODEL) as span, \
+                limited("gemini", STORY_MODEL, estimate_tokens(contents)):
+            response = gemini_client.models.generate_content(
+                model=STORY_MODEL,
+                contents=[contents],
+                config=types.GenerateContentConfig(
+                    response_mime_type="application/json"
+                )
             )
-        )
+            span.add(bytes_in=len(contents.encode()), bytes_out=len((response.text or "").encode()))
         story_data = json.loads(response.text)
         print("✅ Story generated successfully.")
         return story_data
@@ -66,40 +97,130 @@ def generate_story_with_prompts(user_prompt, gemini_client):
         print(f"❌ Error generating story: {e}")
         raise
 
-def generate_image_with_gemini(prompt, index, gemini_client):
+def stream_story_with_prompts(user_prompt, gemini_client, scene_count=5):
+    """Like generate_story_with_prompts, but yields the story JSON text chunk by chunk as Gemini writes it."""
+    print("✍️  Streaming story and image prompts...")
+    contents = f"{STORY_SYSTEM_PROMPT.format(scene_count=scene_count)}\n\nUser prompt: {user_prompt}"
+    types = genai_types()
+    with tracer.span("provider.story", provider="gemini", model=STORY_MODEL, stream=True) as span, \
+            limited("gemini", STORY_MODEL, estimate_tokens(contents)):
+        span.add(bytes_in=len(contents.encode()))
+        for chunk in gemini_client.models.generate_content_stream(
+            model=STORY_MODEL,
+            contents=[contents],
+            config=types.GenerateContentConfig(
+                response_mime_type="application/json"
+            )
+        ):
+            text = chunk.text or ""
+            span.add(bytes_out=len(text.encode()))
+            yield text
+
+def generate_image_with_gemini(prompt, index, gemini_client, raise_errors=False, workspace=None):
     """
-    Generates an image using Gemini and saves it.
+    Generates an image using Gemini and saves it (into the job's workspace if given).
+    Returns None on failure unless raise_errors is set.
     """
     print(f"🎨 Generating image for scene {index+1} with Gemini...")
     try:
+        if workspace is not None:
+            image_path = workspace.image_path(index)
+        else:
+            # Make sure output directory exists
+            os.makedirs(IMAGE_DIR, exist_ok=True)
+            image_path = os.path.join(IMAGE_DIR, f"scene_{index+1}.png")
+
+        # Identical prompts are served from the asset cache; the ingest size is part
+        # of the key because main.py caches the same prompts at native resolution
+        cache_key = asset_key("gemini", IMAGE_MODEL, prompt, f"ingest{INGEST_SIZE}")
+        if asset_cache.copy_to(cache_key, ".png", image_path):
+            print(f"♻️ Image for scene {index+1} served from cache: {image_path}")
+            return image_path
+
         # Generate content (image + optional text)
-        response = gemini_client.models.generate_content(
-            model="gemini-2.0-flash-preview-image-generation",
-            contents=prompt,
-            config=types.GenerateContentConfig(
-                response_modalities=['TEXT', 'IMAGE']
+        types = genai_types()
+
+        def request_image():
+            response = gemini_client.models.generate_content(
+                model=IMAGE_MODEL,
+                contents=prompt,
+                config=types.GenerateContentConfig(
+                    response_modalities=['TEXT', 'IMAGE']
+                )
             )
-        )
+            # Loop through candidates for the image; an empty answer is retried
+            for part in response.candidates[0].content.parts:
+                if part.inline_data is not None:
+                    return part.inline_data.data
+            raise ValueError(f"No image data returned for scene {index+1}")
 
-        # Make sure output directory exists
-        os.makedirs(IMAGE_DIR, exist_ok=True)
-        image_path = os.path.join(IMAGE_DIR, f"scene_{index+1}.png")
-
-        # Loop through candidates and save images
-        for part in response.candidates[0].content.parts:
-            if part.inline_data is not None:
-                image = Image.open(BytesIO(part.inline_data.data))
-                image.save(image_path)
-                print(f"✅ Image saved at: {image_path}")
-                return image_path
-        
-        print(f"⚠️ No image data returned for scene {index+1}")
-        return None
+        # Adaptive timeout, retries and hedging against the slow tail
+        with tracer.span("provider.image", provider="gemini", model=IMAGE_MODEL, scene=index+1) as span:
+            image_data = call_with_policy(("gemini", IMAGE_MODEL), request_image)
+            span.add(bytes_in=len(prompt.encode()), bytes_out=len(image_data))
+
+        # Stored at the video's frame size so ffmpeg does not rescale every frame
+        ingest_image(image_data, image_path, size=INGEST_SIZE)
+        asset_cache.put_file(cache_key, image_path, ".png")
+        print(f"✅ Image saved at: {image_path}")
+        return image_path
 
     except Exception as e:
         print(f"❌ Error generating image for scene {index+1}: {e}")
+        if raise_errors:
+            raise
         return None
 
+def iter_scenes_concurrently(func, items, max_workers=IMAGE_MAX_WORKERS):
+    """
+    Calls func(item, index) for every item on a bounded thread pool and yields
+    (index, result, error) as each call finishes, fastest first. error is None on success.
+    """
+    if not items:
+        return
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items)))) as pool:
+        futures = {pool.submit(tracer.wrap(func), item, i): i for i, item in enumerate(items)}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result(), None
+            except Exception as e:
+                yield futures[future], None, e
+
+def run_scenes_concurrently(func, items, max_workers=IMAGE_MAX_WORKERS, on_result=None):
+    """
+    Calls func(item, index) for every item on a bounded thread pool.
+    Returns (results, failures): results keeps the input order with None for
+    failed items, failures maps the scene index to its error message.
+    on_result(index, result) is called for each success as soon as it arrives.
+    """
+    results = [None] * len(items)
+    failures = {}
+    for i, result, error in iter_scenes_concurrently(func, items, max_workers):
+        if error is not None:
+            failures[i] = str(error)
+            continue
+        results[i] = result
+        if on_result is not None:
+            on_result(i, result)
+    return results, failures
+
+def generate_images_concurrently(scenes, gemini_client, max_workers=IMAGE_MAX_WORKERS, workspace=None, on_image=None):
+    """
+    Generates the image for every scene in parallel, at most max_workers at a time.
+    Returns (image_paths, failures) with image_paths in scene order (None for failed scenes).
+    on_image(index, path) is called as each image lands, e.g. to show it right away.
+    """
+    print(f"🎨 Generating {len(scenes)} images with up to {max_workers} in flight...")
+    image_paths, failures = run_scenes_concurrently(
+        lambda scene, i: generate_image_with_gemini(scene['image_prompt'], i, gemini_client, raise_errors=True, workspace=workspace),
+        scenes,
+        max_workers,
+        on_result=on_image
+    )
+    if failures:
+        print(f"⚠️ {len(failures)} of {len(scenes)} images failed: {sorted(i+1 for i in failures)}")
+    return image_paths, failures
+
 def clean_story(text):
     """Clean story text for better TTS output"""
     # Remove extra whitespace and normalize text
@@ -116,9 +237,11 @@ def wave_file(filename, pcm, channels=1, rate=24000, sample_width=2):
         wf.setframerate(rate)
         wf.writeframes(pcm)
 
-def generate_narration_elevenlabs(story_text, filename, elevenlabs_client=None, voice_id="Kore"):
+def generate_narration_elevenlabs(story_text, filename, elevenlabs_client=None, voice_id="Kore", workspace=None, gemini_client=None):
     """
-    Generates narration audio using Gemini TTS and saves it as a WAV file.
+    Generates narration audio using Gemini TTS and saves it as a WAV file
+    (in the job's temp directory when a workspace is given).
+    Uses gemini_client when passed, otherwise the shared client for the environment's API key.
     Note: Despite the function name, this now uses Gemini TTS for consistency.
     """
     print("🎧 Generating narration with Gemini TTS...")
@@ -127,132 +250,353 @@ def generate_narration_elevenlabs(story_text, filename, elevenlabs_client=None,
     story_text = clean_story(story_text)
     
     try:
-        # Use Gemini client for TTS generation
-        client = genai.Client()
-        
-        response = client.models.generate_content(
-            model="gemini-2.5-flash-preview-tts",
-            contents=f"Say calmly and with emotion: {story_text}",
-            config=types.GenerateContentConfig(
-                response_modalities=["AUDIO"],
-                speech_config=types.SpeechConfig(
-                    voice_config=types.VoiceConfig(
-                        prebuilt_voice_config=types.PrebuiltVoiceConfig(
-                            voice_name=voice_id,
-                        )
-                    )
-                ),
-            )
-        )
-        
-        # Fix: Handle the response structure properly
-        audio_data = None
-        
-        # Check if response has candidates and iterate through parts
-        if response.candidates and len(response.candidates) > 0:
-            candidate = response.candidates[0]
-            if hasattr(candidate, 'content') and hasattr(candidate.content, 'parts'):
-                for part in candidate.content.parts:
-                    if hasattr(part, 'inline_data') and part.inline_data is not None:
-                        audio_data = part.inline_data.data
-                        break
-        
-        if audio_data is None:
-            raise ValueError("No audio data found in response")
-        
-        # Save to file using wave module
         os.makedirs(VIDEO_DIR, exist_ok=True)
         # Change extension to .wav since Gemini outputs WAV format
         if filename.endswith('.mp3'):
             filename = filename.replace('.mp3', '.wav')
-        audio_path = os.path.join(VIDEO_DIR, filename)
+        audio_path = workspace.tmp_path(filename) if workspace is not None else os.path.join(VIDEO_DIR, filename)
+
+        # Same text and voice were narrated before: reuse the cached audio
+        cache_key = asset_key("gemini", TTS_MODEL, story_text, voice_id)
+        if asset_cache.copy_to(cache_key, ".wav", audio_path):
+            print(f"♻️ Narration served from cache: {audio_path}")
+            return audio_path
+
+        # Use the shared Gemini client for TTS generation
+        client = gemini_client or get_gemini_client()
+        
+        types = genai_types()
+
+        def request_audio():
+            response = client.models.generate_content(
+                model=TTS_MODEL,
+                contents=f"Say calmly and with emotion: {story_text}",
+                config=types.GenerateContentConfig(
+                    response_modalities=["AUDIO"],
+                    speech_config=types.SpeechConfig(
+                        voice_config=types.VoiceConfig(
+                            prebuilt_voice_config=types.PrebuiltVoiceConfig(
+                                voice_name=voice_id,
+                            )
+                        )
+                    ),
+                )
+            )
+            # Check if response has candidates and iterate through parts
+            if response.candidates and len(response.candidates) > 0:
+                candidate = response.candidates[0]
+                if hasattr(candidate, 'content') and hasattr(candidate.content, 'parts'):
+                    for part in candidate.content.parts:
+                        if hasattr(part, 'inline_data') and part.inline_data is not None:
+                            return part.inline_data.data
+            raise ValueError("No audio data found in response")
+
+        with tracer.span("provider.tts", provider="gemini", model=TTS_MODEL, voice=voice_id) as span:
+            audio_data = call_with_policy(("gemini", TTS_MODEL), request_audio, tokens=estimate_tokens(story_text))
+            span.add(bytes_in=len(story_text.encode()), bytes_out=len(audio_data))
         
         # Use the wave_file helper function to save
         wave_file(audio_path, audio_data)
+        asset_cache.put_file(cache_key, audio_path, ".wav")
         
         print(f"✅ Narration saved as WAV: {audio_path}")
         return audio_path
 
     except Exception as e:
         print(f"❌ Gemini TTS Error: {str(e)}")
-        print(f"Response structure debug: {type(response)}")
-        if hasattr(response, 'candidates'):
-            print(f"Candidates: {len(response.candidates) if response.candidates else 0}")
-            if response.candidates and len(response.candidates) > 0:
-                candidate = response.candidates[0]
-                print(f"Candidate content: {hasattr(candidate, 'content')}")
-                if hasattr(candidate, 'content'):
-                    print(f"Content parts: {hasattr(candidate.content, 'parts')}")
-                    if hasattr(candidate.content, 'parts'):
-                        print(f"Parts type: {type(candidate.content.parts)}")
-                        print(f"Parts length: {len(candidate.content.parts) if candidate.content.parts else 0}")
         raise
 
+def generate_scene_narrations(story_data, voice_id="Kore", workspace=None, max_workers=TTS_MAX_WORKERS, gemini_client=None):
+    """
+    Narrates every scene with its own TTS call, in parallel, and joins the clips
+    into one narration WAV. The title is read as part of the first scene.
+    Returns (narration_path, durations) with one exact duration per scene, or
+    None for a scene whose narration failed.
+    """
+    scenes = story_data['scenes']
+    texts = [scene['text'] for scene in scenes]
+    if texts and story_data.get('title'):
+        texts[0] = f"{story_data['title']}. {texts[0]}"
+
+    print(f"🎧 Narrating {len(texts)} scenes separately with up to {max_workers} in flight...")
+    clip_paths, failures = run_scenes_concurrently(
+        lambda text, i: generate_narration_elevenlabs(text, f"narration_scene_{i+1}.wav", voice_id=voice_id,
+                                                      workspace=workspace, gemini_client=gemini_client),
+        texts,
+        max_workers
+    )
+    return join_scene_narrations(clip_paths, failures, workspace)
+
+def join_scene_narrations(clip_paths, failures, workspace=None):
+    """Joins per-scene narration WAVs into one narration WAV. Returns (narration_path, durations)."""
+    if not any(clip_paths):
+        raise ValueError("Narration failed for every scene.")
+
+    narration_name = "narration.wav"
+    narration_path = workspace.tmp_path(narration_name) if workspace is not None else os.path.join(VIDEO_DIR, narration_name)
+    durations = []
+    with wave.open(narration_path, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(24000)
+        for i, clip_path in enumerate(clip_paths):
+            if clip_path is None:
+                print(f"⚠️ Scene {i+1} has no narration: {failures[i]}")
+                durations.append(None)
+                continue
+            with wave.open(clip_path, "rb") as clip:
+                frames = clip.readframes(clip.getnframes())
+                durations.append(clip.getnframes() / clip.getframerate())
+            out.writeframes(frames)
+
+    print(f"✅ Scene narration joined: {narration_path} ({sum(d for d in durations if d):.1f}s)")
+    return narration_path, durations
+
+def audio_duration(path):
+    """
+    Length of an audio file in seconds. WAVs are measured from their PCM length
+    in the header, without spawning ffprobe; anything else is probed.
+    """
+    if path.lower().endswith(".wav"):
+        with wave.open(path, "rb") as wav:
+            return wav.getnframes() / wav.getframerate()
+    return float(ffmpeg.probe(path)['format']['duration'])
+
+def align_scene_durations(image_paths, durations):
+    """
+    Pairs scene images with their narration durations. A scene without an image
+    hands its time to the previous image (or the next one for the first scene),
+    and a scene without narration gets no screen time.
+    Returns (image_paths, durations) containing only scenes that have an image.
+    """
+    aligned_paths, aligned_durations = [], []
+    carry = 0.0
+    for path, duration in zip(image_paths, durations):
+        duration = duration or 0.0
+        if path is None:
+            if aligned_durations:
+                aligned_durations[-1] += duration
+            else:
+                carry += duration
+            continue
+        aligned_paths.append(path)
+        aligned_durations.append(duration + carry)
+        carry = 0.0
+    # Drop images that ended up with no screen time at all
+    kept = [(p, d) for p, d in zip(aligned_paths, aligned_durations) if d > 0]
+    return [p for p, _ in kept], [d for _, d in kept]
+
 # ========================
 # 3. VIDEO COMPOSITION
 # ========================
 
-def images_to_video_ffmpeg(narration_audio_path, video_title="final_video"):
-    """Creates a memory-optimized video from images, narration, and music using FFmpeg."""
-    print("🎬 Assembling the video with memory optimization...")
+# Memory-optimized H.264 settings shared by every encoding mode
+VIDEO_ENCODE_ARGS = dict(
+    vcodec='libx264',
+    pix_fmt='yuv420p',
+    preset='ultrafast',  # Fast encoding
+    crf=30,              # Higher compression
+    maxrate='600k',      # Lower bitrate
+    bufsize='1200k',     # Smaller buffer
+)
+AUDIO_ENCODE_ARGS = dict(
+    acodec='aac',
+    ac=1,                # Mono audio
+    ar=22050,            # Lower sample rate
+)
+ENCODE_MODES = ("graph", "segments", "still")
+ENCODE_MODE = os.getenv("ENCODE_MODE", "graph")
+# Parallel ffmpeg processes used by the "segments" encode mode
+ENCODE_WORKERS = int(os.getenv("ENCODE_WORKERS", str(os.cpu_count() or 2)))
+
+def _still_clip(image_path, duration):
+    """One scene's still, looped for its duration at the output size and frame rate."""
+    return (
+        ffmpeg.input(image_path, loop=1, t=duration)
+        .filter('scale', 640, 640)  # Smaller resolution; a pass-through for ingested images
+        .filter('fps', fps=20)      # Lower FPS
+    )
+
+# Background music level under the narration
+MUSIC_VOLUME = 0.15
+# "numpy" mixes in-process (with ducking) and hands ffmpeg finished PCM; "ffmpeg" uses amix
+AUDIO_MIXER = os.getenv("AUDIO_MIXER", "numpy")
+# How the numpy mix reaches ffmpeg: "pipe" streams raw PCM over stdin, "files" writes a WAV first
+AUDIO_HANDOFF = os.getenv("AUDIO_HANDOFF", "pipe")
+
+def pcm_input(rate, channels=1):
+    """ffmpeg input reading raw s16le PCM from stdin; feed the bytes through run_ffmpeg(input=...)."""
+    return ffmpeg.input('pipe:', format='s16le', ar=rate, ac=channels)
+
+def _mixed_audio(narration_audio_path, music_track, mix_path=None):
+    """
+    Narration mixed with quiet background music from the music library, or
+    narration alone. The track is pre-decoded PCM and only loops if it is shorter than the video.
+    With the numpy mixer ffmpeg only encodes the finished mix, which it reads from
+    stdin (AUDIO_HANDOFF "pipe") or from mix_path. Returns (stream, stdin_bytes or None).
+    """
+    narration_audio = ffmpeg.input(narration_audio_path)
+    if not music_track:
+        return narration_audio, None
+    volume = track_volume(music_track, MUSIC_VOLUME)
+    if AUDIO_MIXER == "numpy" and AUDIO_HANDOFF == "pipe":
+        from audio_mixer import mix_to_pcm
+        from music_library import MIX_SAMPLE_RATE
+        with tracer.span("audio.mix", mixer="numpy", handoff="pipe"):
+            pcm, _ = mix_to_pcm(narration_audio_path, music_track["path"], volume)
+        return pcm_input(MIX_SAMPLE_RATE), pcm
+    if AUDIO_MIXER == "numpy" and mix_path:
+        from audio_mixer import mix_to_wav
+        with tracer.span("audio.mix", mixer="numpy", handoff="files"):
+            mix_to_wav(narration_audio_path, music_track["path"], mix_path, volume)
+        return ffmpeg.input(mix_path), None
+    music_audio = ffmpeg.input(music_track["path"], stream_loop=-1).filter('volume', volume)
+    return ffmpeg.filter([narration_audio, music_audio], 'amix', duration='first'), None
+
+def encode_scene_segment(image_path, duration, segment_path):
+    """Encodes a single scene's still into its own H.264 segment file."""
+    with tracer.span("ffmpeg.segment") as span:
+        run_ffmpeg(
+            _still_clip(image_path, duration)
+            .output(segment_path, **VIDEO_ENCODE_ARGS)
+        )
+        span.add(bytes_in=os.path.getsize(image_path), bytes_out=os.path.getsize(segment_path))
+    return segment_path
+
+def encode_segments_parallel(image_paths, durations, segment_dir, max_workers=ENCODE_WORKERS):
+    """
+    Encodes every scene into its own segment, one ffmpeg process per scene and
+    up to max_workers at once. Returns the segment paths in scene order.
+    """
+    os.makedirs(segment_dir, exist_ok=True)
+    segment_paths = [os.path.join(segment_dir, f"segment_{i+1:04d}.mp4") for i in range(len(image_paths))]
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(image_paths)))) as pool:
+        futures = [pool.submit(tracer.wrap(encode_scene_segment), *job) for job in zip(image_paths, durations, segment_paths)]
+        for future in futures:
+            future.result()
+    return segment_paths
+
+def concat_segments(segment_paths, list_path, durations=None):
+    """
+    Writes a concat-demuxer list for the segments and returns it as an ffmpeg input (stream copy).
+    durations pins each segment's length so timestamps cannot drift over many segments.
+    """
+    with open(list_path, 'w') as f:
+        for i, path in enumerate(segment_paths):
+            f.write(f"file '{os.path.abspath(path)}'\n")
+            if durations is not None:
+                f.write(f"duration {durations[i]:.6f}\n")
+    return ffmpeg.input(list_path, format='concat', safe=0)
+
+def still_slideshow(image_paths, durations, list_path, size=640):
+    """
+    Variable-frame-rate slideshow input: each distinct image is decoded, scaled
+    and encoded exactly once and its frame is held for the scene's duration.
+    """
+    with open(list_path, 'w') as f:
+        for path, duration in zip(image_paths, durations):
+            f.write(f"file '{os.path.abspath(path)}'\n")
+            f.write(f"duration {duration:.3f}\n")
+        # The concat demuxer drops the last duration unless the final file is repeated
+        f.write(f"file '{os.path.abspath(image_paths[-1])}'\n")
+    return ffmpeg.input(list_path, format='concat', safe=0).filter('scale', size, size)
+
+# Low-res preview shown while the final encode runs
+PREVIEW_SIZE = int(os.getenv("PREVIEW_SIZE", "240"))
+
+def render_preview(narration_audio_path, image_paths, durations, output_path, list_path):
+    """
+    Quick low-resolution preview: one frame per scene at PREVIEW_SIZE, narration
+    only, lowest quality. Takes a fraction of the final encode's time.
+    """
+    if durations is None:
+        total_duration = audio_duration(narration_audio_path)
+        durations = [total_duration / len(image_paths)] * len(image_paths)
+    video_stream = still_slideshow(image_paths, durations, list_path, size=PREVIEW_SIZE)
+    run_ffmpeg(
+        ffmpeg
+        .output(video_stream, ffmpeg.input(narration_audio_path), output_path,
+                vcodec='libx264', pix_fmt='yuv420p', preset='ultrafast', crf=40, tune='stillimage', vsync='vfr',
+                acodec='aac', ac=1, ar=22050, audio_bitrate='48k')
+    )
+    os.remove(list_path)
+    return output_path
+
+def images_to_video_ffmpeg(narration_audio_path, video_title="final_video", image_paths=None, workspace=None,
+                           durations=None, encode_mode=ENCODE_MODE):
+    """
+    Creates a memory-optimized video from images, narration, and music using FFmpeg.
+    image_paths is the explicit, ordered list of scene images; without it the
+    shared IMAGE_DIR is globbed. With a workspace the video is written to the job's output directory.
+    durations gives each image its own screen time; otherwise the narration is split evenly.
+    encode_mode "graph" encodes everything in one ffmpeg graph; "segments" encodes
+    each scene in parallel, joins them with stream copy and muxes the audio last;
+    "still" encodes one frame per image and holds it (variable frame rate).
+    """
+    print(f"🎬 Assembling the video with memory optimization ({encode_mode} mode)...")
     try:
-        image_paths = sorted(glob.glob(os.path.join(IMAGE_DIR, "*.png")))
+        if encode_mode not in ENCODE_MODES:
+            raise ValueError(f"❌ Unknown encode mode '{encode_mode}', expected one of {ENCODE_MODES}.")
+        if image_paths is None:
+            image_paths = sorted(glob.glob(os.path.join(IMAGE_DIR, "*.png")))
         if not image_paths:
             raise ValueError("❌ No images found to create a video.")
 
-        # Get audio duration using ffmpeg.probe
-        probe = ffmpeg.probe(narration_audio_path)
-        total_duration = float(probe['format']['duration'])
-        duration_per_image = total_duration / len(image_paths)
+        if durations is None:
+            total_duration = audio_duration(narration_audio_path)
+            durations = [total_duration / len(image_paths)] * len(image_paths)
+        elif len(durations) != len(image_paths):
+            raise ValueError("❌ Need exactly one duration per image.")
 
-        music_files = glob.glob(os.path.join(MUSIC_DIR, "*.mp3"))
-        if not music_files:
+        # Prefer a track long enough to play through without looping
+        music_track = music_library.select(sum(durations))
+        if music_track is None:
             print("⚠️ No background music found in music/ directory. Using narration only.")
-            bg_music_path = None
-        else:
-            bg_music_path = random.choice(music_files)
-
-        final_output_path = os.path.join(VIDEO_DIR, f"{video_title.replace(' ', '_').lower()}.mp4")
-        
-        # Create slideshow with memory optimization
-        inputs = []
-        for img in image_paths:
-            inputs.append(
-                ffmpeg.input(img, loop=1, t=duration_per_image)
-                .filter('scale', 640, 640)  # Smaller resolution
-                .filter('fps', fps=20)      # Lower FPS
-            )
 
-        # Concatenate all image inputs with memory optimization
-        video_stream = ffmpeg.concat(*inputs, v=1, a=0)
+        video_name = f"{video_title.replace(' ', '_').lower()}.mp4"
+        final_output_path = workspace.output_path(video_name) if workspace is not None else os.path.join(VIDEO_DIR, video_name)
+        mix_path = workspace.tmp_path("mixed_audio.wav") if workspace is not None else os.path.join(VIDEO_DIR, f"{video_name}.mix.wav")
+        mixed_audio, audio_pipe = _mixed_audio(narration_audio_path, music_track, mix_path)
 
-        # Prepare audio inputs
-        narration_audio = ffmpeg.input(narration_audio_path)
-        
-        if bg_music_path:
-            music_audio = ffmpeg.input(bg_music_path, stream_loop=-1).filter('volume', 0.15)
-            # Mix audio tracks
-            mixed_audio = ffmpeg.filter([narration_audio, music_audio], 'amix', duration='first')
+        if encode_mode == "segments":
+            os.makedirs(VIDEO_DIR, exist_ok=True)
+            tmp_dir = workspace.tmp_dir if workspace is not None else tempfile.mkdtemp(dir=VIDEO_DIR)
+            segment_paths = encode_segments_parallel(image_paths, durations, os.path.join(tmp_dir, "segments"))
+            video_stream = concat_segments(segment_paths, os.path.join(tmp_dir, "segments.txt"))
+            # Video is already encoded; only the audio gets encoded here
+            run_ffmpeg(
+                ffmpeg
+                .output(video_stream, mixed_audio, final_output_path, vcodec='copy', **AUDIO_ENCODE_ARGS),
+                input=audio_pipe
+            )
+            shutil.rmtree(os.path.join(tmp_dir, "segments"), ignore_errors=True)
+            if workspace is None:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        elif encode_mode == "still":
+            list_path = workspace.tmp_path("stills.txt") if workspace is not None else os.path.join(VIDEO_DIR, "stills.txt")
+            os.makedirs(os.path.dirname(list_path), exist_ok=True)
+            video_stream = still_slideshow(image_paths, durations, list_path)
+            run_ffmpeg(
+                ffmpeg
+                .output(video_stream, mixed_audio, final_output_path, **VIDEO_ENCODE_ARGS, **AUDIO_ENCODE_ARGS,
+                        tune='stillimage', vsync='vfr'),
+                input=audio_pipe
+            )
+            os.remove(list_path)
         else:
-            mixed_audio = narration_audio
-        
-        # Combine video and mixed audio with memory constraints
-        (
-            ffmpeg
-            .output(video_stream, mixed_audio, final_output_path, 
-                   vcodec='libx264', 
-                   acodec='aac', 
-                   pix_fmt='yuv420p',
-                   preset='ultrafast',  # Fast encoding
-                   crf=30,             # Higher compression
-                   maxrate='600k',     # Lower bitrate
-                   bufsize='1200k',    # Smaller buffer
-                   ac=1,               # Mono audio
-                   ar=22050)           # Lower sample rate
-            .overwrite_output()
-            .run(quiet=True)
-        )
+            # Create slideshow with memory optimization and concatenate all image inputs
+            video_stream = ffmpeg.concat(*[_still_clip(img, d) for img, d in zip(image_paths, durations)], v=1, a=0)
+
+            # Combine video and mixed audio with memory constraints
+            run_ffmpeg(
+                ffmpeg
+                .output(video_stream, mixed_audio, final_output_path, **VIDEO_ENCODE_ARGS, **AUDIO_ENCODE_ARGS),
+                input=audio_pipe
+            )
         
+        if os.path.exists(mix_path):
+            os.remove(mix_path)
+        tracer.add(bytes_out=os.path.getsize(final_output_path), encode_mode=encode_mode)
         print(f"✅ Memory-optimized video saved: {final_output_path}")
         return final_output_path
 
@@ -264,13 +608,575 @@ def images_to_video_ffmpeg(narration_audio_path, video_title="final_video"):
     except Exception as ex:
         print(f"❌ General video creation error: {ex}")
         raise
+
 # ========================
 # 4. UTILITY FUNCTIONS
 # ========================
 
-def cleanup_images():
-    """Removes generated images from the output directory."""
+def _feed_stdin(pipe, data):
+    try:
+        pipe.write(data)
+    except BrokenPipeError:
+        # ffmpeg exited early; its exit status and stderr report why
+        pass
+    finally:
+        try:
+            pipe.close()
+        except BrokenPipeError:
+            pass
+
+def run_ffmpeg(stream, input=None):
+    """
+    Runs an ffmpeg-python output graph (overwriting outputs) like .run(quiet=True),
+    and records the ffmpeg process's CPU time on the current trace span where
+    the platform reports it (os.wait4).
+    input is written to ffmpeg's stdin (for a 'pipe:' input) while it runs.
+    """
+    args = stream.overwrite_output().compile()
+    process = subprocess.Popen(args, stdin=subprocess.PIPE if input is not None else subprocess.DEVNULL,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    feeder = None
+    if input is not None:
+        # Written from a thread so a full stderr pipe can never deadlock the two
+        feeder = threading.Thread(target=_feed_stdin, args=(process.stdin, input), daemon=True)
+        feeder.start()
+    with process.stderr:
+        stderr = process.stderr.read()
+    if feeder is not None:
+        feeder.join()
+    if hasattr(os, "wait4"):
+        # wait4 reaps the child and returns its resource usage in one call
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        tracer.add(ffmpeg_cpu_s=usage.ru_utime + usage.ru_stime)
+    else:
+        # No per-child resource usage here (e.g. Windows); ffmpeg_cpu_s is not recorded
+        process.wait()
+    if process.returncode != 0:
+        raise FFmpegError('ffmpeg', None, stderr)
+    return stderr
+
+def cleanup_images(workspace=None):
+    """Removes generated images, only those of the given job when a workspace is passed."""
+    if workspace is not None:
+        workspace.cleanup()
+        return
     files = glob.glob(os.path.join(IMAGE_DIR, "*.png"))
     for f in files:
         os.remove(f)
     print("🧹 Cleaned up generated images.")
+
+# ========================
+# 5. PIPELINE ENGINE
+# ========================
+
+class PipelineStage:
+    """
+    A unit of pipeline work. func is called with the named inputs as keyword
+    arguments and returns one value per declared output (a tuple if several).
+    """
+    def __init__(self, name, func, inputs=(), outputs=()):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+
+def _critical_path(stages, timings, producers):
+    """Walks back from the last stage to finish through the inputs that became ready last."""
+    if not timings:
+        return []
+    by_name = {stage.name: stage for stage in stages}
+    current = max(timings, key=lambda name: timings[name]['end'])
+    path = [current]
+    while True:
+        upstream = [producers[key] for key in by_name[current].inputs if key in producers]
+        if not upstream:
+            break
+        current = max(upstream, key=lambda name: timings[name]['end'])
+        path.append(current)
+    return list(reversed(path))
+
+def _run_stage(stage, kwargs):
+    with tracer.span(f"stage.{stage.name}"):
+        return stage.func(**kwargs)
+
+def _execute_stages(stages, values, max_workers, started):
+    """Schedules stages as their inputs appear in values; returns per-stage timings."""
+    pending = list(stages)
+    running = {}
+    timings = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers or max(1, len(stages))) as pool:
+        while pending or running:
+            for stage in [s for s in pending if all(key in values for key in s.inputs)]:
+                pending.remove(stage)
+                timings[stage.name] = {'start': time.perf_counter() - started}
+                kwargs = {key: values[key] for key in stage.inputs}
+                running[pool.submit(tracer.wrap(_run_stage), stage, kwargs)] = stage
+
+            if not running:
+                raise ValueError(f"Pipeline is stuck, unresolved stages: {[s.name for s in pending]}")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                timings[stage.name]['end'] = time.perf_counter() - started
+                timings[stage.name]['duration'] = timings[stage.name]['end'] - timings[stage.name]['start']
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"❌ Pipeline stage '{stage.name}' failed: {e}")
+                    for other in running:
+                        other.cancel()
+                    raise
+                if len(stage.outputs) == 1:
+                    result = (result,)
+                for key, value in zip(stage.outputs, result or ()):
+                    values[key] = value
+    return timings
+
+def run_pipeline(stages, initial=None, max_workers=None):
+    """
+    Runs the stages as a DAG: every stage starts as soon as all of its inputs
+    exist, so independent stages overlap. Returns (values, report) where values
+    holds every produced output and report has per-stage timings and the critical path.
+    The run is traced as one job span with a child span per stage.
+    """
+    values = dict(initial or {})
+    producers = {}
+    for stage in stages:
+        for key in stage.outputs:
+            if key in producers or key in values:
+                raise ValueError(f"Pipeline output '{key}' is produced more than once.")
+            producers[key] = stage.name
+    for stage in stages:
+        missing = [key for key in stage.inputs if key not in producers and key not in values]
+        if missing:
+            raise ValueError(f"Stage '{stage.name}' needs inputs nobody produces: {missing}")
+
+    started = time.perf_counter()
+    job_id = getattr(values.get("workspace"), "job_id", None)
+    with tracer.span("job", job_id=job_id):
+        timings = _execute_stages(stages, values, max_workers, started)
+
+    critical_path = _critical_path(stages, timings, producers)
+    report = {
+        'total_duration': time.perf_counter() - started,
+        'stages': timings,
+        'critical_path': critical_path,
+        'critical_path_duration': sum(timings[name]['duration'] for name in critical_path),
+    }
+    print("⏱️  Critical path: " + " → ".join(
+        f"{name} ({timings[name]['duration']:.1f}s)" for name in critical_path
+    ) + f" | total {report['total_duration']:.1f}s")
+    return values, report
+
+def build_narration_text(story_data):
+    """Joins the title and all scene texts into one narration script."""
+    return story_data.get('title', '') + ". " + " ".join([scene['text'] for scene in story_data['scenes']])
+
+def _scene_timeline(image_results, narration_results):
+    """Narration path plus the images to show and their durations (None to split the narration evenly)."""
+    narration_path, scene_durations = narration_results
+    if scene_durations is not None:
+        image_paths, durations = align_scene_durations(image_results[0], scene_durations)
+    else:
+        image_paths, durations = [path for path in image_results[0] if path], None
+    if not image_paths:
+        raise ValueError("Image generation failed for all scenes. Cannot create video.")
+    return narration_path, image_paths, durations
+
+def _compose_video_stage(story_data, image_results, narration_results, workspace, encode_mode=ENCODE_MODE):
+    narration_path, image_paths, durations = _scene_timeline(image_results, narration_results)
+    return images_to_video_ffmpeg(narration_path, story_data['title'], image_paths=image_paths,
+                                  workspace=workspace, durations=durations, encode_mode=encode_mode)
+
+def _incremental_video_stage(story_data, image_results, narration_results, gemini_client, workspace):
+    """
+    Composes through render_incremental, handing over the pipeline's images and
+    scene narrations, so the job's manifest and scene segments exist from the
+    first render and an edit later only regenerates what changed.
+    """
+    _, scene_durations = narration_results
+    clip_paths = [workspace.tmp_path(f"narration_scene_{i+1}.wav") if duration is not None else None
+                  for i, duration in enumerate(scene_durations)]
+    video_path, _ = render_incremental(story_data, workspace, gemini_client,
+                                       image_paths=image_results[0], narration_paths=clip_paths)
+    return video_path
+
+def _narration_stage(story_data, gemini_client, workspace, per_scene):
+    if per_scene:
+        return generate_scene_narrations(story_data, workspace=workspace, gemini_client=gemini_client)
+    narration_path = generate_narration_elevenlabs(build_narration_text(story_data), "narration.mp3",
+                                                   workspace=workspace, gemini_client=gemini_client)
+    return narration_path, None
+
+def _streaming_story_stage(user_prompt, gemini_client, workspace, per_scene, progress=None):
+    """
+    Story, images and narration as one stage: every scene's image request (and
+    with per_scene its narration) starts as soon as that part of the streamed
+    story JSON is complete, so image generation overlaps the rest of the story.
+    Returns (story_data, image_results, narration_results, first_image_request_s).
+    """
+    narration_job = None
+    if per_scene:
+        narration_job = lambda text, i: generate_narration_elevenlabs(text, f"narration_scene_{i+1}.wav", workspace=workspace,
+                                                                      gemini_client=gemini_client)
+    with SceneDispatcher(
+        lambda prompt, i: generate_image_with_gemini(prompt, i, gemini_client, raise_errors=True, workspace=workspace),
+        narration_job,
+        image_workers=IMAGE_MAX_WORKERS,
+        narration_workers=TTS_MAX_WORKERS,
+        on_image=progress.scene_image if progress is not None else None
+    ) as dispatcher:
+        story_data = dispatcher.consume(stream_story_with_prompts(user_prompt, gemini_client))
+        print(f"✅ Story streamed in {dispatcher.story_s:.1f}s.")
+        if progress is not None:
+            progress.update(story_data=story_data)
+        scene_count = len(story_data['scenes'])
+        if per_scene:
+            narration_results = join_scene_narrations(*dispatcher.narration_results(scene_count), workspace)
+        else:
+            # One narration for the whole story needs all of it; it overlaps the remaining images
+            narration_results = _narration_stage(story_data, gemini_client, workspace, per_scene=False)
+        if progress is not None:
+            progress.update(narration_results=narration_results)
+        image_results = dispatcher.image_results(scene_count)
+    if image_results[1]:
+        print(f"⚠️ {len(image_results[1])} of {scene_count} images failed: {sorted(i+1 for i in image_results[1])}")
+    return story_data, image_results, narration_results, dispatcher.first_image_request_s
+
+def _preview_stage(image_results, narration_results, workspace, progress):
+    """Publishes a low-res preview; a failed preview never fails the job."""
+    try:
+        narration_path, image_paths, durations = _scene_timeline(image_results, narration_results)
+        preview_path = render_preview(narration_path, image_paths, durations,
+                                      workspace.output_path("preview.mp4"), workspace.tmp_path("preview.txt"))
+    except Exception as e:
+        print(f"⚠️ Preview skipped: {e}")
+        return None
+    progress.update(preview_path=preview_path)
+    return preview_path
+
+def _published(func, progress, key):
+    """Wraps a stage so its result is also published to the job's progress under key."""
+    def stage(**inputs):
+        result = func(**inputs)
+        progress.update(**{key: result})
+        return result
+    return stage
+
+def build_video_pipeline(per_scene_narration=PER_SCENE_NARRATION, encode_mode=ENCODE_MODE, progress=None,
+                         stream_story=STREAM_STORY, incremental=False):
+    """
+    Stages for the Gemini pipeline. Images and narration both depend only on the
+    story, so they run side by side and composition starts once both are ready.
+    With per_scene_narration every scene is narrated separately and its image is
+    shown for exactly as long as its narration.
+    With a JobProgress the story, every finished image, the narration and a
+    low-res preview (rendered alongside the final encode) are published as they happen.
+    With stream_story the story, image and narration stages become one streaming
+    stage that also outputs 'first_image_request_s'.
+    With incremental the video is composed by render_incremental (narration is
+    then always per scene and encode_mode is ignored), leaving the manifest and
+    scene segments that later re-renders of the job reuse.
+    Expects 'user_prompt', 'gemini_client' and 'workspace' as initial values.
+    """
+    if incremental:
+        per_scene_narration = True
+    story = generate_story_with_prompts
+    narration = lambda story_data, gemini_client, workspace: _narration_stage(story_data, gemini_client, workspace, per_scene_narration)
+    on_image = None
+    if progress is not None:
+        story = _published(story, progress, "story_data")
+        narration = _published(narration, progress, "narration_results")
+        on_image = progress.scene_image
+
+    if stream_story:
+        stages = [
+            PipelineStage("story_stream", lambda **inputs: _streaming_story_stage(**inputs, per_scene=per_scene_narration, progress=progress),
+                          inputs=("user_prompt", "gemini_client", "workspace"),
+                          outputs=("story_data", "image_results", "narration_results", "first_image_request_s")),
+        ]
+    else:
+        stages = [
+            PipelineStage("story", story,
+                          inputs=("user_prompt", "gemini_client"), outputs=("story_data",)),
+            PipelineStage("images", lambda story_data, gemini_client, workspace: generate_images_concurrently(story_data['scenes'], gemini_client, workspace=workspace, on_image=on_image),
+                          inputs=("story_data", "gemini_client", "workspace"), outputs=("image_results",)),
+            PipelineStage("narration", narration,
+                          inputs=("story_data", "gemini_client", "workspace"), outputs=("narration_results",)),
+        ]
+    if incremental:
+        stages.append(PipelineStage("video", _incremental_video_stage,
+                                    inputs=("story_data", "image_results", "narration_results", "gemini_client", "workspace"),
+                                    outputs=("video_path",)))
+    else:
+        stages.append(PipelineStage("video", lambda **inputs: _compose_video_stage(**inputs, encode_mode=encode_mode),
+                                    inputs=("story_data", "image_results", "narration_results", "workspace"), outputs=("video_path",)))
+    if progress is not None:
+        stages.append(PipelineStage("preview", lambda **inputs: _preview_stage(**inputs, progress=progress),
+                                    inputs=("image_results", "narration_results", "workspace"), outputs=("preview_path",)))
+    return stages
+
+# ========================
+# 6. BACKGROUND RENDER JOBS
+# ========================
+
+def run_render_job(job_id, user_prompt, google_api_key):
+    """
+    Runs the full pipeline for one job inside a render worker process.
+    Progress and the final result are written to the job's status.json so the
+    UI can pick them up later, even after a browser refresh. The video is
+    composed incrementally, so run_rerender_job can reuse every unchanged scene.
+    """
+    workspace = JobWorkspace(job_id)
+    progress = JobProgress(workspace)
+    progress.update()
+    # Keeps status.json fresh so the app can tell this job from one lost in a restart
+    with workspace.heartbeat():
+        try:
+            gemini_client = initialize_clients(google_api_key)
+            results, report = run_pipeline(
+                build_video_pipeline(progress=progress, incremental=True),
+                {"user_prompt": user_prompt, "gemini_client": gemini_client, "workspace": workspace}
+            )
+            # The manifest's copies outlive scratch, so the finished page keeps showing them
+            image_paths = _manifest_image_paths(workspace)
+            result = {
+                "story_data": results["story_data"],
+                "image_paths": image_paths,
+                "image_failures": {i: error for i, error in results["image_results"][1].items() if not image_paths[i]},
+                "video_path": results["video_path"],
+                "first_image_request_s": results.get("first_image_request_s"),
+                "report": report,
+            }
+            workspace.write_status("done", **result)
+            return result
+        except Exception as e:
+            workspace.write_status("failed", error=str(e))
+            raise
+        finally:
+            # Scratch may be tmpfs: a finished job must not keep holding memory
+            workspace.cleanup()
+
+# ========================
+# 7. INCREMENTAL RE-RENDER
+# ========================
+
+def _sha256(data):
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _load_manifest(manifest_path):
+    try:
+        with open(manifest_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"scenes": []}
+
+def _manifest_image_paths(workspace):
+    """Each scene's image in the job's manifest (None for a scene without one)."""
+    return [scene["image_path"] for scene in _load_manifest(workspace.output_path("manifest.json"))["scenes"]]
+
+def _save_manifest(manifest_path, manifest):
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+def render_incremental(story_data, workspace, gemini_client, voice_id="Kore", image_paths=None, narration_paths=None):
+    """
+    Renders story_data into workspace, reusing everything from the previous render
+    of the same workspace that did not change. A manifest records each scene's
+    prompt hash, text hash, image hash and duration next to its encoded segment, so
+    editing one scene regenerates and re-encodes only that scene; the video is then
+    rebuilt by stream-copy concatenation. A scene may carry its own 'image_path'
+    to replace the generated image. Returns (video_path, stats).
+    The manifest and scene files live next to the job's outputs, not in its
+    scratch root, so they survive cleanup() and later re-renders can use them.
+    image_paths and narration_paths are scene files the caller already generated
+    for this story (index-aligned, e.g. by the first render's pipeline); they are
+    used where present and anything missing is generated as usual.
+    """
+    scene_dir = os.path.join(workspace.output_dir, "scenes")
+    os.makedirs(scene_dir, exist_ok=True)
+    manifest_path = workspace.output_path("manifest.json")
+    previous = _load_manifest(manifest_path)
+    known_images = {s["prompt_hash"]: s for s in previous["scenes"] if s.get("image_path") and os.path.exists(s["image_path"])}
+    known_narrations = {s["text_hash"]: s for s in previous["scenes"] if s.get("narration_path") and os.path.exists(s["narration_path"])}
+    stats = {"images_generated": 0, "narrations_generated": 0, "segments_encoded": 0, "segments_reused": 0}
+
+    scenes = story_data['scenes']
+    texts = [scene['text'] for scene in scenes]
+    if texts and story_data.get('title'):
+        texts[0] = f"{story_data['title']}. {texts[0]}"
+
+    entries = []
+    for scene, text in zip(scenes, texts):
+        entries.append({
+            "prompt_hash": _sha256(scene.get('image_path') or scene['image_prompt']),
+            "text_hash": _sha256(json.dumps([TTS_MODEL, voice_id, text])),
+        })
+
+    def provided(paths, i):
+        return paths[i] if paths is not None and i < len(paths) else None
+
+    # Images: reuse by prompt, generate the rest in parallel
+    def scene_image(entry, i):
+        if scenes[i].get('image_path'):
+            return scenes[i]['image_path']
+        if entry["prompt_hash"] in known_images:
+            return known_images[entry["prompt_hash"]]["image_path"]
+        stored = os.path.join(scene_dir, f"image_{entry['prompt_hash'][:16]}.png")
+        if provided(image_paths, i):
+            # Copied, not moved: the caller may still be reading it (e.g. the preview)
+            shutil.copyfile(image_paths[i], stored)
+            return stored
+        generated = generate_image_with_gemini(scenes[i]['image_prompt'], i, gemini_client, raise_errors=True, workspace=workspace)
+        shutil.move(generated, stored)
+        return stored
+
+    # Narration: reuse by text and voice, synthesize the rest in parallel
+    def scene_narration(entry, i):
+        if entry["text_hash"] in known_narrations:
+            return known_narrations[entry["text_hash"]]["narration_path"]
+        stored = os.path.join(scene_dir, f"narration_{entry['text_hash'][:16]}.wav")
+        if provided(narration_paths, i):
+            shutil.copyfile(narration_paths[i], stored)
+            return stored
+        generated = generate_narration_elevenlabs(texts[i], f"narration_scene_{i+1}.wav", voice_id=voice_id,
+                                                  workspace=workspace, gemini_client=gemini_client)
+        shutil.move(generated, stored)
+        return stored
+
+    scene_images, image_failures = run_scenes_concurrently(scene_image, entries, IMAGE_MAX_WORKERS)
+    scene_narrations, narration_failures = run_scenes_concurrently(scene_narration, entries, TTS_MAX_WORKERS)
+    if narration_failures:
+        raise ValueError(f"Narration failed for scenes {sorted(i+1 for i in narration_failures)}")
+    stats["images_generated"] = sum(
+        1 for i, (scene, entry, path) in enumerate(zip(scenes, entries, scene_images))
+        if path and not scene.get('image_path') and entry["prompt_hash"] not in known_images
+        and not provided(image_paths, i)
+    )
+    stats["narrations_generated"] = sum(
+        1 for i, entry in enumerate(entries)
+        if entry["text_hash"] not in known_narrations
+        and not provided(narration_paths, i)
+    )
+
+    durations = []
+    for entry, image_path, narration_path in zip(entries, scene_images, scene_narrations):
+        with wave.open(narration_path, "rb") as clip:
+            durations.append(clip.getnframes() / clip.getframerate())
+        entry.update({
+            "image_path": image_path,
+            "image_hash": _file_sha256(image_path) if image_path else None,
+            "narration_path": narration_path,
+            "duration": durations[-1],
+        })
+    for i, error in sorted(image_failures.items()):
+        print(f"⚠️ Scene {i+1} has no image and hands its time to a neighbour: {error}")
+
+    # Segments: keyed on the image content, screen time and encoder settings
+    image_hashes = [entry["image_hash"] for entry in entries]
+    kept_hashes, kept_durations = align_scene_durations(image_hashes, durations)
+    if not kept_hashes:
+        raise ValueError("Image generation failed for all scenes. Cannot create video.")
+    hash_to_image = {entry["image_hash"]: entry["image_path"] for entry in entries if entry["image_hash"]}
+    segment_paths = []
+    to_encode = []
+    for image_hash, duration in zip(kept_hashes, kept_durations):
+        segment_key = _sha256(json.dumps([image_hash, round(duration, 3), VIDEO_ENCODE_ARGS], sort_keys=True))
+        segment_path = os.path.join(scene_dir, f"segment_{segment_key[:16]}.mp4")
+        segment_paths.append(segment_path)
+        if os.path.exists(segment_path) or segment_path in [p for _, _, p in to_encode]:
+            stats["segments_reused"] += 1
+        else:
+            to_encode.append((hash_to_image[image_hash], duration, segment_path))
+    if to_encode:
+        with ThreadPoolExecutor(max_workers=max(1, min(ENCODE_WORKERS, len(to_encode)))) as pool:
+            for future in [pool.submit(tracer.wrap(encode_scene_segment), *job) for job in to_encode]:
+                future.result()
+        stats["segments_encoded"] = len(to_encode)
+
+    # Narration track: concatenated scene PCM, no re-synthesis (named apart from
+    # the pipeline's narration.wav, which the preview may still be reading)
+    narration_path = workspace.tmp_path("scene_narration.wav")
+    with wave.open(narration_path, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(24000)
+        for path in scene_narrations:
+            with wave.open(path, "rb") as clip:
+                out.writeframes(clip.readframes(clip.getnframes()))
+
+    # Keep the same music across re-renders so unchanged videos stay unchanged
+    music_track = previous.get("music_track")
+    if not music_track or not os.path.exists(music_track["path"]):
+        music_track = music_library.select(sum(kept_durations))
+
+    video_name = f"{story_data['title'].replace(' ', '_').lower()}.mp4"
+    final_output_path = workspace.output_path(video_name)
+    video_stream = concat_segments(segment_paths, workspace.tmp_path("segments.txt"))
+    mixed_audio, audio_pipe = _mixed_audio(narration_path, music_track, workspace.tmp_path("mixed_audio.wav"))
+    try:
+        run_ffmpeg(
+            ffmpeg
+            .output(video_stream, mixed_audio, final_output_path, vcodec='copy', **AUDIO_ENCODE_ARGS),
+            input=audio_pipe
+        )
+    except FFmpegError as e:
+        print("❌ FFmpeg error occurred:")
+        print("STDERR:", e.stderr.decode() if e.stderr else "N/A")
+        raise
+
+    # Drop scene files no scene refers to any more
+    referenced = set(segment_paths) | {e["image_path"] for e in entries} | {e["narration_path"] for e in entries}
+    for path in glob.glob(os.path.join(scene_dir, "*")):
+        if path not in referenced:
+            os.remove(path)
+    _save_manifest(manifest_path, {"title": story_data['title'], "music_track": music_track, "scenes": entries})
+
+    print(f"✅ Incremental render saved: {final_output_path} "
+          f"({stats['segments_encoded']} segments encoded, {stats['segments_reused']} reused)")
+    return final_output_path, stats
+
+def run_rerender_job(job_id, story_data, google_api_key):
+    """
+    Re-renders an existing job from an edited story_data inside a render worker
+    process and records the result in its status.json, like run_render_job.
+    The first render left the job's manifest, so only edited scenes are regenerated.
+    """
+    workspace = JobWorkspace(job_id)
+    workspace.write_status("running", story_data=story_data)
+    started = time.perf_counter()
+    with workspace.heartbeat():
+        try:
+            gemini_client = initialize_clients(google_api_key)
+            video_path, stats = render_incremental(story_data, workspace, gemini_client)
+            duration = time.perf_counter() - started
+            image_paths = _manifest_image_paths(workspace)
+            result = {
+                "story_data": story_data,
+                "image_paths": image_paths,
+                "image_failures": {i: "Image generation failed" for i, path in enumerate(image_paths) if not path},
+                "video_path": video_path,
+                "rerender_stats": stats,
+                "report": {"stages": {"rerender": {"duration": duration}}, "critical_path": ["rerender"]},
+            }
+            workspace.write_status("done", **result)
+            return result
+        except Exception as e:
+            workspace.write_status("failed", error=str(e))
+            raise
+        finally:
+            workspace.cleanup()
@@ -0,0 +1,153 @@
+import os
+import threading
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit, quote
+
+from workspace import VIDEO_DIR
+
+# Where the server listens. Port 0 takes any free port (8502 is Streamlit's own
+# fallback port); a fixed port that is already taken falls back to a free one too.
+VIDEO_SERVER_HOST = os.getenv("VIDEO_SERVER_HOST", "127.0.0.1")
+VIDEO_SERVER_PORT = int(os.getenv("VIDEO_SERVER_PORT", "0"))
+# Base URL browsers use to reach the server, e.g. a reverse-proxy path. Empty
+# derives it from the host the browser used for the app plus the bound port.
+VIDEO_PUBLIC_URL = os.getenv("VIDEO_PUBLIC_URL", "")
+LOOPBACK_HOSTS = ("127.0.0.1", "localhost", "::1")
+# Bytes read and sent per write; memory per open connection stays at one chunk
+CHUNK_SIZE = 256 * 1024
+
+def parse_range(header, size):
+    """
+    Parses a single "bytes=start-end" Range header into an inclusive (start, end)
+    pair. Returns None for a missing or multi-range header (serve everything)
+    and raises ValueError for a range outside the file.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start_text, _, end_text = header[len("bytes="):].strip().partition("-")
+    if start_text:
+        start = int(start_text)
+        end = min(int(end_text), size - 1) if end_text else size - 1
+    else:
+        # Suffix range: the last N bytes
+        length = int(end_text)
+        if length <= 0:
+            raise ValueError("Empty suffix range")
+        start, end = max(0, size - length), size - 1
+    if start >= size or start > end:
+        raise ValueError(f"Range {header} outside {size} bytes")
+    return start, end
+
+class VideoRequestHandler(BaseHTTPRequestHandler):
+    """Serves MP4s under the server's root with HTTP range support so players can seek."""
+    protocol_version = "HTTP/1.1"
+
+    def _resolve(self):
+        root = os.path.realpath(self.server.root)
+        path = os.path.realpath(os.path.join(root, unquote(urlsplit(self.path).path).lstrip("/")))
+        if not path.startswith(root + os.sep) or not path.endswith(".mp4") or not os.path.isfile(path):
+            return None
+        return path
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def _serve(self, send_body):
+        path = self._resolve()
+        if path is None:
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+        size = os.path.getsize(path)
+        try:
+            byte_range = parse_range(self.headers.get("Range"), size)
+        except ValueError:
+            self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+            self.send_header("Content-Range", f"bytes */{size}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        start, end = byte_range or (0, size - 1)
+        self.send_response(HTTPStatus.PARTIAL_CONTENT if byte_range else HTTPStatus.OK)
+        self.send_header("Content-Type", "video/mp4")
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Cache-Control", "private, max-age=3600")
+        if byte_range:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        if "download=1" in (urlsplit(self.path).query or ""):
+            self.send_header("Content-Disposition", f'attachment; filename="{os.path.basename(path)}"')
+        self.end_headers()
+        if not send_body:
+            return
+
+        try:
+            with open(path, "rb") as f:
+                f.seek(start)
+                remaining = end - start + 1
+                while remaining > 0:
+                    chunk = f.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+                    remaining -= len(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            # The player dropped the connection, usually to seek elsewhere
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+class VideoServer:
+    """Background HTTP server that streams finished videos from disk."""
+    def __init__(self, root=VIDEO_DIR, host=VIDEO_SERVER_HOST, port=VIDEO_SERVER_PORT, public_url=VIDEO_PUBLIC_URL):
+        self.root = root
+        self.public_url = public_url.rstrip("/")
+        try:
+            self._server = ThreadingHTTPServer((host, port), VideoRequestHandler)
+        except OSError as e:
+            if not port:
+                raise
+            print(f"⚠️ Video server cannot listen on {host}:{port} ({e}), using a free port instead")
+            self._server = ThreadingHTTPServer((host, 0), VideoRequestHandler)
+        self.host = host
+        self.port = self._server.server_port
+        self._server.daemon_threads = True
+        self._server.root = root
+        self._thread = threading.Thread(target=self._server.serve_forever, name="video-server", daemon=True)
+        self._thread.start()
+        print(f"📡 Serving videos from {root} on {host}:{self.port}")
+
+    def base_url(self, request_host=None):
+        """
+        Base URL for a browser that reached the app at request_host (its Host
+        header), or None if that browser cannot reach this server: it only
+        listens on loopback and the browser is on another machine.
+        """
+        if self.public_url:
+            return self.public_url
+        hostname = urlsplit(f"//{request_host}").hostname if request_host else "localhost"
+        if self.host in LOOPBACK_HOSTS and hostname not in LOOPBACK_HOSTS:
+            return None
+        if ":" in hostname:
+            hostname = f"[{hostname}]"
+        return f"http://{hostname}:{self.port}"
+
+    def url(self, path, download=False, base_url=None):
+        """Browser URL for a file under the served root, below base_url (default: base_url())."""
+        relative = os.path.relpath(os.path.realpath(path), os.path.realpath(self.root))
+        if relative.startswith(".."):
+            raise ValueError(f"{path} is not under {self.root}")
+        base_url = base_url or self.base_url()
+        if base_url is None:
+            raise ValueError(f"The video server is not reachable from outside {self.host}")
+        url = f"{base_url}/{quote(relative.replace(os.sep, '/'))}"
+        return url + "?download=1" if download else url
+
+    def shutdown(self):
+        self._server.shutdown()
+        self._server.server_close()
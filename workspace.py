@@ -0,0 +1,208 @@
+import os
+import re
+import json
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# Scratch space for in-progress jobs; finished videos go under VIDEO_DIR/<job_id>
+JOBS_DIR = os.getenv("JOBS_DIR", "jobs")
+VIDEO_DIR = "output_videos"
+# tmpfs-backed scratch root: job images and temp files stay in memory and only
+# the final MP4 reaches the disk. Empty disables it and keeps everything under JOBS_DIR.
+SCRATCH_DIR = os.getenv("SCRATCH_DIR", "/dev/shm" if os.path.isdir("/dev/shm") else "")
+# Free space the scratch root needs before a new job is placed there
+SCRATCH_MIN_FREE_MB = int(os.getenv("SCRATCH_MIN_FREE_MB", "512"))
+
+# Jobs whose status.json has not changed for this long are deleted, outputs
+# included, the next time a job is submitted. 0 keeps them forever.
+JOB_TTL_HOURS = float(os.getenv("JOB_TTL_HOURS", "24"))
+
+# A running job touches its status.json this often; a queued or running job
+# whose status has not changed for JOB_LOST_SECONDS has no live worker left
+JOB_HEARTBEAT_SECONDS = 10
+JOB_LOST_SECONDS = int(os.getenv("JOB_LOST_SECONDS", "60"))
+
+# Job ids are generated as 12 lowercase hex characters; anything else is rejected
+JOB_ID_PATTERN = re.compile(r"^[0-9a-f]{12}$")
+
+def is_valid_job_id(job_id):
+    return isinstance(job_id, str) and JOB_ID_PATTERN.match(job_id) is not None
+
+def _inside(path, root):
+    root = os.path.realpath(root)
+    return os.path.realpath(path).startswith(root + os.sep)
+
+def _scratch_jobs_dir():
+    return os.path.join(SCRATCH_DIR, "video_jobs") if SCRATCH_DIR else None
+
+def jobs_root(job_id=None):
+    """
+    Where a job's scratch files live: wherever an existing job already is,
+    otherwise the tmpfs scratch root if it is writable and has room, otherwise JOBS_DIR.
+    """
+    scratch = _scratch_jobs_dir()
+    if scratch is None:
+        return JOBS_DIR
+    if job_id is not None:
+        for root in (scratch, JOBS_DIR):
+            if os.path.isdir(os.path.join(root, job_id)):
+                return root
+    try:
+        os.makedirs(scratch, exist_ok=True)
+        stats = os.statvfs(scratch)
+    except OSError:
+        return JOBS_DIR
+    if not os.access(scratch, os.W_OK) or stats.f_bavail * stats.f_frsize < SCRATCH_MIN_FREE_MB * 1024 * 1024:
+        return JOBS_DIR
+    return scratch
+
+class JobWorkspace:
+    """
+    Isolated directories for a single render job. Every job gets its own
+    images, temp and output directories so concurrent renders never see or
+    delete each other's files. Without an explicit root, images and temp files
+    go to the tmpfs scratch root when there is one (see jobs_root).
+    """
+    def __init__(self, job_id=None, root=None, output_root=VIDEO_DIR):
+        if job_id is not None and not is_valid_job_id(job_id):
+            raise ValueError(f"❌ Invalid job id {job_id!r}.")
+        self.job_id = job_id or uuid.uuid4().hex[:12]
+        root = root or jobs_root(job_id)
+        self.root = os.path.join(root, self.job_id)
+        self.image_dir = os.path.join(self.root, "images")
+        self.tmp_dir = os.path.join(self.root, "tmp")
+        self.output_dir = os.path.join(output_root, self.job_id)
+        if not _inside(self.root, root) or not _inside(self.output_dir, output_root):
+            raise ValueError(f"❌ Job {self.job_id!r} resolves outside its workspace roots.")
+        for directory in (self.image_dir, self.tmp_dir, self.output_dir):
+            os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def open(cls, job_id, output_root=VIDEO_DIR):
+        """
+        The workspace of an existing job, or None if job_id is malformed or no
+        job with that id ever recorded a status. Never creates directories for unknown ids.
+        """
+        if not is_valid_job_id(job_id):
+            return None
+        if not os.path.isfile(os.path.join(output_root, job_id, "status.json")):
+            return None
+        return cls(job_id, output_root=output_root)
+
+    def image_path(self, index, ext=".png"):
+        return os.path.join(self.image_dir, f"scene_{index+1}{ext}")
+
+    def tmp_path(self, name):
+        return os.path.join(self.tmp_dir, name)
+
+    def output_path(self, name):
+        return os.path.join(self.output_dir, name)
+
+    def write_status(self, status, **fields):
+        """Atomically records the job's status (queued/running/done/failed) next to its outputs."""
+        data = {"job_id": self.job_id, "status": status, "updated_at": time.time(), **fields}
+        fd, tmp_path = tempfile.mkstemp(dir=self.output_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.output_path("status.json"))
+
+    def status_age(self):
+        """Seconds since status.json last changed (or was touched by heartbeat()), None without one."""
+        try:
+            return time.time() - os.path.getmtime(self.output_path("status.json"))
+        except OSError:
+            return None
+
+    @contextmanager
+    def heartbeat(self, interval=JOB_HEARTBEAT_SECONDS):
+        """Touches status.json every interval seconds while the block runs, so pollers can tell a live job from a lost one."""
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(interval):
+                try:
+                    os.utime(self.output_path("status.json"))
+                except OSError:
+                    pass
+
+        thread = threading.Thread(target=beat, name=f"heartbeat-{self.job_id}", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def read_status(self):
+        """Returns the last recorded status, or None if the job never reported one."""
+        try:
+            with open(self.output_path("status.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def cleanup(self, keep_outputs=True):
+        """Removes this job's scratch files, and its outputs too unless keep_outputs is set."""
+        shutil.rmtree(self.root, ignore_errors=True)
+        if not keep_outputs:
+            shutil.rmtree(self.output_dir, ignore_errors=True)
+        print(f"🧹 Cleaned up workspace for job {self.job_id}.")
+
+    def __repr__(self):
+        return f"JobWorkspace({self.job_id!r})"
+
+def cleanup_stale_jobs(ttl_hours=JOB_TTL_HOURS, output_root=VIDEO_DIR):
+    """
+    Deletes jobs whose status.json is older than ttl_hours, outputs included,
+    and scratch directories left that long by workers that died. Output
+    directories without a status.json (command-line renders) are kept.
+    Returns the number of directories removed.
+    """
+    if ttl_hours <= 0:
+        return 0
+    cutoff = time.time() - ttl_hours * 3600
+    removed = 0
+    for root in (output_root, JOBS_DIR, _scratch_jobs_dir()):
+        if not root or not os.path.isdir(root):
+            continue
+        for name in os.listdir(root):
+            path = os.path.join(root, name)
+            if not is_valid_job_id(name) or not os.path.isdir(path):
+                continue
+            marker = os.path.join(path, "status.json") if root == output_root else path
+            try:
+                if os.path.getmtime(marker) >= cutoff:
+                    continue
+            except OSError:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+    if removed:
+        print(f"🧹 Removed {removed} job directories older than {ttl_hours:g}h.")
+    return removed
+
+class JobProgress:
+    """
+    Partial results of a running job. Every update rewrites status.json as
+    "running" with everything known so far, so the UI can show each scene as
+    soon as it is ready instead of waiting for the whole render.
+    """
+    def __init__(self, workspace):
+        self.workspace = workspace
+        self.fields = {"scene_images": {}}
+        self._lock = threading.Lock()
+
+    def update(self, **fields):
+        with self._lock:
+            self.fields.update(fields)
+            self.workspace.write_status("running", **self.fields)
+
+    def scene_image(self, index, path):
+        """Publishes one finished scene image (keys are strings so they survive JSON)."""
+        with self._lock:
+            self.fields["scene_images"][str(index)] = path
+            self.workspace.write_status("running", **self.fields)